@@ -0,0 +1,38 @@
+"""
+Payload size of booking.details / booking.search per response profile.
+
+Run: python benchmarks/bench_booking_payload.py
+Uses the scraper payloads stored in tests/fixtures.
+"""
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from mcp_server.tools import booking  # noqa: E402
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+def _size(payload) -> int:
+    return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def main() -> None:
+    cases = [
+        ("booking.details", booking.project_details, "booking_hotel_details.json"),
+        ("booking.search", booking.project_search, "booking_search_results.json"),
+    ]
+    for tool, project, fixture in cases:
+        data = json.loads((FIXTURES / fixture).read_text(encoding="utf-8"))
+        full = _size(data)
+        print(f"{tool} ({fixture})")
+        for profile in ("full", "summary", "pricing"):
+            size = _size(project(data, profile))
+            print(f"  {profile:<8} {size:>8} bytes  {100 * size / full:6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
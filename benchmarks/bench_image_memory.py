@@ -0,0 +1,113 @@
+"""
+Peak memory of the image pipeline per concurrent generation, against stub services.
+
+Run: python benchmarks/bench_image_memory.py [concurrency]
+OpenRouter and Supabase are stubbed with httpx.MockTransport; OpenRouter returns
+a 1920x1080 noise PNG as a base64 data URL (worst case for compression). Both
+setups produce one full-size JPEG per generation:
+
+  legacy     the former byte handling: split + b64decode of the data URL,
+             BytesIO.getvalue() copy of the encoded JPEG, bytes upload
+  current    image_generation as shipped: a2b_base64 on the str after dropping
+             the JSON body, encoder buffer uploaded from a memoryview
+
+Each setup runs in its own subprocess so peak RSS is comparable; tracemalloc
+covers Python allocations (the byte copies), RSS also includes Pillow buffers.
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from mcp_server.tools import image_generation as imgs  # noqa: E402
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def _data_url() -> str:
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (WIDTH, HEIGHT), os.urandom(WIDTH * HEIGHT * 3)).save(buf, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _install_stubs(data_url: str) -> None:
+    body = json.dumps({"choices": [{"message": {"images": [{"image_url": {"url": data_url}}]}}]}).encode()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "openrouter.ai":
+            return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+        await request.aread()
+        return httpx.Response(200)
+
+    real_client = httpx.AsyncClient
+    imgs.httpx.AsyncClient = lambda *a, **k: real_client(*a, transport=httpx.MockTransport(handler), **k)
+    imgs.OPENROUTER_KEY, imgs.SUPABASE_URL, imgs.SUPABASE_SERVICE_KEY = "key", "https://supabase.test", "key"
+    imgs.VARIANT_WIDTHS, imgs.VARIANT_FORMATS = [], ["jpeg"]
+
+
+async def _legacy() -> None:
+    async with imgs.httpx.AsyncClient() as client:
+        response = await client.post("https://openrouter.ai/api/v1/chat/completions", json={})
+    image_url = response.json()["choices"][0]["message"]["images"][0]["image_url"]["url"]
+    header, encoded = image_url.split(",", 1)
+    raw = base64.b64decode(encoded)
+
+    def encode() -> bytes:
+        img = Image.open(io.BytesIO(raw)).convert("RGB")
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=90, optimize=True)
+        return output.getvalue()
+
+    jpeg = await imgs._run_cpu(encode)
+    async with imgs.httpx.AsyncClient() as client:
+        await client.post("https://supabase.test/storage/v1/object/TRIPS/BENCH/hero.jpg", content=jpeg)
+
+
+async def _current() -> None:
+    raw = await imgs._generate_image_openrouter("bench", WIDTH, HEIGHT)
+    await imgs._process_and_upload(raw, "BENCH", "hero", WIDTH, HEIGHT)
+
+
+def _child(mode: str, concurrency: int) -> None:
+    _install_stubs(_data_url())
+    run = _legacy if mode == "legacy" else _current
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    async def batch() -> None:
+        await asyncio.gather(*(run() for _ in range(concurrency)))
+
+    asyncio.run(batch())
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before  # KiB on Linux
+    print(f"  {mode:<8} {elapsed:6.2f}s  python peak {peak / concurrency / 2**20:6.1f} MiB/gen"
+          f"  rss growth {rss / concurrency / 1024:6.1f} MiB/gen")
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        _child(sys.argv[2], int(sys.argv[3]))
+        return
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    print(f"{concurrency} concurrent {WIDTH}x{HEIGHT} generations")
+    for mode in ("legacy", "current"):
+        subprocess.run([sys.executable, __file__, "--child", mode, str(concurrency)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of translate_text with and without micro-batching, against a stub service.
+
+Run: python benchmarks/bench_translate_batching.py [n_texts]
+The stub (httpx.MockTransport) models a CPU-only NLLB backend: one request at a
+time, a fixed cost per call plus a smaller cost per text. Three setups are
+compared: micro-batching off, on with a batch endpoint, and on against a stub
+without batch endpoint (fan-out fallback).
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from mcp_server.tools import translation  # noqa: E402
+
+CALL_COST_S = 0.020
+_REAL_CLIENT = httpx.AsyncClient
+ITEM_COST_S = 0.002
+
+
+def _stub(with_batch: bool) -> httpx.MockTransport:
+    backend = asyncio.Lock()
+    calls = {"n": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        if request.url.path.endswith("/translate_batch"):
+            if not with_batch:
+                return httpx.Response(404, json={"detail": "Not Found"})
+            texts = body["texts"]
+        else:
+            texts = [body["text"]]
+        async with backend:
+            calls["n"] += 1
+            await asyncio.sleep(CALL_COST_S + ITEM_COST_S * len(texts))
+        out = [{"translated_text": t.upper(), "target_language": body["target_language"]} for t in texts]
+        if request.url.path.endswith("/translate_batch"):
+            return httpx.Response(200, json={"translations": out})
+        return httpx.Response(200, json=out[0])
+
+    transport = httpx.MockTransport(handler)
+    transport.calls = calls
+    return transport
+
+
+async def _run(n: int, window_ms: float, with_batch: bool) -> None:
+    translation.MICROBATCH_MS = window_ms
+    translation._BATCH_SUPPORTED = None
+    translation._DISK = None
+    translation.clear_cache()
+    transport = _stub(with_batch)
+    translation.httpx.AsyncClient = lambda *a, **k: _REAL_CLIENT(*a, transport=transport, **k)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(translation.translate_text(f"sentence {i}", "EN", "FR") for i in range(n)))
+    elapsed = time.perf_counter() - started
+    assert all(r["success"] for r in results)
+    label = "off" if window_ms <= 0 else f"{window_ms:g} ms, " + ("batch endpoint" if with_batch else "fan-out")
+    print(f"  {label:<28} {elapsed:6.2f}s  {n / elapsed:8.1f} texts/s  {transport.calls['n']:>4} backend calls")
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{n} concurrent distinct texts (call {CALL_COST_S * 1000:.0f} ms + {ITEM_COST_S * 1000:.0f} ms/text)")
+    asyncio.run(_run(n, 0, True))
+    asyncio.run(_run(n, 5, True))
+    asyncio.run(_run(n, 5, False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Background prefetch of hot keys (flight routes, hotel searches, climate cells).
+
+Tool calls report what they served with `note()`. A key requested at least
+PREFETCH_MIN_HITS times within PREFETCH_WINDOW_S becomes hot, and a planner
+refreshes it once its cache entry reaches PREFETCH_REFRESH_AT of its TTL, so
+the next caller hits a warm cache instead of waiting for a cold scrape.
+
+Refreshes go through a bounded priority queue (hottest and most expensive
+first) drained by a few workers. Each upstream has a token bucket budget, and
+nothing is sent while that upstream's circuit breaker is not closed.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from .tools import booking as b
+from .tools import flights as f
+from .tools import places as g
+from .tools.circuit import BREAKERS, CLOSED
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PREFETCH_ENABLED", "1") not in ("0", "false", "False", "")
+MIN_HITS = int(os.getenv("PREFETCH_MIN_HITS", "2"))
+WINDOW_S = float(os.getenv("PREFETCH_WINDOW_S", str(6 * 3600)))
+REFRESH_AT = float(os.getenv("PREFETCH_REFRESH_AT", "0.8"))
+TICK_S = float(os.getenv("PREFETCH_TICK_S", "30"))
+WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "100"))
+MAX_KEYS = int(os.getenv("PREFETCH_MAX_KEYS", "500"))
+REFRESH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "180"))
+RETRY_S = float(os.getenv("PREFETCH_RETRY_S", "300"))
+
+
+def _budget(upstream: str, default: float) -> float:
+    """Refreshes per minute allowed for an upstream (PREFETCH_BUDGET_<UPSTREAM>)."""
+    return float(os.getenv(f"PREFETCH_BUDGET_{upstream.upper().replace('-', '_')}", str(default)))
+
+
+class TokenBucket:
+    """`rate` tokens per minute, at most `burst` saved up."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate / 60.0)
+        self._updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class PrefetchKind:
+    """How to refresh one family of keys: upstream budget, cache TTL and refresh coroutine."""
+
+    def __init__(self, name: str, upstream: str, ttl: Callable[[], float],
+                 refresh: Callable[..., Awaitable[Any]], weight: float = 1.0):
+        self.name = name
+        self.upstream = upstream
+        self.ttl = ttl
+        self.refresh = refresh
+        self.weight = weight
+
+
+class _Entry:
+    def __init__(self, kind: str, params: Dict[str, Any], until: Optional[str]):
+        self.kind = kind
+        self.params = params
+        self.until = until
+        self.hits: Deque[float] = deque()
+        self.filled_at = 0.0
+        self.prefetched = False
+        self.pending = False
+        self.next_try = 0.0
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+class PrefetchScheduler:
+    def __init__(self, kinds: Dict[str, PrefetchKind], budgets: Dict[str, TokenBucket],
+                 min_hits: int = MIN_HITS, window_s: float = WINDOW_S, refresh_at: float = REFRESH_AT,
+                 tick_s: float = TICK_S, workers: int = WORKERS, queue_size: int = QUEUE_SIZE,
+                 max_keys: int = MAX_KEYS, enabled: bool = ENABLED):
+        self.kinds = kinds
+        self.budgets = budgets
+        self.min_hits = min_hits
+        self.window_s = window_s
+        self.refresh_at = refresh_at
+        self.tick_s = tick_s
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_keys = max_keys
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[Any, ...], _Entry]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._tasks: list = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.counters = {"calls": 0, "cached_calls": 0, "prefetch_hits": 0, "refreshed": 0,
+                         "failed": 0, "deferred_budget": 0, "skipped_circuit": 0, "dropped_queue_full": 0}
+
+    # -- observation -------------------------------------------------------
+
+    def note(self, kind: str, params: Dict[str, Any], cached: bool = False, age: float = 0.0,
+             until: Optional[str] = None) -> None:
+        """Record a served tool call; `age` is how old the served cache entry was (seconds)."""
+        if kind not in self.kinds:
+            return
+        now = time.monotonic()
+        key = (kind, tuple(sorted((k, _freeze(v)) for k, v in params.items())))
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(kind, dict(params), until)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+
+        self.counters["calls"] += 1
+        if cached:
+            self.counters["cached_calls"] += 1
+            if entry.prefetched:
+                self.counters["prefetch_hits"] += 1
+        else:
+            entry.filled_at, entry.prefetched = now, False
+        if not entry.filled_at:
+            entry.filled_at = now - age
+        entry.hits.append(now)
+        self._start()
+
+    # -- planning ----------------------------------------------------------
+
+    def _is_hot(self, entry: _Entry, now: float) -> bool:
+        while entry.hits and now - entry.hits[0] > self.window_s:
+            entry.hits.popleft()
+        return len(entry.hits) >= self.min_hits
+
+    def plan(self) -> int:
+        """Queue every hot key whose entry is close to expiry; returns how many were queued."""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        now = time.monotonic()
+        today = date.today().isoformat()
+        queued = 0
+        for key, entry in list(self._entries.items()):
+            if entry.until is not None and entry.until < today:
+                del self._entries[key]  # date passée : plus rien à préchauffer
+                continue
+            if entry.pending or now < entry.next_try or not self._is_hot(entry, now):
+                continue
+            kind = self.kinds[entry.kind]
+            if now - entry.filled_at < kind.ttl() * self.refresh_at:
+                continue
+            if self._queue.full():
+                self.counters["dropped_queue_full"] += 1
+                break
+            entry.pending = True
+            self._queue.put_nowait((-kind.weight * len(entry.hits), next(self._seq), key))
+            queued += 1
+        return queued
+
+    # -- execution ---------------------------------------------------------
+
+    async def _refresh(self, key: Tuple[Any, ...]) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        kind = self.kinds[entry.kind]
+        try:
+            breaker = BREAKERS.get(kind.upstream)
+            if breaker is not None and breaker.state != CLOSED:
+                self.counters["skipped_circuit"] += 1
+                entry.next_try = time.monotonic() + self.tick_s
+                return
+            bucket = self.budgets.get(kind.upstream)
+            if bucket is not None and not bucket.take():
+                self.counters["deferred_budget"] += 1
+                entry.next_try = time.monotonic() + self.tick_s
+                return
+            try:
+                await asyncio.wait_for(kind.refresh(**entry.params), REFRESH_TIMEOUT)
+            except Exception as e:
+                self.counters["failed"] += 1
+                entry.next_try = time.monotonic() + RETRY_S
+                logger.warning(f"Prefetch of {entry.kind} {entry.params} failed: {e}")
+                return
+            entry.filled_at, entry.prefetched = time.monotonic(), True
+            self.counters["refreshed"] += 1
+        finally:
+            entry.pending = False
+
+    async def run_once(self) -> int:
+        """Plan, then drain the queue in priority order; returns how many keys were processed."""
+        self.plan()
+        processed = 0
+        while not self._queue.empty():
+            _, _, key = self._queue.get_nowait()
+            await self._refresh(key)
+            processed += 1
+        return processed
+
+    async def _planner(self) -> None:
+        while True:
+            try:
+                self.plan()
+            except Exception as e:
+                logger.warning(f"Prefetch planning failed: {e}")
+            await asyncio.sleep(self.tick_s)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, key = await self._queue.get()
+            try:
+                await self._refresh(key)
+            finally:
+                self._queue.task_done()
+
+    def _start(self) -> None:
+        """Start the planner and workers on the running loop (once per loop)."""
+        if not self.enabled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is loop and all(not t.done() for t in self._tasks):
+            return
+        self.stop()
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        for entry in self._entries.values():
+            entry.pending = False
+        self._tasks = [loop.create_task(self._planner())]
+        self._tasks += [loop.create_task(self._worker()) for _ in range(max(1, self.workers))]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        c = self.counters
+        return {
+            "enabled": self.enabled,
+            "running": bool(self._tasks) and all(not t.done() for t in self._tasks),
+            "tracked": len(self._entries),
+            "hot": sum(1 for e in self._entries.values() if self._is_hot(e, now)),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            **c,
+            "prefetch_hit_rate": round(c["prefetch_hits"] / c["calls"], 3) if c["calls"] else None,
+            "budgets": {name: round(bucket.tokens, 2) for name, bucket in self.budgets.items()},
+        }
+
+
+def _refresh_flights(origin: str, destination: str, start_date: str, end_date: str) -> Awaitable[Any]:
+    # Jours plus vieux que le seuil de rafraîchissement seulement ; les autres restent servis par le store
+    return f.get_flight_prices(origin, destination, start_date, end_date, max_age=f.PRICE_TTL * REFRESH_AT)
+
+
+KINDS: Dict[str, PrefetchKind] = {
+    "flights": PrefetchKind("flights", "flights", lambda: f.PRICE_TTL, _refresh_flights, weight=3.0),
+    "booking": PrefetchKind("booking", "booking", lambda: b.SEARCH_CACHE_TTL, b.refresh_search, weight=2.0),
+    "climate": PrefetchKind("climate", "open-meteo", lambda: g._CLIMATE_MONTHLY.ttl,
+                            g.refresh_monthly_climate, weight=1.0),
+}
+
+SCHEDULER = PrefetchScheduler(KINDS, {
+    "flights": TokenBucket(_budget("flights", 2.0), burst=2),
+    "booking": TokenBucket(_budget("booking", 4.0), burst=4),
+    "open-meteo": TokenBucket(_budget("open-meteo", 20.0), burst=10),
+})
+
+
+def note(kind: str, params: Dict[str, Any], cached: bool = False, age: float = 0.0,
+         until: Optional[str] = None) -> None:
+    """Report a served tool call to the shared scheduler; never raises."""
+    try:
+        SCHEDULER.note(kind, params, cached, age, until)
+    except Exception as e:
+        logger.warning(f"Prefetch note failed: {e}")
+
+
+def stats() -> Dict[str, Any]:
+    return SCHEDULER.stats()
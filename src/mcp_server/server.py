@@ -1,12 +1,63 @@
-from typing import Dict, Any, List, Optional, Literal
+import asyncio
+import os
+import time
+from typing import Dict, Any, Awaitable, List, Optional, Literal
 from pathlib import Path
 from fastmcp import FastMCP, Context
 from .tools import weather as w
 from .tools import image_generation as imgs
+from .tools import image_jobs as ij
 from .tools import booking as b
 from .tools import flights as f
 from .tools import places as g
 from .tools import translation as t
+from .tools.circuit import CircuitOpenError, health_snapshot
+from . import prefetch
+
+
+# Intervalle des notifications de progression pendant les appels scraper longs (secondes)
+HEARTBEAT_INTERVAL = float(os.getenv("MCP_HEARTBEAT_INTERVAL", "10"))
+
+
+async def _with_heartbeat(awaitable: Awaitable[Any], ctx: Optional[Context], label: str,
+                          deadline: Optional[float], interval: float = HEARTBEAT_INTERVAL) -> Any:
+    """Await a long upstream call while reporting elapsed time through `ctx.report_progress`.
+
+    The call is cancelled when `deadline` (seconds) expires or when this task is
+    cancelled (MCP client gone), so no orphaned scrape keeps running.
+    """
+    if deadline is not None and deadline <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise ValueError(f"timeout must be a positive number of seconds, got {deadline}")
+    task = asyncio.ensure_future(awaitable)
+    started = time.monotonic()
+    try:
+        while True:
+            elapsed = time.monotonic() - started
+            wait = interval if deadline is None else max(0.0, min(interval, deadline - elapsed))
+            done, _ = await asyncio.wait({task}, timeout=wait)
+            if task in done:
+                return task.result()
+            elapsed = time.monotonic() - started
+            if deadline is not None and elapsed >= deadline:
+                raise TimeoutError(f"{label}: no answer within {deadline:.0f}s")
+            if ctx:
+                await ctx.report_progress(round(elapsed, 1), deadline, f"{label}: {elapsed:.0f}s elapsed")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _circuit_open_response(error: CircuitOpenError, ctx: Optional[Context]) -> Dict[str, Any]:
+    """Structured answer for a tool whose upstream circuit is open.
+
+    The breaker failed the call immediately, so the client gets this instead of
+    waiting for the upstream timeout.
+    """
+    if ctx:
+        await ctx.warning(str(error))
+    return error.as_dict()
 
 
 def create_mcp() -> FastMCP:
@@ -185,6 +236,71 @@ def create_mcp() -> FastMCP:
                 await ctx.error(f"Climate stats failed: {str(e)}")
             raise
 
+    @mcp.tool(name="climate.period_stats")
+    async def climate_period_stats(start_date: str, end_date: str, city: str | None = None,
+                                   country: str | None = None, lat: float | None = None,
+                                   lon: float | None = None, years: int = 10,
+                                   rain_threshold_mm: float = 1.0, timezone: str = "auto",
+                                   ctx: Context = None):
+        """Variabilité d'une même fenêtre calendaire sur les N dernières années.
+
+        - Dates AAAA-MM-JJ (seuls jour/mois comptent). Préférer `lat`/`lon` ; sinon `city` (+ `country`). `years` <= 30.
+        - Retour : `stats` (tmean moyenne/p10/p50/p90/écart-type inter-annuel, records tmax/tmin,
+          probabilité de jour de pluie >= `rain_threshold_mm`) + `per_year[]`.
+        """
+        try:
+            if lat is not None and lon is not None:
+                if ctx:
+                    await ctx.info(f"Climate period stats by coords {lat},{lon} ({years} years)")
+                return await g.climate_period_stats(lat, lon, start_date, end_date, years,
+                                                    "UTC" if timezone == "auto" else timezone,
+                                                    rain_threshold_mm)
+            if not city:
+                raise ValueError("city or lat/lon required")
+            if ctx:
+                await ctx.info(f"Climate period stats for {city} ({years} years)")
+            return await g.climate_period_stats_for_place(city, start_date, end_date, years, country,
+                                                          timezone, rain_threshold_mm)
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Climate period stats failed: {str(e)}")
+            raise
+
+    @mcp.tool(name="climate.best_months")
+    async def climate_best_months(city: str | None = None, country: str | None = None,
+                                  lat: float | None = None, lon: float | None = None, years: int = 5,
+                                  ideal_min_c: float = 18.0, ideal_max_c: float = 26.0,
+                                  tolerance_c: float = 8.0, rain_weight: float = 0.4,
+                                  timezone: str = "auto", ctx: Context = None):
+        """Classe les 12 mois d'une destination (« quand partir ? ») en un seul appel.
+
+        - Préférer `lat`/`lon` ; sinon `city` (+ `country`). Moyennes sur les `years` dernières années (<= 20).
+        - Confort : température moyenne dans [`ideal_min_c`, `ideal_max_c`] (score nul à `tolerance_c` °C hors bande),
+          pénalité pluie pondérée par `rain_weight` (0-1) selon la probabilité de jour de pluie.
+        - Retour : `months[]` triés par `score` (rang, tmean/tmax/tmin, précipitations, proba pluie) + `best` (top 3).
+        """
+        try:
+            if lat is not None and lon is not None:
+                if ctx:
+                    await ctx.info(f"Ranking months by coords {lat},{lon}")
+                result = await g.climate_best_months(lat, lon, years, ideal_min_c, ideal_max_c, tolerance_c,
+                                                     rain_weight, "UTC" if timezone == "auto" else timezone)
+            else:
+                if not city:
+                    raise ValueError("city or lat/lon required")
+                if ctx:
+                    await ctx.info(f"Ranking months for {city}")
+                result = await g.climate_best_months_for_place(city, country, years, ideal_min_c, ideal_max_c,
+                                                               tolerance_c, rain_weight, timezone)
+            coords = result["coords"]
+            prefetch.note("climate", {"lat": coords["lat"], "lon": coords["lon"], "years": result["years"],
+                                      "timezone": coords["timezone"]}, cached=bool(result.get("from_cache")))
+            return result
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Best months ranking failed: {str(e)}")
+            raise
+
     @mcp.tool(name="weather.by_coords")
     async def weather_by_coords(
         lat: float,
@@ -269,17 +385,81 @@ def create_mcp() -> FastMCP:
                 await ctx.error(f"Period weather fetch failed: {str(e)}")
             raise
 
+    @mcp.tool(name="weather.hourly")
+    async def weather_hourly(
+        lat: float,
+        lon: float,
+        timezone: str = "auto",
+        days: int = 3,
+        variables: Optional[List[str]] = None,
+        downsample: Literal["3h", "6h", "daypart", "lttb"] = "6h",
+        max_points: int = 48,
+        ctx: Context = None
+    ) -> Dict[str, Any]:
+        """Météo horaire (<=16j) résumée côté serveur pour rester compacte.
+
+        - Fournir `lat`/`lon`; `days` (<=16), `timezone` optionnel.
+        - `variables` : parmi temperature_2m, apparent_temperature, precipitation, precipitation_probability,
+          relative_humidity_2m, wind_speed_10m, weather_code (défaut : température, pluie, proba pluie, code météo).
+        - `downsample` : "3h" / "6h" / "daypart" (nuit, matin, après-midi, soir) → un bloc par tranche avec
+          min/max/moyenne (pluie = cumul, proba = max) ; "lttb" → séries de `max_points` points gardant pics et creux.
+        - Retour : {mode, coords, downsample{method, raw_points, points}, hourly}.
+        """
+        try:
+            if ctx:
+                await ctx.info(f"Fetching hourly weather for {lat}, {lon} ({downsample})")
+
+            result = w.weather_hourly_core(lat, lon, timezone, days, variables, downsample, max_points)
+
+            if ctx:
+                await ctx.info(f"Hourly weather: {result['downsample']['raw_points']} → {result['downsample']['points']} points")
+
+            return result
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Hourly weather fetch failed: {str(e)}")
+            raise
+
     @mcp.tool(name="health.ping")
     async def ping(ctx: Context = None) -> str:
-        """Ping simple pour vérifier la disponibilité ; répond "pong"."""
+        """Ping simple pour vérifier la disponibilité ; répond "pong".
+
+        Si un service amont (booking, flights, translate) a son circuit ouvert : "pong (degraded: booking, ...)".
+        """
         if ctx:
             await ctx.info("Ping received")
-        return "pong"
+        degraded = health_snapshot()["degraded"]
+        return f"pong (degraded: {', '.join(degraded)})" if degraded else "pong"
+
+    @mcp.tool(name="health.upstreams")
+    async def health_upstreams(ctx: Context = None) -> Dict[str, Any]:
+        """État des services amont (booking, flights, translate) vus par les circuit breakers.
+
+        - Retour : {status: ok|degraded, degraded[], upstreams{nom: {state: closed|open|half_open, calls, failures,
+          slow_calls, failure_rate, p50_latency_s, max_latency_s, rejected, retry_after_s}}}.
+        - Un service `open` échoue immédiatement : inutile de le rappeler avant `retry_after_s`.
+        """
+        if ctx:
+            await ctx.info("Upstream health requested")
+        return health_snapshot()
+
+    @mcp.tool(name="health.prefetch")
+    async def health_prefetch(ctx: Context = None) -> Dict[str, Any]:
+        """Métriques du préchargement en arrière-plan des clés populaires (routes, recherches d'hôtels, climat).
+
+        - Retour : {enabled, running, tracked, hot, queued, calls, cached_calls, prefetch_hits, prefetch_hit_rate,
+          refreshed, failed, deferred_budget, skipped_circuit, dropped_queue_full, budgets{amont: jetons}}.
+        - `prefetch_hit_rate` : part des appels servis par une entrée rafraîchie en arrière-plan.
+        """
+        if ctx:
+            await ctx.info("Prefetch stats requested")
+        return prefetch.stats()
 
     @mcp.tool(name="images.hero")
     async def images_hero(
         trip_code: str,
         prompt: str,
+        async_mode: bool = False,
         ctx: Context = None
     ) -> Dict[str, Any]:
         """Génère l'image principale (Hero) du voyage. Format 1920x1080.
@@ -291,17 +471,30 @@ def create_mcp() -> FastMCP:
             prompt: Description VISUELLE détaillée de la scène.
                     DOIT inclure le LIEU (Ville, Pays) et l'AMBIANCE générale du voyage.
                     EXEMPLE: "Vue panoramique époustouflante du Mont Fuji au lever du soleil, Japon, cerisiers en fleurs au premier plan, lumière dorée."
+            async_mode: Si true, retourne tout de suite {"job_id", "status": "queued", "url": null, ...}
+                        sans attendre la génération (20-60 s). Suivre avec images.status / images.result.
         
         Returns:
             Dict avec structure stable:
-            - Succès: {"success": true, "trip_code": "...", "url": "https://...", "type": "hero", "usage": "..."}
+            - Succès: {"success": true, "trip_code": "...", "url": "https://...", "type": "hero", "usage": "...",
+                        "responsive": {...}}
             - Erreur: {"success": false, "trip_code": "...", "url": null, "error": "...", "type": "hero", "usage": "..."}
+            "url" est le JPEG pleine taille. "responsive" donne les variantes pour le front :
+            {"placeholder": "data:image/jpeg;base64,..." (aperçu flouté), "width", "height",
+             "sources": [{"type": "image/avif", "srcset": "https://... 480w, ..."}, webp, jpeg] (meilleur format d'abord),
+             "variants": [{"format", "width", "height", "bytes", "url"}]}
         """
         try:
             if ctx:
                 await ctx.info(f"Generating hero image (Trip: {trip_code})")
 
-            url = imgs.generate_hero(trip_code, prompt)
+            if async_mode:
+                job = await ij.JOBS.submit("hero", trip_code, {"prompt": prompt})
+                return {"success": True, "trip_code": trip_code, "url": None, "type": "hero",
+                        "usage": "main_image", "job_id": job["job_id"], "status": job["status"]}
+
+            manifest = await imgs.generate_hero(trip_code, prompt, responsive=True)
+            url = manifest["url"]
 
             if ctx:
                 await ctx.info(f"Hero image generated: {url}")
@@ -312,7 +505,8 @@ def create_mcp() -> FastMCP:
                 "trip_code": trip_code,
                 "url": url,
                 "type": "hero",
-                "usage": "main_image"
+                "usage": "main_image",
+                "responsive": manifest
             }
         except Exception as e:
             error_msg = f"Failed to generate hero image: {str(e)}"
@@ -333,6 +527,7 @@ def create_mcp() -> FastMCP:
     async def images_background(
         trip_code: str,
         prompt: str,
+        async_mode: bool = False,
         ctx: Context = None
     ) -> Dict[str, Any]:
         """Génère une image d'arrière-plan (1920x1080).
@@ -344,17 +539,25 @@ def create_mcp() -> FastMCP:
             prompt: Description du LIEU SPÉCIFIQUE de l'étape et de l'ambiance.
                     EXEMPLE: "[Monument/Attraction] in [City], [atmosphere description], [visual details], artistic blur."
                     IMPORTANT: L'image doit être sombre ou peu contrastée pour servir de fond.
+            async_mode: Si true, retourne tout de suite un job_id (voir images.hero).
             
         Returns:
             Dict avec structure stable:
-            - Succès: {"success": true, "trip_code": "...", "url": "https://...", "type": "background", "usage": "..."}
+            - Succès: {"success": true, "trip_code": "...", "url": "https://...", "type": "background", "usage": "...",
+                        "responsive": {...}}
             - Erreur: {"success": false, "trip_code": "...", "url": null, "error": "...", "type": "background", "usage": "..."}
         """
         try:
             if ctx:
                 await ctx.info(f"Generating background image (Trip: {trip_code})")
 
-            url = imgs.generate_background(trip_code, prompt)
+            if async_mode:
+                job = await ij.JOBS.submit("background", trip_code, {"prompt": prompt})
+                return {"success": True, "trip_code": trip_code, "url": None, "type": "background",
+                        "usage": "step_main_image", "job_id": job["job_id"], "status": job["status"]}
+
+            manifest = await imgs.generate_background(trip_code, prompt, responsive=True)
+            url = manifest["url"]
 
             if ctx:
                 await ctx.info(f"Background image generated: {url}")
@@ -365,7 +568,8 @@ def create_mcp() -> FastMCP:
                 "trip_code": trip_code,
                 "url": url,
                 "type": "background",
-                "usage": "step_main_image"
+                "usage": "step_main_image",
+                "responsive": manifest
             }
         except Exception as e:
             error_msg = f"Failed to generate background image: {str(e)}"
@@ -417,17 +621,24 @@ def create_mcp() -> FastMCP:
                target_language="ZH"
            )
         
-        ⚠️ **LIMITES:**
-        - Texte max ~512 tokens (environ 400 mots)
-        - Pour textes très longs, découper en chunks
+        ✂️ **TEXTES LONGS:**
+        - Envoyer le texte entier : au-delà de ~350 tokens il est découpé automatiquement
+          (paragraphes puis phrases), traduit en parallèle et réassemblé ("chunks": n)
+        - Sauts de ligne, préfixes markdown (#, -, 1., >) et blocs de code ``` sont conservés
+        
+        ⏭️ **SANS EFFET:** même langue, nombres/URLs seuls, ou avec source_language="auto"
+        texte déjà dans la langue cible (détection locale) → renvoyé tel quel avec "skipped": "<raison>", sans appel.
+        
+        ♻️ **CACHE:** un texte déjà traduit pour la même paire de langues est servi
+        depuis le cache (mémoire + disque) sans appel au service ("cached": true).
         
         📊 **FORMAT RETOUR:**
-        Succès: {"success": true, "translated_text": "...", "target_language": "fra_Latn"}
+        Succès: {"success": true, "translated_text": "...", "target_language": "fra_Latn", "cached": false}
         Erreur: {"success": false, "error": "Translation service unavailable"}>
         
         Args:
             text: Texte à traduire
-            source_language: Code langue source (EN, FR, ES, DE, IT, PT, NL, RU, AR, ZH)
+            source_language: Code langue source (EN, FR, ES, DE, IT, PT, NL, RU, AR, ZH) ou "auto"
             target_language: Code langue cible
             
         Returns:
@@ -480,6 +691,8 @@ def create_mcp() -> FastMCP:
         ⚠️ **EN CAS D'ERREUR:**
         Retourne le texte original en français (fallback gracieux)
         
+        ⏭️ Un texte déjà en anglais (ou sans texte à traduire) est renvoyé tel quel, sans appel au service.
+        
         Args:
             text: Texte en FRANÇAIS à traduire
             
@@ -504,10 +717,67 @@ def create_mcp() -> FastMCP:
             # Fallback: retourner texte original
             return text
 
+    @mcp.tool(name="text.translate_batch")
+    async def text_translate_batch(
+        texts: List[str],
+        source_language: str = "EN",
+        target_language: str = "FR",
+        ctx: Context = None
+    ) -> Dict[str, Any]:
+        """🌍 Traduit une liste de textes (titres, étapes, activités d'un voyage) en UN seul appel.
+
+        À préférer à plusieurs appels `text.translate` : les doublons ne sont traduits qu'une fois,
+        les textes déjà traduits viennent du cache, le reste part en parallèle.
+
+        ✅ **EXEMPLE:**
+           text.translate_batch(texts=["Day 1: Arrival", "Visit Senso-ji", "Day 1: Arrival"],
+                                source_language="EN", target_language="FR")
+
+        Args:
+            texts: Liste de textes à traduire (max 200)
+            source_language: Code langue source (EN, FR, ES, DE, IT, PT, NL, RU, AR, ZH, code NLLB ou "auto")
+            target_language: Code langue cible
+
+        Returns:
+            {total, unique, succeeded, failed, cached, target_language,
+             results: [{index, success, translated_text | error, cached}]} dans l'ordre des textes reçus
+        """
+        try:
+            if ctx:
+                await ctx.info(f"Batch translating {len(texts)} texts: {source_language} → {target_language}")
+
+            result = await t.translate_batch(texts, source_language, target_language)
+
+            if ctx:
+                await ctx.info(f"Batch translation: {result['succeeded']}/{result['total']} ok, {result['cached']} cached")
+
+            return result
+        except Exception as e:
+            error_msg = f"Failed to translate batch: {str(e)}"
+            if ctx:
+                await ctx.error(error_msg)
+
+            return {
+                "success": False,
+                "error": error_msg
+            }
+
+    @mcp.tool(name="text.cache_stats")
+    async def text_cache_stats(ctx: Context = None) -> Dict[str, Any]:
+        """Compteurs du cache de traduction partagé par text.translate et translate_en.
+
+        - Retour : {memory_hits, disk_hits, misses, hit_rate, memory_size, disk_size, disk_path}.
+        - `misses` = appels réellement envoyés au service NLLB.
+        """
+        if ctx:
+            await ctx.info("Translation cache stats requested")
+        return t.cache_stats()
+
     @mcp.tool(name="images.slider")
     async def images_slider(
         trip_code: str,
         prompt: str,
+        async_mode: bool = False,
         ctx: Context = None
     ) -> Dict[str, Any]:
         """Génère une image illustrative pour un carrousel (800x600).
@@ -519,15 +789,22 @@ def create_mcp() -> FastMCP:
             prompt: Description de l'activité ou du lieu spécifique.
                     DOIT inclure le LIEU.
                     EXEMPLE: "Gros plan sur un bol de ramen fumant à Tokyo, éclairage chaleureux."
+            async_mode: Si true, retourne tout de suite un job_id (voir images.hero).
             
         Returns:
-            Dict contenant l'URL de l'image générée.
+            Dict contenant l'URL de l'image générée et "responsive" (voir images.hero).
         """
         try:
             if ctx:
                 await ctx.info(f"Generating slider image (Trip: {trip_code})")
             
-            url = imgs.generate_slider(trip_code, prompt)
+            if async_mode:
+                job = await ij.JOBS.submit("slider", trip_code, {"prompt": prompt})
+                return {"success": True, "trip_code": trip_code, "url": None, "type": "slider",
+                        "usage": "carousel", "job_id": job["job_id"], "status": job["status"]}
+
+            manifest = await imgs.generate_slider(trip_code, prompt, responsive=True)
+            url = manifest["url"]
             
             if ctx:
                 await ctx.info(f"Slider image generated: {url}")
@@ -535,13 +812,100 @@ def create_mcp() -> FastMCP:
             return {
                 "url": url,
                 "type": "slider",
-                "usage": "carousel"
+                "usage": "carousel",
+                "responsive": manifest
             }
         except Exception as e:
             if ctx:
                 await ctx.error(f"Slider image generation failed: {str(e)}")
             raise
 
+    @mcp.tool(name="images.trip_pack")
+    async def images_trip_pack(
+        trip_code: str,
+        images: List[Dict[str, str]],
+        concurrency: int = imgs.IMAGE_PACK_CONCURRENCY,
+        async_mode: bool = False,
+        ctx: Context = None
+    ) -> Dict[str, Any]:
+        """Génère toutes les images d'une page voyage en parallèle (1 hero, N backgrounds, M sliders).
+
+        À préférer à des appels successifs à images.hero / images.background / images.slider.
+
+        Args:
+            trip_code: Le code unique du voyage (ex: "JP_TOKYO_2025").
+            images: Liste de {"type": "hero" | "background" | "slider", "prompt": "..."} (max 20).
+                    Mêmes règles de prompt que les outils unitaires (LIEU + ambiance).
+                    EXEMPLE: [{"type": "hero", "prompt": "Mont Fuji au lever du soleil, Japon"},
+                              {"type": "slider", "prompt": "Bol de ramen fumant à Tokyo"}]
+            concurrency: Générations simultanées (limites OpenRouter ; les 429 sont re-tentés).
+            async_mode: Si true, retourne tout de suite {"job_id", "status": "queued"} ; images.status donne
+                        alors la progression (done/total) et images.result le manifeste.
+
+        Returns:
+            Manifeste {trip_code, total, succeeded, failed,
+            images: [{index, type, prompt, success, url + responsive (voir images.hero) | error}]}
+            dans l'ordre reçu. Chaque URL est aussi envoyée en notification de progression dès qu'elle est prête.
+        """
+        try:
+            if ctx:
+                await ctx.info(f"Generating {len(images)} images (Trip: {trip_code}, concurrency={concurrency})")
+
+            if async_mode:
+                job = await ij.JOBS.submit("trip_pack", trip_code, {"images": images, "concurrency": concurrency})
+                return {"trip_code": trip_code, "job_id": job["job_id"], "status": job["status"], "total": len(images)}
+
+            async def on_result(entry: Dict[str, Any], done: int, total: int) -> None:
+                if ctx:
+                    status = entry["url"] if entry["success"] else f"failed: {entry.get('error')}"
+                    await ctx.report_progress(done, total, f"{entry['type']} #{entry['index']}: {status}")
+
+            result = await imgs.generate_trip_pack(trip_code, images, concurrency, on_result)
+
+            if ctx:
+                await ctx.info(f"Trip pack: {result['succeeded']}/{result['total']} images generated")
+
+            return result
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Trip pack generation failed: {str(e)}")
+            raise
+
+    @mcp.tool(name="images.status")
+    async def images_status(job_id: str) -> Dict[str, Any]:
+        """État d'un job d'image lancé avec async_mode=true (sans le résultat).
+
+        Args:
+            job_id: Identifiant retourné par images.hero / images.background / images.slider / images.trip_pack.
+
+        Returns:
+            {"job_id", "type", "trip_code", "status": "queued" | "running" | "done" | "failed",
+             "progress": {"done", "total"} | null (trip_pack), "created_at", "started_at", "finished_at", "error"}
+            ou {"success": false, "error": "..."} si le job est inconnu ou expiré.
+        """
+        job = await ij.JOBS.get(job_id)
+        if job is None:
+            return {"success": False, "job_id": job_id, "error": f"Unknown or expired image job '{job_id}'"}
+        return {k: v for k, v in job.items() if k not in ("params", "result")}
+
+    @mcp.tool(name="images.result")
+    async def images_result(job_id: str, wait_s: float = 0, ctx: Context = None) -> Dict[str, Any]:
+        """Résultat d'un job d'image, en attendant au plus wait_s secondes qu'il se termine.
+
+        Args:
+            job_id: Identifiant du job.
+            wait_s: Attente maximale (0 = réponse immédiate, plafonné à 55 s). Relancer tant que status n'est pas final.
+
+        Returns:
+            Le job complet : status + "result" (même contenu que le mode synchrone : {"url", "type", "responsive"}
+            ou le manifeste de images.trip_pack) quand status = "done", "error" quand status = "failed".
+        """
+        wait_s = max(0.0, min(float(wait_s), ij.MAX_WAIT_S))
+        job = await _with_heartbeat(ij.JOBS.wait(job_id, wait_s), ctx, f"Image job {job_id}", None)
+        if job is None:
+            return {"success": False, "job_id": job_id, "error": f"Unknown or expired image job '{job_id}'"}
+        return {k: v for k, v in job.items() if k != "params"}
+
     @mcp.tool(name="debug.ls")
     async def debug_ls(path: str = ".", ctx: Context = None) -> str:
         """Liste un dossier (debug uniquement). Retourne une chaîne multi-lignes."""
@@ -586,6 +950,9 @@ def create_mcp() -> FastMCP:
         max_price: Optional[int] = None,
         min_review_score: Optional[float] = None,
         star_rating: Optional[List[int] | int] = None,
+        profile: Literal["full", "summary", "pricing"] = "full",
+        fields: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
         ctx: Context = None
     ) -> Dict[str, Any]:
         """Recherche Booking.com avec filtres.
@@ -604,9 +971,14 @@ def create_mcp() -> FastMCP:
             star_rating: Étoiles de l'hôtel - FLEXIBLE: int ou list[int]
                          Exemples: star_rating=4 OU star_rating=[4, 5]
                          → Conversion automatique int → list
+            profile: "full" (JSON complet), "summary" (identité, notes, prix, description courte, 1 photo)
+                     ou "pricing" (identité, notes, prix) — projection faite côté serveur
+            fields: Liste explicite de champs d'hôtel à garder (prioritaire sur le profil)
+            timeout: Délai max en secondes (> 0, <= 180) ; la progression est notifiée pendant l'attente
         
         Returns:
-            Liste d'hôtels avec total_found et champs prix/notes
+            Liste d'hôtels avec total_found et champs prix/notes, plus `cache` {status: fresh|stale|miss, age_s}
+            (un résultat `stale` est renvoyé immédiatement pendant qu'il est rafraîchi en arrière-plan)
         
         Examples:
             booking.search(city="[City Name]", checkin="2026-01-13", checkout="2026-01-16", 
@@ -622,7 +994,7 @@ def create_mcp() -> FastMCP:
             if ctx:
                 await ctx.info(f"Searching hotels in {city} from {checkin} to {checkout}")
             
-            result = await b.search_hotels(
+            result = await _with_heartbeat(b.search_hotels(
                 city=city,
                 checkin=checkin,
                 checkout=checkout,
@@ -633,13 +1005,23 @@ def create_mcp() -> FastMCP:
                 min_price=min_price,
                 max_price=max_price,
                 min_review_score=min_review_score,
-                star_rating=star_rating
-            )
+                star_rating=star_rating,
+                timeout=timeout
+            ), ctx, "booking.search", timeout)
+            cache = result.get("cache") or {}
+            prefetch.note("booking", {
+                "city": city, "checkin": checkin, "checkout": checkout, "adults": adults,
+                "children": children, "rooms": rooms, "min_price": min_price, "max_price": max_price,
+                "min_review_score": min_review_score, "star_rating": star_rating,
+            }, cached=cache.get("status") in ("fresh", "stale", "derived"), age=cache.get("age_s") or 0.0,
+                until=checkin)
             
             if ctx:
                 await ctx.info(f"Found {result.get('total_found', 0)} hotels")
             
-            return result
+            return b.project_search(result, profile, fields)
+        except CircuitOpenError as e:
+            return await _circuit_open_response(e, ctx)
         except Exception as e:
             if ctx:
                 await ctx.error(f"Booking search failed: {str(e)}")
@@ -653,35 +1035,99 @@ def create_mcp() -> FastMCP:
         adults: int = 2,
         rooms: int = 1,
         country_code: str = "fr",
+        profile: Literal["full", "summary", "pricing"] = "full",
+        fields: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
         ctx: Context = None
     ) -> Dict[str, Any]:
         """Détails Booking.com pour un hôtel.
 
         - Requis : `hotel_id` ou slug Booking. Optionnels : `checkin`/`checkout` (AAAA-MM-JJ), `adults`, `rooms`, `country_code` pour choisir le domaine.
-        - Retour : description, équipements, chambres, photos et avis consolidés.
+        - `profile` : "full" (tout), "summary" (identité, notes, prix, description tronquée, 3 photos, 3 avis)
+          ou "pricing" (identité, prix, chambres) ; `fields` : champs explicites à garder.
+        - `timeout` : délai max en secondes (> 0, <= 180) ; la progression est notifiée pendant l'attente.
+        - Retour : description, équipements, chambres, photos et avis consolidés (selon le profil).
         """
         try:
             if ctx:
                 await ctx.info(f"Fetching details for hotel {hotel_id}")
             
-            result = await b.get_hotel_details(
+            result = await _with_heartbeat(b.get_hotel_details(
                 hotel_id=hotel_id,
                 checkin=checkin,
                 checkout=checkout,
                 adults=adults,
                 rooms=rooms,
-                country_code=country_code
-            )
+                country_code=country_code,
+                timeout=timeout
+            ), ctx, "booking.details", timeout)
             
             if ctx:
                 await ctx.info("Hotel details retrieved")
             
-            return result
+            return b.project_details(result, profile, fields)
+        except CircuitOpenError as e:
+            return await _circuit_open_response(e, ctx)
         except Exception as e:
             if ctx:
                 await ctx.error(f"Booking details failed: {str(e)}")
             raise
 
+    @mcp.tool(name="booking.details_batch")
+    async def booking_details_batch(
+        hotel_ids: List[str],
+        checkin: Optional[str] = None,
+        checkout: Optional[str] = None,
+        adults: int = 2,
+        rooms: int = 1,
+        country_code: str = "fr",
+        concurrency: int = b.DETAILS_BATCH_CONCURRENCY,
+        item_timeout: float = b.DETAILS_ITEM_TIMEOUT,
+        profile: Literal["full", "summary", "pricing"] = "summary",
+        fields: Optional[List[str]] = None,
+        ctx: Context = None
+    ) -> Dict[str, Any]:
+        """Détails Booking.com pour plusieurs hôtels en parallèle (ex: top 5-10 d'une recherche).
+
+        - Requis : `hotel_ids` (ids ou slugs). Mêmes options que `booking.details`.
+        - `concurrency` : appels scraper simultanés ; `item_timeout` : délai max (s) par hôtel.
+        - `profile`/`fields` : projection de chaque fiche comme `booking.details` (défaut "summary").
+        - Chaque hôtel terminé est signalé via une notification de progression.
+        - Retour : {total, succeeded, failed, results[]} dans l'ordre d'entrée ;
+          un échec n'annule pas le lot ({hotel_id, success: false, error}).
+        """
+        try:
+            if ctx:
+                await ctx.info(f"Fetching details for {len(hotel_ids)} hotels (concurrency={concurrency})")
+
+            async def on_result(item: Dict[str, Any], done: int, total: int) -> None:
+                if ctx:
+                    status = "ok" if item["success"] else f"failed: {item.get('error')}"
+                    await ctx.report_progress(done, total, f"{item['hotel_id']} {status}")
+
+            result = await b.get_hotel_details_batch(
+                hotel_ids=hotel_ids,
+                country_code=country_code,
+                checkin=checkin,
+                checkout=checkout,
+                adults=adults,
+                rooms=rooms,
+                concurrency=concurrency,
+                item_timeout=item_timeout,
+                on_result=on_result,
+                profile=profile,
+                fields=fields
+            )
+
+            if ctx:
+                await ctx.info(f"Hotel details: {result['succeeded']}/{result['total']} retrieved")
+
+            return result
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Booking details batch failed: {str(e)}")
+            raise
+
     @mcp.tool(name="flights.prices")
     async def flights_prices(
         origin: str,
@@ -689,6 +1135,7 @@ def create_mcp() -> FastMCP:
         start_date: str,
         end_date: str,
         force_refresh: bool = False,
+        timeout: Optional[float] = None,
         ctx: Context = None
     ) -> Dict[str, Any]:
         """
@@ -700,35 +1147,168 @@ def create_mcp() -> FastMCP:
             start_date: Date de début de recherche (YYYY-MM-DD).
             end_date: Date de fin de recherche (YYYY-MM-DD).
             force_refresh: Forcer le re-scraping même si en cache (défaut: False).
+            timeout: Délai max en secondes (> 0, <= 180) ; la progression est notifiée pendant l'attente.
             
         Returns:
             Dictionnaire contenant:
             - stats: {min, max, avg, count}
             - prices: Dictionnaire {date: prix} pour chaque jour trouvé.
             - from_cache: bool - Si les données viennent du cache
+            - cache: {cached_days, fetched_days, fetched_ranges} - Jours servis par le cache local par jour ;
+              seuls les jours manquants ou périmés sont re-scrapés (`force_refresh` re-scrape toute la fenêtre)
+              par morceaux parallèles ; `failed_ranges` liste les morceaux en échec (le reste est renvoyé)
         """
         try:
             if ctx:
                 await ctx.info(f"Scraping flight prices from {origin} to {destination} ({start_date} to {end_date})")
             
-            result = await f.get_flight_prices(
+            result = await _with_heartbeat(f.get_flight_prices(
                 origin=origin,
                 destination=destination,
                 start_date=start_date,
                 end_date=end_date,
-                force_refresh=force_refresh
-            )
+                force_refresh=force_refresh,
+                timeout=timeout
+            ), ctx, "flights.prices", timeout)
+            prefetch.note("flights", {"origin": origin.upper(), "destination": destination.upper(),
+                                      "start_date": start_date, "end_date": end_date},
+                          cached=bool(result.get("from_cache")), until=end_date)
             
             if ctx:
                 price_count = len(result.get('prices', {}))
                 await ctx.info(f"Found {price_count} flight prices")
             
             return result
+        except CircuitOpenError as e:
+            return await _circuit_open_response(e, ctx)
         except Exception as e:
             if ctx:
                 await ctx.error(f"Flight scraping failed: {str(e)}")
             raise
 
+    @mcp.tool(name="flights.matrix")
+    async def flights_matrix(
+        origins: List[str],
+        destinations: List[str],
+        start_date: str,
+        end_date: str,
+        top_k: int = 5,
+        timeout: Optional[float] = None,
+        ctx: Context = None
+    ) -> Dict[str, Any]:
+        """
+        Calendriers de prix pour plusieurs origines × destinations en un seul appel.
+
+        Exemple : « Paris ou Bruxelles → Tokyo ou Osaka » :
+            flights.matrix(origins=["CDG", "BRU"], destinations=["NRT", "KIX"],
+                           start_date="2026-04-01", end_date="2026-04-30")
+
+        Args:
+            origins: Codes IATA de départ (ex: ["CDG", "BRU"]).
+            destinations: Codes IATA d'arrivée (ex: ["NRT", "KIX"]). Max 25 paires.
+            start_date: Date de début (YYYY-MM-DD).
+            end_date: Date de fin (YYYY-MM-DD).
+            top_k: Nombre d'options les moins chères à renvoyer globalement.
+            timeout: Délai max en secondes par appel scraper (> 0, <= 180).
+
+        Returns:
+            - cube: {origine: {destination: {date: prix}}}
+            - pairs: [{origin, destination, min, avg, count, cheapest_date}] triées par prix min
+            - cheapest: top_k {origin, destination, date, price} toutes paires confondues
+            - errors: paires en échec (les autres sont renvoyées)
+        """
+        try:
+            if ctx:
+                await ctx.info(f"Flight matrix {origins} x {destinations} ({start_date} to {end_date})")
+
+            result = await _with_heartbeat(f.get_flight_price_matrix(
+                origins=origins,
+                destinations=destinations,
+                start_date=start_date,
+                end_date=end_date,
+                top_k=top_k,
+                timeout=timeout
+            ), ctx, "flights.matrix", None)
+
+            if ctx:
+                await ctx.info(f"Flight matrix: {len(result['pairs'])} pairs, {len(result['errors'])} errors")
+
+            return result
+        except CircuitOpenError as e:
+            return await _circuit_open_response(e, ctx)
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Flight matrix failed: {str(e)}")
+            raise
+
+    @mcp.tool(name="flights.best_window")
+    async def flights_best_window(
+        origin: str,
+        destination: str,
+        start_date: str,
+        end_date: str,
+        min_days: int = 3,
+        max_days: int = 10,
+        round_trip: bool = True,
+        top_k: int = 5,
+        timeout: Optional[float] = None,
+        ctx: Context = None
+    ) -> Dict[str, Any]:
+        """
+        Meilleures combinaisons aller/retour sur une période, calculées côté serveur.
+
+        Évite de raisonner sur tout le calendrier de prix : le serveur combine le
+        calendrier aller (origin → destination) et retour (destination → origin),
+        en réutilisant le cache des prix par jour.
+
+        Exemple : « Paris → Tokyo en avril, séjour de 7 à 14 jours » :
+            flights.best_window(origin="CDG", destination="NRT",
+                                start_date="2026-04-01", end_date="2026-04-30",
+                                min_days=7, max_days=14)
+
+        Args:
+            origin: Code IATA de départ (ex: "CDG").
+            destination: Code IATA d'arrivée (ex: "NRT").
+            start_date: Premier jour de départ possible (YYYY-MM-DD).
+            end_date: Dernier jour de départ possible (YYYY-MM-DD).
+            min_days: Durée minimale du séjour en jours.
+            max_days: Durée maximale du séjour en jours (<= 60).
+            round_trip: False pour un aller simple (meilleurs jours de départ).
+            top_k: Nombre de fenêtres à renvoyer (une par jour de départ).
+            timeout: Délai max en secondes par appel scraper (> 0, <= 180).
+
+        Returns:
+            - windows: [{depart, return, nights, outbound_price, return_price, total}] du moins cher au plus cher
+            - searched: nombre de jours avec prix considérés (aller / retour)
+            - cache: usage du cache pour chaque calendrier
+        """
+        try:
+            if ctx:
+                await ctx.info(f"Best window {origin}->{destination} ({start_date} to {end_date}, {min_days}-{max_days} days)")
+
+            result = await _with_heartbeat(f.get_best_trip_windows(
+                origin=origin,
+                destination=destination,
+                start_date=start_date,
+                end_date=end_date,
+                min_days=min_days,
+                max_days=max_days,
+                round_trip=round_trip,
+                top_k=top_k,
+                timeout=timeout
+            ), ctx, "flights.best_window", None)
+
+            if ctx:
+                await ctx.info(f"Best window: {len(result['windows'])} options")
+
+            return result
+        except CircuitOpenError as e:
+            return await _circuit_open_response(e, ctx)
+        except Exception as e:
+            if ctx:
+                await ctx.error(f"Best window search failed: {str(e)}")
+            raise
+
     from .resources import register_resources
     register_resources(mcp)
 
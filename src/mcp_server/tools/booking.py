@@ -2,10 +2,19 @@
 MCP Tool wrapper for Travliaq Booking Scrapper API.
 Uses HTTP calls to the deployed Railway API instead of direct code imports.
 """
+import asyncio
+import bisect
 import httpx
-from typing import Dict, Any, List, Optional
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
 import os
 
+from .cache import TTLCache
+from .circuit import effective_timeout, get_breaker
+
+logger = logging.getLogger(__name__)
+
 # API Base URL - can be overridden via environment variable
 BOOKING_API_URL = os.getenv(
     "BOOKING_API_URL", 
@@ -15,6 +24,278 @@ BOOKING_API_URL = os.getenv(
 # Default timeout for HTTP requests (3 minutes)
 DEFAULT_TIMEOUT = 180.0
 
+# Search cache: fresh for 10 min, then served stale (and refreshed in background) up to 1 h
+SEARCH_CACHE_TTL = float(os.getenv("BOOKING_SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("BOOKING_SEARCH_CACHE_STALE_TTL", "3600"))
+
+_SEARCH_CACHE = TTLCache(ttl=SEARCH_CACHE_TTL, stale_ttl=SEARCH_CACHE_STALE_TTL, maxsize=512)
+_REFRESH_TASKS: Dict[Tuple[Any, ...], "asyncio.Task[Any]"] = {}
+# Cached searches grouped by (city, dates, occupancy) so narrower queries can reuse a broader one
+_BASE_INDEX: Dict[Tuple[Any, ...], set] = {}
+_HOTEL_INDEXES = TTLCache(ttl=SEARCH_CACHE_TTL, maxsize=512)
+
+# Field names seen in scraper payloads for the values we can filter on locally
+# Only explicit nightly prices: "price" / "min_price" may be a stay total, so searches with a
+# price filter over hotels lacking price_per_night go back to the scraper
+PRICE_FIELDS = ("price_per_night",)
+SCORE_FIELDS = ("review_score", "rating", "score")
+STARS_FIELDS = ("star_rating", "stars")
+BASE_KEY_LEN = 6
+
+# Response profiles for compact payloads: kept keys, text budget (chars) and list caps.
+# "full" returns the scraper JSON untouched.
+_ID_KEYS = ("hotel_id", "id", "name", "url")
+_RATING_KEYS = ("star_rating", "stars", "review_score", "rating", "review_count")
+_PRICE_KEYS = ("price", "price_per_night", "min_price", "currency")
+DETAILS_PROFILES: Dict[str, Dict[str, Any]] = {
+    "summary": {
+        "keys": _ID_KEYS + _RATING_KEYS + _PRICE_KEYS + (
+            "address", "location", "checkin_time", "checkout_time",
+            "description", "highlights", "amenities", "photos", "reviews"),
+        "text": 400,
+        "lists": {"amenities": 15, "photos": 3, "reviews": 3, "highlights": 5},
+        "nested_list": 5,
+    },
+    "pricing": {
+        "keys": _ID_KEYS + _RATING_KEYS + _PRICE_KEYS + ("checkin_time", "checkout_time", "rooms"),
+        "text": 160,
+        "lists": {"rooms": 10},
+        "nested_list": 3,
+    },
+}
+SEARCH_PROFILES: Dict[str, Dict[str, Any]] = {
+    "summary": {
+        "keys": _ID_KEYS + _RATING_KEYS + _PRICE_KEYS + ("address", "distance_from_center", "description", "photos"),
+        "text": 160,
+        "lists": {"photos": 1},
+        "nested_list": 3,
+    },
+    "pricing": {
+        "keys": _ID_KEYS + _RATING_KEYS + _PRICE_KEYS,
+        "text": 160,
+        "lists": {},
+        "nested_list": 3,
+    },
+}
+DEFAULT_LIST_CAP = 10
+
+# Batch details: parallel scraper calls allowed and per-hotel timeout (seconds)
+DETAILS_BATCH_CONCURRENCY = int(os.getenv("BOOKING_DETAILS_CONCURRENCY", "4"))
+DETAILS_ITEM_TIMEOUT = float(os.getenv("BOOKING_DETAILS_ITEM_TIMEOUT", "120"))
+
+
+def _search_params(city: str, checkin: str, checkout: str, adults: int, children: int, rooms: int,
+                   min_price: Optional[int], max_price: Optional[int], min_review_score: Optional[float],
+                   star_rating: Optional[List[int]]) -> Dict[str, Any]:
+    """Query parameters for /search_hotels (optional filters only when set)."""
+    params = {
+        "city": city,
+        "checkin": checkin,
+        "checkout": checkout,
+        "adults": adults,
+        "children": children,
+        "rooms": rooms,
+    }
+
+    # Add optional filters
+    if min_price is not None:
+        params["min_price"] = min_price
+    if max_price is not None:
+        params["max_price"] = max_price
+    if min_review_score is not None:
+        params["min_review_score"] = min_review_score
+    if star_rating is not None:
+        # Convert list to comma-separated string if needed by API
+        params["star_rating"] = star_rating
+    return params
+
+
+def _search_key(params: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Canonical cache key: case/spacing-insensitive city, numeric filters, sorted star ratings."""
+    stars = params.get("star_rating")
+    return (
+        " ".join(str(params["city"]).split()).casefold(),
+        params["checkin"],
+        params["checkout"],
+        int(params["adults"]),
+        int(params["children"]),
+        int(params["rooms"]),
+        float(params["min_price"]) if params.get("min_price") is not None else None,
+        float(params["max_price"]) if params.get("max_price") is not None else None,
+        float(params["min_review_score"]) if params.get("min_review_score") is not None else None,
+        tuple(sorted({int(s) for s in stars})) if stars else None,
+    )
+
+
+async def _get(path: str, params: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """GET on the scraper API through the booking circuit breaker."""
+    async def request() -> Dict[str, Any]:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(f"{BOOKING_API_URL}{path}", params=params)
+            response.raise_for_status()
+            return response.json()
+
+    return await get_breaker("booking").call(request)
+
+
+async def _fetch_search(params: Dict[str, Any], timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    return await _get("/api/v1/search_hotels", params, timeout)
+
+
+def _schedule_refresh(key: Tuple[Any, ...], params: Dict[str, Any]) -> None:
+    """Refresh a stale search in the background (at most one refresh per key)."""
+    if key in _REFRESH_TASKS:
+        return
+
+    async def refresh() -> None:
+        try:
+            await _SEARCH_CACHE.coalesce(key, lambda: _fetch_search(params))
+        except Exception as e:
+            logger.warning(f"Background hotel search refresh failed for {key[0]}: {e}")
+        finally:
+            _REFRESH_TASKS.pop(key, None)
+
+    _REFRESH_TASKS[key] = asyncio.get_running_loop().create_task(refresh())
+
+
+def _with_cache_meta(result: Dict[str, Any], status: str, age: float) -> Dict[str, Any]:
+    return {**result, "cache": {"status": status, "age_s": round(age, 1)}}
+
+
+def _as_number(value: Any) -> Optional[float]:
+    """Parse 123, "123.5", "€ 1.250", "1.250,50 €" or "US$1,234.56" into a float; None when there is no number."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d[\d\s.,\u202f\u00a0]*", str(value))
+    if not match:
+        return None
+    raw = re.sub(r"[\s\u202f\u00a0]", "", match.group(0)).rstrip(".,")
+    # The last separator is the decimal mark unless exactly 3 digits follow it (thousands grouping)
+    mark = max(raw.rfind("."), raw.rfind(","))
+    if mark >= 0 and len(raw) - mark - 1 != 3:
+        raw = f"{re.sub(r'[.,]', '', raw[:mark])}.{raw[mark + 1:]}"
+    else:
+        raw = re.sub(r"[.,]", "", raw)
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def _field(hotel: Dict[str, Any], names: Tuple[str, ...]) -> Optional[float]:
+    """First alias holding a usable number (a key present with null falls through to the next one)."""
+    for name in names:
+        value = _as_number(hotel.get(name))
+        if value is not None:
+            return value
+    return None
+
+
+class _HotelIndex:
+    """Hotels of one cached search, sorted by price for range lookups."""
+
+    def __init__(self, hotels: List[Dict[str, Any]]):
+        rows = []
+        for pos, hotel in enumerate(hotels):
+            rows.append((
+                _field(hotel, PRICE_FIELDS),
+                pos,
+                _field(hotel, SCORE_FIELDS),
+                _field(hotel, STARS_FIELDS),
+                hotel,
+            ))
+        self.hotels = hotels
+        self.has_price = all(r[0] is not None for r in rows)
+        self.has_score = all(r[2] is not None for r in rows)
+        self.has_stars = all(r[3] is not None for r in rows)
+        self._by_price = sorted((r for r in rows if r[0] is not None), key=lambda r: (r[0], r[1]))
+        self._prices = [r[0] for r in self._by_price]
+
+    def can_filter(self, min_price, max_price, min_review_score, star_rating) -> bool:
+        if (min_price is not None or max_price is not None) and not self.has_price:
+            return False
+        if min_review_score is not None and not self.has_score:
+            return False
+        if star_rating is not None and not self.has_stars:
+            return False
+        return True
+
+    def filter(self, min_price, max_price, min_review_score, star_rating) -> List[Dict[str, Any]]:
+        if min_price is None and max_price is None:
+            candidates = [(None, pos, _field(h, SCORE_FIELDS), _field(h, STARS_FIELDS), h)
+                          for pos, h in enumerate(self.hotels)]
+        else:
+            lo = bisect.bisect_left(self._prices, min_price) if min_price is not None else 0
+            hi = bisect.bisect_right(self._prices, max_price) if max_price is not None else len(self._prices)
+            candidates = self._by_price[lo:hi]
+        kept = [
+            r for r in candidates
+            if (min_review_score is None or r[2] >= min_review_score)
+            and (star_rating is None or int(r[3]) in star_rating)
+        ]
+        kept.sort(key=lambda r: r[1])  # back to scraper order (relevance)
+        return [r[4] for r in kept]
+
+
+def _narrows(broad: Tuple[Any, ...], narrow: Tuple[Any, ...]) -> bool:
+    """True if the filters of `narrow` select a subset of what `broad` selected."""
+    b_min, b_max, b_score, b_stars = broad[BASE_KEY_LEN:]
+    n_min, n_max, n_score, n_stars = narrow[BASE_KEY_LEN:]
+    return (
+        (b_min is None or (n_min is not None and n_min >= b_min))
+        and (b_max is None or (n_max is not None and n_max <= b_max))
+        and (b_score is None or (n_score is not None and n_score >= b_score))
+        and (b_stars is None or (n_stars is not None and set(n_stars) <= set(b_stars)))
+    )
+
+
+def _is_complete(result: Dict[str, Any]) -> bool:
+    """A cached result can be narrowed only if the scraper returned every match it found."""
+    hotels = result.get("hotels") or []
+    total = result.get("total_found")
+    return isinstance(hotels, list) and (total is None or total <= len(hotels))
+
+
+def _register_search(key: Tuple[Any, ...]) -> None:
+    """Index a cached search by base key; dead keys are swept once the index outgrows the cache."""
+    _BASE_INDEX.setdefault(key[:BASE_KEY_LEN], set()).add(key)
+    if len(_BASE_INDEX) > _SEARCH_CACHE.maxsize:
+        for base, keys in list(_BASE_INDEX.items()):
+            for dead in [k for k in keys if k not in _SEARCH_CACHE]:
+                keys.discard(dead)
+                _HOTEL_INDEXES.pop(dead, None)
+            if not keys:
+                del _BASE_INDEX[base]
+
+
+def _derive_from_broader(key: Tuple[Any, ...], max_results: int) -> Optional[Dict[str, Any]]:
+    """Answer a narrower search locally from a fresh, complete broader result."""
+    for broad_key in list(_BASE_INDEX.get(key[:BASE_KEY_LEN], ())):
+        if broad_key == key or not _narrows(broad_key, key):
+            continue
+        found = _SEARCH_CACHE.lookup(broad_key, count=False)
+        if found is None:
+            _BASE_INDEX[key[:BASE_KEY_LEN]].discard(broad_key)
+            _HOTEL_INDEXES.pop(broad_key, None)
+            continue
+        cached, age = found
+        if not _SEARCH_CACHE.is_fresh(age) or not _is_complete(cached):
+            continue
+        entry = _HOTEL_INDEXES.get(broad_key)
+        if entry is None or entry[0] is not cached:
+            entry = (cached, _HotelIndex(cached.get("hotels") or []))
+            _HOTEL_INDEXES.set(broad_key, entry)
+        index = entry[1]
+        min_price, max_price, min_score, stars = key[BASE_KEY_LEN:]
+        if not index.can_filter(min_price, max_price, min_score, stars):
+            continue
+        hotels = index.filter(min_price, max_price, min_score, stars)
+        derived = {**cached, "total_found": len(hotels), "hotels": hotels[:max(0, max_results)]}
+        return {**derived, "cache": {"status": "derived", "age_s": round(age, 1)}}
+    return None
+
 
 async def search_hotels(
     city: str,
@@ -28,6 +309,7 @@ async def search_hotels(
     max_price: Optional[int] = None,
     min_review_score: Optional[float] = None,
     star_rating: Optional[List[int]] = None,
+    timeout: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Search for hotels on Booking.com via the REST API.
@@ -44,39 +326,59 @@ async def search_hotels(
         max_price: Maximum price filter (optional)
         min_review_score: Minimum review score 0-10 (optional)
         star_rating: List of star ratings to filter (e.g., [3, 4, 5])
+        timeout: Deadline in seconds for the scraper call (capped at DEFAULT_TIMEOUT)
         
     Returns:
-        Dict containing 'total_found' and list 'hotels' with search results
+        Dict containing 'total_found' and list 'hotels' with search results, plus
+        'cache': {status: fresh|stale|miss|derived, age_s}. Stale results are returned
+        immediately while a background refresh updates the cache; "derived" results
+        are narrowed locally (filters + max_results) from a broader cached search.
     """
-    # Build query parameters
-    params = {
-        "city": city,
-        "checkin": checkin,
-        "checkout": checkout,
-        "adults": adults,
-        "children": children,
-        "rooms": rooms,
-    }
-    
-    # Add optional filters
-    if min_price is not None:
-        params["min_price"] = min_price
-    if max_price is not None:
-        params["max_price"] = max_price
-    if min_review_score is not None:
-        params["min_review_score"] = min_review_score
-    if star_rating is not None:
-        # Convert list to comma-separated string if needed by API
-        params["star_rating"] = star_rating
-    
-    # Make HTTP request
-    async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-        response = await client.get(
-            f"{BOOKING_API_URL}/api/v1/search_hotels",
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
+    deadline = effective_timeout(timeout, DEFAULT_TIMEOUT)
+    params = _search_params(city, checkin, checkout, adults, children, rooms,
+                            min_price, max_price, min_review_score, star_rating)
+
+    # Serve from cache (stale-while-revalidate) before calling the scraper
+    key = _search_key(params)
+    found = _SEARCH_CACHE.lookup(key)
+    if found is not None:
+        cached, age = found
+        if _SEARCH_CACHE.is_fresh(age):
+            return _with_cache_meta(cached, "fresh", age)
+        _schedule_refresh(key, params)
+        return _with_cache_meta(cached, "stale", age)
+
+    # Strict narrowing of a cached broader search: filter locally instead of re-scraping
+    derived = _derive_from_broader(key, max_results)
+    if derived is not None:
+        return derived
+
+    result = await _SEARCH_CACHE.coalesce(key, lambda: _fetch_search(params, deadline))
+    _register_search(key)
+    return _with_cache_meta(result, "miss", 0.0)
+
+
+async def refresh_search(
+    city: str,
+    checkin: str,
+    checkout: str,
+    adults: int = 2,
+    children: int = 0,
+    rooms: int = 1,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    min_review_score: Optional[float] = None,
+    star_rating: Optional[List[int]] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Re-scrape a search and replace its cache entry, even while it is still fresh (prefetch)."""
+    deadline = effective_timeout(timeout, DEFAULT_TIMEOUT)
+    params = _search_params(city, checkin, checkout, adults, children, rooms,
+                            min_price, max_price, min_review_score, star_rating)
+    key = _search_key(params)
+    await _SEARCH_CACHE.coalesce(key, lambda: _fetch_search(params, deadline))
+    _HOTEL_INDEXES.pop(key, None)
+    _register_search(key)
 
 
 async def get_hotel_details(
@@ -86,6 +388,7 @@ async def get_hotel_details(
     checkout: Optional[str] = None,
     adults: int = 2,
     rooms: int = 1,
+    timeout: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Get detailed information about a specific hotel from Booking.com via the REST API.
@@ -97,10 +400,12 @@ async def get_hotel_details(
         checkout: Check-out date (YYYY-MM-DD, optional)
         adults: Number of adults (default: 2)
         rooms: Number of rooms (default: 1)
+        timeout: Deadline in seconds for the scraper call (capped at DEFAULT_TIMEOUT)
         
     Returns:
         Dict containing complete hotel details (description, amenities, rooms, reviews, etc.)
     """
+    deadline = effective_timeout(timeout, DEFAULT_TIMEOUT)
     # Build query parameters
     params = {
         "hotel_id": hotel_id,
@@ -116,10 +421,149 @@ async def get_hotel_details(
         params["checkout"] = checkout
     
     # Make HTTP request
-    async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-        response = await client.get(
-            f"{BOOKING_API_URL}/api/v1/hotel_details",
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
+    return await _get("/api/v1/hotel_details", params, deadline)
+
+
+async def get_hotel_details_batch(
+    hotel_ids: List[str],
+    country_code: str,
+    checkin: Optional[str] = None,
+    checkout: Optional[str] = None,
+    adults: int = 2,
+    rooms: int = 1,
+    concurrency: int = DETAILS_BATCH_CONCURRENCY,
+    item_timeout: float = DETAILS_ITEM_TIMEOUT,
+    on_result: Optional[Callable[[Dict[str, Any], int, int], Awaitable[None]]] = None,
+    profile: str = "full",
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Fetch details for several hotels concurrently.
+
+    At most `concurrency` scraper calls run at once and each one is bounded by
+    `item_timeout` seconds. `on_result(item, done, total)` is awaited as each
+    hotel completes. Failed items are reported in place; they never fail the batch.
+    Each payload is projected with `project_details(profile, fields)`.
+
+    Returns:
+        Dict with 'total', 'succeeded', 'failed' and 'results' (input order,
+        duplicates removed), each result being
+        {hotel_id, success, details} or {hotel_id, success: False, error}.
+    """
+    _check_profile(profile, DETAILS_PROFILES)
+    ids = list(dict.fromkeys(h.strip() for h in hotel_ids if h and h.strip()))
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def one(pos: int, hotel_id: str) -> Tuple[int, Dict[str, Any]]:
+        async with sem:
+            try:
+                details = await asyncio.wait_for(
+                    get_hotel_details(hotel_id=hotel_id, country_code=country_code, checkin=checkin,
+                                      checkout=checkout, adults=adults, rooms=rooms),
+                    timeout=item_timeout,
+                )
+                return pos, {"hotel_id": hotel_id, "success": True,
+                             "details": project_details(details, profile, fields)}
+            except asyncio.TimeoutError:
+                return pos, {"hotel_id": hotel_id, "success": False,
+                             "error": f"Timeout after {item_timeout:.0f}s"}
+            except Exception as e:
+                return pos, {"hotel_id": hotel_id, "success": False, "error": str(e)}
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(ids)
+    tasks = [asyncio.ensure_future(one(i, hotel_id)) for i, hotel_id in enumerate(ids)]
+    try:
+        for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            pos, item = await next_done
+            results[pos] = item
+            if on_result:
+                try:
+                    await on_result(item, done, len(ids))
+                except Exception as e:
+                    logger.warning(f"Batch progress callback failed: {e}")
+    finally:
+        # Client gone or error: do not leave orphaned scrapes running
+        for task in tasks:
+            task.cancel()
+
+    succeeded = sum(1 for r in results if r and r["success"])
+    return {
+        "total": len(ids),
+        "succeeded": succeeded,
+        "failed": len(ids) - succeeded,
+        "results": results,
+    }
+
+
+def _truncate(text: str, budget: int) -> str:
+    if len(text) <= budget:
+        return text
+    cut = text[:budget].rsplit(" ", 1)[0] or text[:budget]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def _compact(value: Any, text_budget: int, list_cap: int) -> Any:
+    """Truncate strings and cap lists recursively (used inside kept fields)."""
+    if isinstance(value, str):
+        return _truncate(value, text_budget)
+    if isinstance(value, list):
+        return [_compact(v, text_budget, list_cap) for v in value[:list_cap]]
+    if isinstance(value, dict):
+        return {k: _compact(v, text_budget, list_cap) for k, v in value.items()}
+    return value
+
+
+def _project_hotel(hotel: Dict[str, Any], spec: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    keys = fields or spec["keys"]
+    out: Dict[str, Any] = {}
+    for key in keys:
+        if key not in hotel:
+            continue
+        value = hotel[key]
+        if isinstance(value, list):
+            cap = spec["lists"].get(key, DEFAULT_LIST_CAP)
+            value = [_compact(v, spec["text"] // 2, spec["nested_list"]) for v in value[:cap]]
+            if len(hotel[key]) > cap:
+                out[f"{key}_total"] = len(hotel[key])
+        else:
+            value = _compact(value, spec["text"], spec["nested_list"])
+        out[key] = value
+    return out
+
+
+def _check_profile(profile: str, profiles: Dict[str, Dict[str, Any]]) -> None:
+    if profile != "full" and profile not in profiles:
+        raise ValueError(f"Unknown profile '{profile}' (expected: full, {', '.join(profiles)})")
+
+
+def project_details(data: Dict[str, Any], profile: str = "full", fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Project a hotel details payload on the server.
+
+    Args:
+        data: Scraper payload (hotel fields at the top level or under 'hotel')
+        profile: "summary" (identity, ratings, short description, few photos/reviews),
+                 "pricing" (identity, price fields, rooms) or "full" (untouched)
+        fields: Explicit top-level hotel keys to keep (overrides the profile key set)
+    """
+    _check_profile(profile, DETAILS_PROFILES)
+    if profile == "full" and not fields:
+        return data
+    if isinstance(data.get("hotel"), dict):
+        return {**data, "hotel": project_details(data["hotel"], profile, fields)}
+    if profile == "full":
+        return {k: data[k] for k in fields if k in data}
+    return {**_project_hotel(data, DETAILS_PROFILES[profile], fields), "profile": profile}
+
+
+def project_search(data: Dict[str, Any], profile: str = "full", fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Same as `project_details`, applied to every hotel of a search result."""
+    _check_profile(profile, SEARCH_PROFILES)
+    if profile == "full" and not fields:
+        return data
+    hotels = data.get("hotels") or []
+    if profile == "full":
+        projected = [{k: h[k] for k in fields if k in h} for h in hotels]
+    else:
+        projected = [_project_hotel(h, SEARCH_PROFILES[profile], fields) for h in hotels]
+    return {**data, "hotels": projected, "profile": profile}
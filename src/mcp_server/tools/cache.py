@@ -0,0 +1,125 @@
+"""
+Small in-process caches shared by the MCP tools.
+
+Entries are kept in LRU order with a freshness TTL and an optional stale
+window, so callers can decide whether a stale value is still usable.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Inflight:
+    """A shared fetch task and how many callers are waiting on it."""
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class TTLCache:
+    """LRU cache with a freshness TTL and an optional stale window (seconds)."""
+
+    def __init__(self, ttl: float, maxsize: int = 1024, stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "_Inflight"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.lookup(key, count=False) is not None
+
+    def lookup(self, key: Hashable, count: bool = True) -> Optional[Tuple[Any, float]]:
+        """Return `(value, age_s)` while the entry is fresh or within the stale window."""
+        entry = self._data.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value, age
+            del self._data[key]
+        if count:
+            self.misses += 1
+        return None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value only while it is fresh."""
+        found = self.lookup(key, count=False)
+        if found is None or found[1] >= self.ttl:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return found[0]
+
+    def is_fresh(self, age: float) -> bool:
+        return age < self.ttl
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the fresh cached value or await `fetch()` once, even for concurrent callers."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        return await self.coalesce(key, fetch)
+
+    async def coalesce(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fetch()` and store its result; concurrent callers for the same key share one call.
+
+        The fetch runs as its own task: a caller that is cancelled (client gone, timeout)
+        only stops waiting, and the fetch is cancelled once its last waiter has left.
+        """
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = _Inflight(asyncio.ensure_future(fetch()))
+            entry.task.add_done_callback(lambda task: self._finish(key, entry, task))
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if entry.waiters == 1 and not entry.task.done():
+                entry.task.cancel()
+            raise
+        finally:
+            entry.waiters -= 1
+
+    def _finish(self, key: Hashable, entry: "_Inflight", task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        # Lu ici pour éviter "Task exception was never retrieved" quand plus personne n'attend
+        if task.exception() is None:
+            self.set(key, task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
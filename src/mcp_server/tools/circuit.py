@@ -0,0 +1,185 @@
+"""
+Per-upstream circuit breakers for the Railway scraper/translation services.
+
+Each breaker keeps a rolling window of call outcomes and latencies. When the
+share of failed or slow calls crosses a threshold the circuit opens and calls
+fail immediately with `CircuitOpenError` instead of waiting for the full
+upstream timeout. After a cool-down a limited number of probe calls are let
+through (half-open); a successful probe closes the circuit again.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+WINDOW_S = float(os.getenv("CIRCUIT_WINDOW_S", "120"))
+MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+OPEN_S = float(os.getenv("CIRCUIT_OPEN_S", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(
+            f"Service '{upstream}' temporarily unavailable (circuit open), retry in {retry_after:.0f}s"
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": str(self),
+            "upstream": self.upstream,
+            "circuit": OPEN,
+            "retry_after_s": round(self.retry_after, 1),
+        }
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """Network errors, timeouts and 5xx/429 count against the upstream; other 4xx do not."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, (httpx.RequestError, asyncio.TimeoutError, TimeoutError))
+
+
+def effective_timeout(timeout: Optional[float], cap: float) -> float:
+    """Caller deadline for an upstream call, never longer than `cap`; None means `cap`."""
+    if timeout is None:
+        return cap
+    if timeout <= 0:
+        raise ValueError(f"timeout must be a positive number of seconds, got {timeout}")
+    return min(float(timeout), cap)
+
+
+class CircuitBreaker:
+    """Rolling-window breaker: opens on failure rate or slow-call rate, probes when half-open."""
+
+    def __init__(self, name: str, slow_call_s: Optional[float] = None, window_s: float = WINDOW_S,
+                 min_calls: int = MIN_CALLS, failure_rate: float = FAILURE_RATE, open_s: float = OPEN_S,
+                 half_open_probes: int = 1):
+        self.name = name
+        self.slow_call_s = slow_call_s
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_s = open_s
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._calls: Deque[Tuple[float, bool, bool, float]] = deque()
+        self.rejected = 0
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_s:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpenError` if the call must not reach the upstream."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self.open_s - (now - self._opened_at)
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_s / 2)
+            self._probes += 1
+
+    def record(self, ok: bool, latency: float) -> None:
+        now = time.monotonic()
+        slow = self.slow_call_s is not None and latency > self.slow_call_s
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if ok and not slow:
+                self.state = CLOSED
+                self._calls.clear()
+            else:
+                self._open(now)
+            return
+        self._calls.append((now, ok, slow, latency))
+        self._prune(now)
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            bad = sum(1 for _, c_ok, c_slow, _ in self._calls if not c_ok or c_slow)
+            if bad / len(self._calls) >= self.failure_rate:
+                self._open(now)
+
+    def release(self) -> None:
+        """Give back a half-open probe slot when a call ends without an outcome (cancelled)."""
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.before_call()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as exc:
+            self.record(not is_upstream_failure(exc), time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._prune(now)
+        calls = len(self._calls)
+        failures = sum(1 for _, ok, _, _ in self._calls if not ok)
+        slow = sum(1 for _, _, is_slow, _ in self._calls if is_slow)
+        latencies = sorted(lat for _, _, _, lat in self._calls)
+        state = self.state
+        if state == OPEN and now - self._opened_at >= self.open_s:
+            state = HALF_OPEN
+        return {
+            "state": state,
+            "window_s": self.window_s,
+            "calls": calls,
+            "failures": failures,
+            "slow_calls": slow,
+            "failure_rate": round((failures + slow) / calls, 3) if calls else 0.0,
+            "p50_latency_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "max_latency_s": round(latencies[-1], 2) if latencies else None,
+            "rejected": self.rejected,
+            "retry_after_s": round(max(0.0, self.open_s - (now - self._opened_at)), 1) if state == OPEN else 0.0,
+        }
+
+
+# One breaker per Railway upstream; slow-call thresholds sit below each client timeout
+BREAKERS: Dict[str, CircuitBreaker] = {
+    "booking": CircuitBreaker("booking", slow_call_s=150.0),
+    "flights": CircuitBreaker("flights", slow_call_s=150.0),
+    "translate": CircuitBreaker("translate", slow_call_s=25.0),
+}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    return BREAKERS[name]
+
+
+def health_snapshot() -> Dict[str, Any]:
+    upstreams = {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
+    degraded = sorted(name for name, snap in upstreams.items() if snap["state"] != CLOSED)
+    return {"status": "degraded" if degraded else "ok", "degraded": degraded, "upstreams": upstreams}
@@ -2,11 +2,21 @@
 MCP Tool wrapper for Travliaq Google Flights Scrapper API.
 Uses HTTP calls to the deployed Railway API instead of direct code imports.
 """
+import asyncio
+import heapq
 import httpx
-from typing import Dict, Any
-from datetime import datetime, timedelta
+import logging
+import time
+import weakref
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 import os
 
+from .circuit import CircuitOpenError, effective_timeout, get_breaker, is_upstream_failure
+
+logger = logging.getLogger(__name__)
+
 # API Base URL - can be overridden via environment variable
 FLIGHTS_API_URL = os.getenv(
     "FLIGHTS_API_URL",
@@ -16,6 +26,157 @@ FLIGHTS_API_URL = os.getenv(
 # Default timeout for HTTP requests (3 minutes)
 DEFAULT_TIMEOUT = 180.0
 
+# Local per-route, per-day price store: a day is fresh for FLIGHTS_PRICE_TTL seconds (6 h)
+PRICE_TTL = float(os.getenv("FLIGHTS_PRICE_TTL", "21600"))
+MAX_ROUTES = 500
+
+# Long windows are split into chunks scraped in parallel (at most FLIGHTS_MAX_CONCURRENCY at once)
+CHUNK_DAYS = int(os.getenv("FLIGHTS_CHUNK_DAYS", "14"))
+MAX_CONCURRENCY = int(os.getenv("FLIGHTS_MAX_CONCURRENCY", "3"))
+CHUNK_RETRIES = int(os.getenv("FLIGHTS_CHUNK_RETRIES", "1"))
+RETRY_BACKOFF = 1.5
+
+# Matrix fan-out: origin/destination pairs processed at once (upstream calls stay capped by the slots)
+MATRIX_MAX_PAIRS = 25
+MATRIX_CONCURRENCY = int(os.getenv("FLIGHTS_MATRIX_CONCURRENCY", "4"))
+
+# Trip window search: longest trip accepted by best_window
+MAX_TRIP_DAYS = 60
+
+# (origin, destination) -> {YYYY-MM-DD: (price or None if no flight found, fetched_at)}
+_PRICE_STORE: "OrderedDict[Tuple[str, str], Dict[str, Tuple[Optional[float], float]]]" = OrderedDict()
+# (origin, destination) -> other keys of the latest scraper payload (currency, route info...)
+_ROUTE_EXTRAS: Dict[Tuple[str, str], Dict[str, Any]] = {}
+# Payload keys rebuilt from the store for the requested window
+_BUILT_KEYS = ("stats", "prices", "from_cache", "cache")
+# One semaphore per event loop, shared by every call hitting the flights scraper
+_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _parse_day(value: str) -> date:
+    return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+
+
+def _route_days(route: Tuple[str, str]) -> Dict[str, Tuple[Optional[float], float]]:
+    days = _PRICE_STORE.get(route)
+    if days is None:
+        days = _PRICE_STORE[route] = {}
+    _PRICE_STORE.move_to_end(route)
+    while len(_PRICE_STORE) > MAX_ROUTES:
+        evicted, _ = _PRICE_STORE.popitem(last=False)
+        _ROUTE_EXTRAS.pop(evicted, None)
+    return days
+
+
+def _missing_ranges(days: Dict[str, Tuple[Optional[float], float]], start: date, end: date,
+                    now: float, max_age: Optional[float] = None) -> List[Tuple[date, date]]:
+    """Contiguous sub-ranges of [start, end] whose days are missing or older than max_age (PRICE_TTL)."""
+    max_age = PRICE_TTL if max_age is None else max_age
+    ranges: List[Tuple[date, date]] = []
+    run_start: Optional[date] = None
+    day = start
+    while day <= end:
+        entry = days.get(day.isoformat())
+        missing = entry is None or now - entry[1] >= max_age
+        if missing and run_start is None:
+            run_start = day
+        elif not missing and run_start is not None:
+            ranges.append((run_start, day - timedelta(days=1)))
+            run_start = None
+        day += timedelta(days=1)
+    if run_start is not None:
+        ranges.append((run_start, end))
+    return ranges
+
+
+def _upstream_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _SLOTS.get(loop)
+    if sem is None:
+        sem = _SLOTS[loop] = asyncio.Semaphore(max(1, MAX_CONCURRENCY))
+    return sem
+
+
+def _split_range(start: date, end: date, size: int) -> List[Tuple[date, date]]:
+    chunks = []
+    size = max(1, size)
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=size - 1))
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def _compute_stats(prices: Dict[str, float]) -> Dict[str, Any]:
+    values = list(prices.values())
+    if not values:
+        return {"min": None, "max": None, "avg": None, "count": 0}
+    return {
+        "min": min(values),
+        "max": max(values),
+        "avg": round(sum(values) / len(values), 2),
+        "count": len(values),
+    }
+
+
+async def _fetch_range(
+    origin: str,
+    destination: str,
+    start: date,
+    end: date,
+    force_refresh: bool,
+    timeout: Optional[float],
+) -> Dict[str, Any]:
+    """One scraper call for [start, end]."""
+    # Build query parameters
+    params = {
+        "origin": origin,
+        "destination": destination,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "force_refresh": force_refresh,
+    }
+
+    # Make HTTP request (fails fast while the flights circuit is open)
+    async def request() -> Dict[str, Any]:
+        async with httpx.AsyncClient(timeout=effective_timeout(timeout, DEFAULT_TIMEOUT)) as client:
+            response = await client.get(
+                f"{FLIGHTS_API_URL}/api/v1/calendar-prices",
+                params=params
+            )
+            response.raise_for_status()
+            return response.json()
+
+    return await get_breaker("flights").call(request)
+
+
+async def _fetch_chunk(
+    origin: str,
+    destination: str,
+    start: date,
+    end: date,
+    force_refresh: bool,
+    timeout: Optional[float],
+) -> Dict[str, Any]:
+    """Fetch one chunk under the upstream concurrency cap, retrying it on its own.
+
+    Only transient failures (timeouts, transport errors, 5xx/429) are retried; a 4xx
+    (bad IATA code, bad dates) or an open circuit is raised at once.
+    """
+    attempt = 0
+    while True:
+        try:
+            async with _upstream_slots():
+                return await _fetch_range(origin, destination, start, end, force_refresh, timeout)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt >= CHUNK_RETRIES or not is_upstream_failure(e):
+                raise
+            attempt += 1
+            logger.warning(f"Flight chunk {origin}-{destination} {start}..{end} failed ({e}), retrying")
+            await asyncio.sleep(RETRY_BACKOFF ** attempt)
+
 
 async def get_flight_prices(
     origin: str,
@@ -23,37 +184,295 @@ async def get_flight_prices(
     start_date: str,
     end_date: str,
     force_refresh: bool = False,
+    timeout: Optional[float] = None,
+    max_age: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Get flight prices from Google Flights for a specific date range via the REST API.
-    
+
+    Days already known for the route (and younger than PRICE_TTL) are served from
+    the local store; only the missing or stale sub-ranges are requested from the
+    scraper. They are split into CHUNK_DAYS chunks fetched concurrently (capped by
+    MAX_CONCURRENCY); a failing chunk is retried alone and, if it still fails, the
+    other chunks are returned with the failure listed in `cache.failed_ranges`.
+
     Args:
         origin: IATA code of departure airport (e.g., "CDG")
         destination: IATA code of arrival airport (e.g., "JFK")
         start_date: Start date for the search (YYYY-MM-DD)
         end_date: End date for the search (YYYY-MM-DD)
         force_refresh: Force re-scraping even if cached data exists (default: False)
-        
+        timeout: Deadline in seconds for the scraper call (capped at DEFAULT_TIMEOUT)
+        max_age: Re-fetch stored days older than this many seconds (default: PRICE_TTL)
+
     Returns:
         Dict containing:
         - stats: {min, max, avg, count} - Price statistics
         - prices: Dict[date, price] - Prices for each day in the range
         - from_cache: bool - Whether data was retrieved from cache
+        - cache: {cached_days, fetched_days, fetched_ranges, chunks, failed_ranges} - Local store usage
+        plus any other key of the scraper payload (from the latest call for this route)
     """
-    # Build query parameters
-    params = {
-        "origin": origin.upper(),
-        "destination": destination.upper(),
-        "start_date": start_date,
-        "end_date": end_date,
-        "force_refresh": force_refresh,
+    effective_timeout(timeout, DEFAULT_TIMEOUT)  # rejects timeout <= 0 before anything is scraped
+    origin, destination = origin.upper(), destination.upper()
+    start, end = _parse_day(start_date), _parse_day(end_date)
+    if end < start:
+        raise ValueError("end_date must be on or after start_date")
+
+    days = _route_days((origin, destination))
+    now = time.time()
+    gaps = [(start, end)] if force_refresh else _missing_ranges(days, start, end, now, max_age)
+
+    chunks = [chunk for a, b in gaps for chunk in _split_range(a, b, CHUNK_DAYS)]
+    outcomes = await asyncio.gather(
+        *(_fetch_chunk(origin, destination, a, b, force_refresh, timeout) for a, b in chunks),
+        return_exceptions=True,
+    )
+    failed = [(chunk, out) for chunk, out in zip(chunks, outcomes) if isinstance(out, BaseException)]
+    if failed and len(failed) == len(chunks):
+        raise failed[0][1]
+    results = [(chunk, out) for chunk, out in zip(chunks, outcomes) if not isinstance(out, BaseException)]
+
+    fetched_at = time.time()
+    fetched_days = 0
+    for _, result in results:
+        _ROUTE_EXTRAS[(origin, destination)] = {k: v for k, v in result.items() if k not in _BUILT_KEYS}
+    for (a, b), result in results:
+        returned = result.get("prices") or {}
+        day = a
+        while day <= b:
+            key = day.isoformat()
+            price = returned.get(key)
+            days[key] = (float(price) if price is not None else None, fetched_at)
+            fetched_days += 1
+            day += timedelta(days=1)
+
+    prices: Dict[str, float] = {}
+    day = start
+    while day <= end:
+        entry = days.get(day.isoformat())
+        if entry is not None and entry[0] is not None:
+            price = entry[0]
+            prices[day.isoformat()] = int(price) if price.is_integer() else price
+        day += timedelta(days=1)
+
+    total_days = (end - start).days + 1
+    # Keep the rest of the scraper payload; only the window keys are set to the requested range
+    extras = dict(_ROUTE_EXTRAS.get((origin, destination), {}))
+    for name, value in (("start_date", start.isoformat()), ("end_date", end.isoformat())):
+        if name in extras:
+            extras[name] = value
+    return {
+        **extras,
+        "stats": _compute_stats(prices),
+        "prices": prices,
+        "from_cache": all(r.get("from_cache", False) for _, r in results),
+        "cache": {
+            "cached_days": total_days - fetched_days - sum((b - a).days + 1 for (a, b), _ in failed),
+            "fetched_days": fetched_days,
+            "fetched_ranges": [[a.isoformat(), b.isoformat()] for a, b in gaps],
+            "chunks": len(chunks),
+            "failed_ranges": [
+                {"start": a.isoformat(), "end": b.isoformat(), "error": str(err)} for (a, b), err in failed
+            ],
+        },
+    }
+
+
+async def get_flight_price_matrix(
+    origins: List[str],
+    destinations: List[str],
+    start_date: str,
+    end_date: str,
+    top_k: int = 5,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Price calendars for every origin x destination pair in one call.
+
+    Pairs are fanned out with bounded concurrency and go through
+    `get_flight_prices`, so they share the per-day store and the chunked,
+    capped scraper calls. A failing pair is reported without failing the matrix.
+
+    Returns:
+        Dict containing:
+        - dates: sorted list of dates present in the cube
+        - cube: {origin: {destination: {date: price}}}
+        - pairs: [{origin, destination, min, avg, count, cheapest_date}] sorted by min price
+        - cheapest: top_k global cheapest {origin, destination, date, price}
+        - errors: [{origin, destination, error}]
+    """
+    origins = list(dict.fromkeys(o.strip().upper() for o in origins if o and o.strip()))
+    destinations = list(dict.fromkeys(d.strip().upper() for d in destinations if d and d.strip()))
+    pairs = [(o, d) for o in origins for d in destinations if o != d]
+    if not pairs:
+        raise ValueError("At least one origin/destination pair is required")
+    if len(pairs) > MATRIX_MAX_PAIRS:
+        raise ValueError(f"Too many pairs ({len(pairs)} > {MATRIX_MAX_PAIRS})")
+
+    sem = asyncio.Semaphore(max(1, MATRIX_CONCURRENCY))
+
+    async def one(origin: str, destination: str) -> Dict[str, Any]:
+        async with sem:
+            return await get_flight_prices(origin, destination, start_date, end_date, timeout=timeout)
+
+    outcomes = await asyncio.gather(*(one(o, d) for o, d in pairs), return_exceptions=True)
+
+    cube: Dict[str, Dict[str, Dict[str, float]]] = {o: {} for o in origins}
+    summaries: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    all_dates = set()
+    for (o, d), outcome in zip(pairs, outcomes):
+        if isinstance(outcome, BaseException):
+            errors.append({"origin": o, "destination": d, "error": str(outcome)})
+            continue
+        prices = outcome.get("prices") or {}
+        cube[o][d] = prices
+        all_dates.update(prices)
+        stats = outcome.get("stats") or _compute_stats(prices)
+        summaries.append({
+            "origin": o,
+            "destination": d,
+            "min": stats.get("min"),
+            "avg": stats.get("avg"),
+            "count": stats.get("count", len(prices)),
+            "cheapest_date": min(prices, key=lambda k: (prices[k], k)) if prices else None,
+        })
+    if errors and not summaries:
+        failures = [out for out in outcomes if isinstance(out, BaseException)]
+        # Circuit open for every pair: let the tool return its structured circuit-open answer
+        if all(isinstance(out, CircuitOpenError) for out in failures):
+            raise failures[0]
+        raise RuntimeError(f"All pairs failed: {errors[0]['error']}")
+
+    cheapest = heapq.nsmallest(
+        max(1, top_k),
+        ((price, day, o, d) for o, row in cube.items() for d, prices in row.items() for day, price in prices.items()),
+    )
+    summaries.sort(key=lambda p: (p["min"] is None, p["min"] if p["min"] is not None else 0))
+    return {
+        "period": {"start_date": start_date, "end_date": end_date},
+        "dates": sorted(all_dates),
+        "cube": cube,
+        "pairs": summaries,
+        "cheapest": [{"origin": o, "destination": d, "date": day, "price": price} for price, day, o, d in cheapest],
+        "errors": errors,
+    }
+
+
+def _calendar(prices: Dict[str, float], start: date, length: int) -> List[Optional[float]]:
+    """Dense day-by-day price list from `start`; None where no flight is known."""
+    out = []
+    for i in range(length):
+        price = prices.get((start + timedelta(days=i)).isoformat())
+        out.append(float(price) if price is not None else None)
+    return out
+
+
+def _best_returns(returns: List[Optional[float]], departures: int, min_days: int,
+                  max_days: int) -> List[Optional[int]]:
+    """
+    For each departure offset i, index of the cheapest return in [i + min_days, i + max_days].
+
+    Sliding-window minimum with a monotonic deque: each return day enters and
+    leaves the deque once, so the whole pass is linear in the calendar length.
+    """
+    best: List[Optional[int]] = []
+    window: deque = deque()  # return indices, prices increasing from left to right
+    nxt = 0
+    for i in range(departures):
+        hi = min(i + max_days, len(returns) - 1)
+        while nxt <= hi:
+            price = returns[nxt]
+            if price is not None:
+                while window and returns[window[-1]] >= price:
+                    window.pop()
+                window.append(nxt)
+            nxt += 1
+        while window and window[0] < i + min_days:
+            window.popleft()
+        best.append(window[0] if window else None)
+    return best
+
+
+async def get_best_trip_windows(
+    origin: str,
+    destination: str,
+    start_date: str,
+    end_date: str,
+    min_days: int = 3,
+    max_days: int = 10,
+    round_trip: bool = True,
+    top_k: int = 5,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Cheapest departure/return combinations over the route price calendars.
+
+    Departures range over [start_date, end_date]; returns come from the reverse
+    route, max_days further at most. Both calendars go through `get_flight_prices`
+    (per-day store first, only gaps scraped). For each departure day the cheapest
+    return min_days..max_days later is found with a linear sliding-window minimum;
+    the top_k departures are then kept (one window per departure day).
+
+    Returns:
+        Dict containing:
+        - windows: [{depart, return, nights, outbound_price, return_price, total}] cheapest first
+          (one-way: [{depart, total}])
+        - searched: {departures, returns} - number of priced days considered
+        - cache: {outbound, return} - `cache` block of each underlying calendar
+    """
+    origin, destination = origin.upper(), destination.upper()
+    start, end = _parse_day(start_date), _parse_day(end_date)
+    if end < start:
+        raise ValueError("end_date must be on or after start_date")
+    if round_trip and not 0 <= min_days <= max_days <= MAX_TRIP_DAYS:
+        raise ValueError(f"Expected 0 <= min_days <= max_days <= {MAX_TRIP_DAYS}")
+    departures = (end - start).days + 1
+    top_k = max(1, top_k)
+
+    if not round_trip:
+        outbound = await get_flight_prices(origin, destination, start_date, end_date, timeout=timeout)
+        priced = [(p, d) for d, p in (outbound.get("prices") or {}).items() if p is not None]
+        return {
+            "route": {"origin": origin, "destination": destination, "round_trip": False},
+            "windows": [{"depart": d, "total": p} for p, d in heapq.nsmallest(top_k, priced)],
+            "searched": {"departures": len(priced), "returns": 0},
+            "cache": {"outbound": outbound.get("cache"), "return": None},
+        }
+
+    return_start = start + timedelta(days=min_days)
+    return_end = end + timedelta(days=max_days)
+    outbound, inbound = await asyncio.gather(
+        get_flight_prices(origin, destination, start_date, end_date, timeout=timeout),
+        get_flight_prices(destination, origin, return_start.isoformat(), return_end.isoformat(), timeout=timeout),
+    )
+    out_cal = _calendar(outbound.get("prices") or {}, start, departures)
+    ret_cal = _calendar(inbound.get("prices") or {}, start, departures + max_days)
+    best = _best_returns(ret_cal, departures, min_days, max_days)
+
+    candidates = [
+        (out_cal[i] + ret_cal[j], i, j)
+        for i, j in enumerate(best)
+        if j is not None and out_cal[i] is not None
+    ]
+    windows = []
+    for total, i, j in heapq.nsmallest(top_k, candidates):
+        windows.append({
+            "depart": (start + timedelta(days=i)).isoformat(),
+            "return": (start + timedelta(days=j)).isoformat(),
+            "nights": j - i,
+            "outbound_price": out_cal[i],
+            "return_price": ret_cal[j],
+            "total": round(total, 2),
+        })
+    return {
+        "route": {"origin": origin, "destination": destination, "round_trip": True},
+        "trip_days": {"min": min_days, "max": max_days},
+        "windows": windows,
+        "searched": {
+            "departures": sum(1 for p in out_cal if p is not None),
+            "returns": sum(1 for p in ret_cal if p is not None),
+        },
+        "cache": {"outbound": outbound.get("cache"), "return": inbound.get("cache")},
     }
-    
-    # Make HTTP request
-    async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-        response = await client.get(
-            f"{FLIGHTS_API_URL}/api/v1/calendar-prices",
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
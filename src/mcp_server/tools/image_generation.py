@@ -1,14 +1,24 @@
+import asyncio
 import base64
+import binascii
+import hashlib
 import io
+import json
+import logging
 import os
-import time
-import requests
-from typing import Optional, Literal
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Literal, Union
+import httpx
+from PIL import Image, ImageFilter
 from dotenv import load_dotenv
 
+from .cache import TTLCache
+from .store import SQLiteStore, store_path
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
 OPENROUTER_KEY = os.getenv("OPENROUTER_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -20,6 +30,70 @@ OPENROUTER_API_URL = "https://openrouter.ai/api/v1/images/generations"
 DEFAULT_MODEL = "google/gemini-2.5-flash-image-preview" # Correct ID for NanoBanana/Gemini Flash
 SITE_URL = os.getenv("OPENROUTER_SITE", "https://travliaq.local")
 APP_NAME = "Travliaq Image Generator"
+OPENROUTER_TIMEOUT = 120.0
+SUPABASE_TIMEOUT = 60.0
+
+# Uploaded files are named by content hash and never change: CDNs and browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Responsive variants: every width below the target size (plus the target itself) in every format,
+# best format first; AVIF is dropped when this Pillow build cannot write it
+VARIANT_WIDTHS = [int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "480,960,1280").split(",") if w.strip()]
+VARIANT_FORMATS = [f.strip().lower() for f in os.getenv("IMAGE_VARIANT_FORMATS", "avif,webp,jpeg").split(",") if f.strip()]
+VARIANT_TYPES = {"avif": ("avif", "image/avif"), "webp": ("webp", "image/webp"), "jpeg": ("jpg", "image/jpeg")}
+VARIANT_OPTIONS = {
+    "avif": {"quality": 60},
+    "webp": {"quality": 80, "method": 4},
+    "jpeg": {"quality": 85, "optimize": True, "progressive": True},
+}
+PLACEHOLDER_WIDTH = 16
+REDUCING_GAP = 3.0
+# Encoded variants are uploaded straight from the encoder's buffer, in slices of this size
+UPLOAD_CHUNK = 256 * 1024
+UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "6"))
+
+# Dedupe: manifest already uploaded for (model, type, enhanced prompt, size), in memory and on disk
+# (persistent part in IMAGE_CACHE_DB or under TRAVLIAQ_DATA_DIR; memory only when neither is set)
+IMAGE_DEDUPE_TTL = float(os.getenv("IMAGE_DEDUPE_TTL", str(365 * 24 * 3600)))
+IMAGE_CACHE_DB = store_path("IMAGE_CACHE_DB", "images.sqlite3")
+_MEMORY = TTLCache(ttl=IMAGE_DEDUPE_TTL, maxsize=1024)
+_DEDUPE: Optional[SQLiteStore] = SQLiteStore(IMAGE_CACHE_DB, "images") if IMAGE_CACHE_DB else None
+
+# Decode/resize/encode run in a bounded pool so Pillow work never blocks the event loop
+# (Pillow releases the GIL in resize/encode, so threads spread over the cores)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+# Trip packs: generations running at once (OpenRouter rate limits) and retries on HTTP 429
+IMAGE_PACK_CONCURRENCY = int(os.getenv("IMAGE_PACK_CONCURRENCY", "3"))
+IMAGE_PACK_RETRIES = int(os.getenv("IMAGE_PACK_RETRIES", "2"))
+IMAGE_PACK_MAX_ITEMS = 20
+RATE_LIMIT_BACKOFF = 5.0
+
+
+class RateLimitError(RuntimeError):
+    """OpenRouter answered 429; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, IMAGE_WORKERS), thread_name_prefix="images")
+    return _EXECUTOR
+
+
+async def _run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+
+def _variant_formats() -> List[str]:
+    Image.init()
+    formats = [f for f in VARIANT_FORMATS if f in VARIANT_TYPES and f.upper() in Image.SAVE]
+    # JPEG is always produced: it is the <img src> fallback
+    return formats if "jpeg" in formats else formats + ["jpeg"]
 
 def _validate_env():
     if not OPENROUTER_KEY:
@@ -27,8 +101,14 @@ def _validate_env():
     if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
         raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY environment variables.")
 
-def _upload_to_supabase(image_data: bytes, trip_code: str, filename: str, content_type: str) -> str:
-    """Uploads bytes to Supabase Storage and returns the public URL."""
+async def _iter_chunks(data: memoryview) -> AsyncIterator[memoryview]:
+    for start in range(0, len(data), UPLOAD_CHUNK):
+        yield data[start:start + UPLOAD_CHUNK]
+
+
+async def _upload_to_supabase(image_data: Union[bytes, memoryview], trip_code: str, filename: str,
+                              content_type: str) -> str:
+    """Uploads bytes (or a memoryview, streamed without copying) to Supabase Storage and returns the public URL."""
     _validate_env()
     
     # Path: TRIPS/{trip_code}/{filename}
@@ -44,11 +124,17 @@ def _upload_to_supabase(image_data: bytes, trip_code: str, filename: str, conten
         "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
         "apikey": SUPABASE_SERVICE_KEY,
         "Content-Type": content_type,
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+        # Same name = same bytes, so overwriting on a retried upload is harmless
         "x-upsert": "true",
+        # Explicit length: the body is streamed from memory, not sent chunked
+        "Content-Length": str(len(image_data)),
     }
     
     try:
-        response = requests.post(url, headers=headers, data=image_data, timeout=60)
+        async with httpx.AsyncClient(timeout=SUPABASE_TIMEOUT) as client:
+            body = image_data if isinstance(image_data, bytes) else _iter_chunks(image_data)
+            response = await client.post(url, headers=headers, content=body)
         # Supabase sometimes returns 200 for updates, 201 for creates
         if response.status_code not in (200, 201):
              raise RuntimeError(f"Supabase upload failed ({response.status_code}): {response.text}")
@@ -58,7 +144,7 @@ def _upload_to_supabase(image_data: bytes, trip_code: str, filename: str, conten
     # Construct Public URL
     return f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/{storage_path}"
 
-def _generate_image_openrouter(prompt: str, width: int, height: int) -> bytes:
+async def _generate_image_openrouter(prompt: str, width: int, height: int) -> bytes:
     """Calls OpenRouter Chat API to generate an image (NanoBanana/Gemini)."""
     _validate_env()
     
@@ -91,8 +177,16 @@ def _generate_image_openrouter(prompt: str, width: int, height: int) -> bytes:
     }
     
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
+        async with httpx.AsyncClient(timeout=OPENROUTER_TIMEOUT) as client:
+            response = await client.post(url, headers=headers, json=payload)
         
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("retry-after", RATE_LIMIT_BACKOFF))
+            except ValueError:
+                retry_after = RATE_LIMIT_BACKOFF
+            raise RateLimitError(f"OpenRouter rate limit (429): {response.text[:200]}", retry_after)
+
         if response.status_code != 200:
             try:
                 error_json = response.json()
@@ -126,54 +220,163 @@ def _generate_image_openrouter(prompt: str, width: int, height: int) -> bytes:
         # Handle Base64 Data URL
         if image_url.startswith("data:image"):
             # Format: data:image/png;base64,iVBORw0KGgo...
-            header, encoded = image_url.split(",", 1)
-            return base64.b64decode(encoded)
+            # Drop the parsed JSON and the raw body (each ~1.33x the image) before decoding,
+            # and decode the ASCII str directly (b64decode would first re-encode it to bytes)
+            del data, message, image_obj, response
+            encoded = image_url[image_url.index(",") + 1:]
+            del image_url
+            return binascii.a2b_base64(encoded)
         else:
             # Handle regular URL if returned (though docs say base64 for this model usually)
-            img_response = requests.get(image_url, timeout=60)
+            async with httpx.AsyncClient(timeout=SUPABASE_TIMEOUT) as client:
+                img_response = await client.get(image_url)
             if img_response.status_code != 200:
                 raise RuntimeError(f"Failed to download generated image from {image_url}")
             return img_response.content
         
-    except requests.exceptions.JSONDecodeError:
+    except RateLimitError:
+        raise
+    except json.JSONDecodeError:
         raise RuntimeError(f"OpenRouter returned invalid JSON (Status {response.status_code}). Raw response: {response.text[:500]}...")
     except Exception as e:
         raise RuntimeError(f"Image generation failed: {str(e)}")
 
-def _process_and_upload(
+def _decode(raw_bytes: bytes, target_width: int, target_height: int) -> Image.Image:
+    """Decode once, convert to RGB and resize to the target size (CPU-bound, runs in the pool)."""
+    # BytesIO over bytes shares the buffer (no copy until written to)
+    img = Image.open(io.BytesIO(raw_bytes))
+    # JPEG sources larger than needed are decoded directly at 1/2, 1/4 or 1/8 scale
+    img.draft("RGB", (target_width, target_height))
+    
+    # Ensure RGB
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+        
+    # Resize if dimensions don't match exactly (OpenRouter might return nearest supported size)
+    if img.size != (target_width, target_height):
+        img = img.resize((target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+    else:
+        img.load()
+    return img
+
+
+def _resize(img: Image.Image, width: int) -> Image.Image:
+    if width >= img.width:
+        return img
+    # reducing_gap: box-reduce by an integer factor first, then LANCZOS on the small image
+    return img.resize((width, round(img.height * width / img.width)), Image.Resampling.LANCZOS,
+                      reducing_gap=REDUCING_GAP)
+
+
+def _encode_variant(img: Image.Image, fmt: str) -> memoryview:
+    """Encode one size in one format (CPU-bound, runs in the pool); returns a view on the encoder's buffer."""
+    output = io.BytesIO()
+    img.save(output, format=fmt.upper(), **VARIANT_OPTIONS[fmt])
+    return output.getbuffer()
+
+
+def _placeholder(img: Image.Image) -> str:
+    """Tiny blurred JPEG as a data URL, shown inline while the real image loads."""
+    small = img.resize((PLACEHOLDER_WIDTH, max(1, round(img.height * PLACEHOLDER_WIDTH / img.width))))
+    small = small.filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    small.save(output, format="JPEG", quality=40)
+    return "data:image/jpeg;base64," + base64.b64encode(output.getvalue()).decode("ascii")
+
+
+def _variant_widths(target_width: int) -> List[int]:
+    return sorted({w for w in VARIANT_WIDTHS if 0 < w < target_width} | {target_width})
+
+
+async def _process_and_upload(
     raw_bytes: bytes, 
     trip_code: str, 
     prefix: str, 
     target_width: int, 
     target_height: int
-) -> str:
-    """Resizes (if needed), converts to JPEG, and uploads."""
+) -> Dict[str, Any]:
+    """
+    Decodes once, encodes every width x format variant in the pool, uploads them concurrently.
+
+    Returns a srcset manifest: {url (full-size JPEG), width, height, placeholder,
+    sources: [{type, srcset}] (best format first), variants: [{format, width, height, bytes, url}]}.
+    """
     try:
-        img = Image.open(io.BytesIO(raw_bytes))
-        
-        # Ensure RGB
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-            
-        # Resize if dimensions don't match exactly (OpenRouter might return nearest supported size)
-        if img.size != (target_width, target_height):
-            img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-            
-        output = io.BytesIO()
-        img.save(output, format="JPEG", quality=90, optimize=True)
-        jpeg_bytes = output.getvalue()
-        
-        filename = f"{prefix}_{int(time.time())}.jpg"
-        return _upload_to_supabase(jpeg_bytes, trip_code, filename, "image/jpeg")
-        
+        img = await _run_cpu(_decode, raw_bytes, target_width, target_height)
+        widths = _variant_widths(target_width)
+        sized = await asyncio.gather(*(_run_cpu(_resize, img, w) for w in widths))
+        jobs = [(fmt, resized) for resized in sized for fmt in _variant_formats()]
+        encoded, placeholder = await asyncio.gather(
+            asyncio.gather(*(_run_cpu(_encode_variant, resized, fmt) for fmt, resized in jobs)),
+            _run_cpu(_placeholder, img),
+        )
+
+        sem = asyncio.Semaphore(max(1, UPLOAD_CONCURRENCY))
+
+        async def upload(fmt: str, resized: Image.Image, data: memoryview) -> Dict[str, Any]:
+            ext, mime = VARIANT_TYPES[fmt]
+            filename = f"{prefix}_{resized.width}w_{hashlib.sha256(data).hexdigest()[:16]}.{ext}"
+            async with sem:
+                url = await _upload_to_supabase(data, trip_code, filename, mime)
+            return {"format": fmt, "width": resized.width, "height": resized.height, "bytes": len(data), "url": url}
+
+        variants = await asyncio.gather(*(upload(fmt, r, data) for (fmt, r), data in zip(jobs, encoded)))
     except Exception as e:
         raise RuntimeError(f"Failed to process/upload image: {str(e)}")
 
+    sources = []
+    for fmt in _variant_formats():
+        items = [v for v in variants if v["format"] == fmt]
+        sources.append({
+            "type": VARIANT_TYPES[fmt][1],
+            "srcset": ", ".join(f"{v['url']} {v['width']}w" for v in items),
+        })
+    fallback = next((v for v in variants if v["format"] == "jpeg" and v["width"] == target_width), variants[-1])
+    return {
+        "url": fallback["url"],
+        "width": target_width,
+        "height": target_height,
+        "placeholder": placeholder,
+        "sources": sources,
+        "variants": variants,
+    }
+
+def _dedupe_key(kind: str, enhanced_prompt: str, width: int, height: int, model: str = DEFAULT_MODEL) -> str:
+    # The variant set is part of the key: changing IMAGE_VARIANT_* produces new manifests
+    variants = ",".join(map(str, _variant_widths(width))) + "/" + ",".join(_variant_formats())
+    raw = f"{model}\x00{kind}\x00{width}x{height}\x00{variants}\x00{' '.join(enhanced_prompt.split())}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _generate(trip_code: str, kind: str, enhanced_prompt: str, width: int, height: int) -> Dict[str, Any]:
+    """
+    Returns the manifest already uploaded for the same model/type/prompt/size, or generates,
+    uploads and records it. Concurrent identical requests share one generation.
+    """
+    key = _dedupe_key(kind, enhanced_prompt, width, height)
+    manifest = _MEMORY.get(key)
+    if manifest is None and _DEDUPE is not None:
+        manifest = await _DEDUPE.aget(key, max_age=IMAGE_DEDUPE_TTL)
+        if manifest is not None:
+            _MEMORY.set(key, manifest)
+    if manifest is not None:
+        return manifest
+
+    async def fetch() -> Dict[str, Any]:
+        raw_bytes = await _generate_image_openrouter(enhanced_prompt, width, height)
+        uploaded = await _process_and_upload(raw_bytes, trip_code, kind, width, height)
+        if _DEDUPE is not None:
+            await _DEDUPE.aset(key, uploaded)
+        return uploaded
+
+    return await _MEMORY.coalesce(key, fetch)
+
 # --- Public Tools ---
 
-def generate_hero(trip_code: str, prompt: str) -> str:
+async def generate_hero(trip_code: str, prompt: str, responsive: bool = False) -> Any:
     """
     Generates a high-quality Hero image (1920x1080).
+    Returns the full-size JPEG URL, or the srcset manifest when `responsive`.
     """
     width, height = 1920, 1080
     
@@ -184,12 +387,13 @@ def generate_hero(trip_code: str, prompt: str) -> str:
         "travel photography, vibrant colors, 8k, highly detailed."
     )
     
-    raw_bytes = _generate_image_openrouter(enhanced_prompt, width, height)
-    return _process_and_upload(raw_bytes, trip_code, "hero", width, height)
+    manifest = await _generate(trip_code, "hero", enhanced_prompt, width, height)
+    return manifest if responsive else manifest["url"]
 
-def generate_background(trip_code: str, prompt: str) -> str:
+async def generate_background(trip_code: str, prompt: str, responsive: bool = False) -> Any:
     """
     Generates a Background image (1920x1080), optimized for opacity/overlay.
+    Returns the full-size JPEG URL, or the srcset manifest when `responsive`.
     """
     width, height = 1920, 1080
     
@@ -200,12 +404,13 @@ def generate_background(trip_code: str, prompt: str) -> str:
         "suitable for text overlay, muted tones, travel theme."
     )
     
-    raw_bytes = _generate_image_openrouter(enhanced_prompt, width, height)
-    return _process_and_upload(raw_bytes, trip_code, "background", width, height)
+    manifest = await _generate(trip_code, "background", enhanced_prompt, width, height)
+    return manifest if responsive else manifest["url"]
 
-def generate_slider(trip_code: str, prompt: str) -> str:
+async def generate_slider(trip_code: str, prompt: str, responsive: bool = False) -> Any:
     """
     Generates a Slider image (800x600).
+    Returns the full-size JPEG URL, or the srcset manifest when `responsive`.
     """
     width, height = 800, 600
     
@@ -216,5 +421,81 @@ def generate_slider(trip_code: str, prompt: str) -> str:
         "daylight, travel guide style."
     )
     
-    raw_bytes = _generate_image_openrouter(enhanced_prompt, width, height)
-    return _process_and_upload(raw_bytes, trip_code, "slider", width, height)
+    manifest = await _generate(trip_code, "slider", enhanced_prompt, width, height)
+    return manifest if responsive else manifest["url"]
+
+
+GENERATORS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    "hero": generate_hero,
+    "background": generate_background,
+    "slider": generate_slider,
+}
+
+
+async def generate_trip_pack(
+    trip_code: str,
+    images: List[Dict[str, str]],
+    concurrency: Optional[int] = None,
+    on_result: Optional[Callable[[Dict[str, Any], int, int], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """
+    Generates every image of a trip page concurrently.
+
+    `images` is a list of {"type": "hero" | "background" | "slider", "prompt": "..."}.
+    At most `concurrency` generations run at once; a 429 from OpenRouter is retried
+    after its Retry-After delay (IMAGE_PACK_RETRIES times). `on_result(entry, done, total)`
+    is awaited as each image finishes. A failed image never fails the pack.
+
+    Returns:
+        Manifest {trip_code, total, succeeded, failed,
+        images: [{index, type, prompt, success, url + responsive (srcset manifest) | error}]}
+        in input order.
+    """
+    if not images:
+        raise ValueError("At least one image is required")
+    if len(images) > IMAGE_PACK_MAX_ITEMS:
+        raise ValueError(f"Too many images ({len(images)} > {IMAGE_PACK_MAX_ITEMS})")
+    for item in images:
+        if item.get("type") not in GENERATORS or not (item.get("prompt") or "").strip():
+            raise ValueError(f"Each image needs a type in {sorted(GENERATORS)} and a prompt: {item}")
+
+    sem = asyncio.Semaphore(max(1, concurrency or IMAGE_PACK_CONCURRENCY))
+
+    async def one(index: int, item: Dict[str, str]) -> Dict[str, Any]:
+        entry = {"index": index, "type": item["type"], "prompt": item["prompt"]}
+        for attempt in range(IMAGE_PACK_RETRIES + 1):
+            try:
+                async with sem:
+                    manifest = await GENERATORS[item["type"]](trip_code, item["prompt"], responsive=True)
+                return {**entry, "success": True, "url": manifest["url"], "responsive": manifest}
+            except RateLimitError as e:
+                if attempt == IMAGE_PACK_RETRIES:
+                    return {**entry, "success": False, "error": str(e)}
+                # Attente hors sémaphore : les autres images continuent
+                await asyncio.sleep(e.retry_after * (attempt + 1))
+            except Exception as e:
+                return {**entry, "success": False, "error": str(e)}
+
+    manifest: List[Optional[Dict[str, Any]]] = [None] * len(images)
+    tasks = [asyncio.ensure_future(one(i, item)) for i, item in enumerate(images)]
+    try:
+        for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            entry = await next_done
+            manifest[entry["index"]] = entry
+            if on_result:
+                try:
+                    await on_result(entry, done, len(images))
+                except Exception as e:
+                    logger.warning(f"Trip pack progress callback failed: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    succeeded = sum(1 for e in manifest if e and e["success"])
+    return {
+        "trip_code": trip_code,
+        "total": len(images),
+        "succeeded": succeeded,
+        "failed": len(images) - succeeded,
+        "images": manifest,
+    }
@@ -0,0 +1,189 @@
+"""
+Asynchronous job mode for image generation.
+
+`submit()` returns a job id immediately; a few in-process workers run the
+generations from a bounded queue, and `get()` / `wait()` let callers poll or
+block for the result. Every state change is written to a SQLiteStore so a
+restart keeps finished jobs (and their URLs); jobs still queued or running
+when the process stopped are reported as interrupted.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from . import image_generation as imgs
+from .cache import TTLCache
+from .store import SQLiteStore, store_path
+
+logger = logging.getLogger(__name__)
+
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "2"))
+IMAGE_JOB_QUEUE_SIZE = int(os.getenv("IMAGE_JOB_QUEUE_SIZE", "100"))
+IMAGE_JOB_TTL = float(os.getenv("IMAGE_JOB_TTL", str(7 * 24 * 3600)))
+# Plafond d'attente de images.result, sous les timeouts usuels des clients MCP
+MAX_WAIT_S = 55.0
+IMAGE_JOBS_DB = store_path("IMAGE_JOBS_DB", "image_jobs.sqlite3")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+KINDS = tuple(imgs.GENERATORS) + ("trip_pack",)
+
+
+class ImageJobs:
+    """Bounded queue of image jobs drained by `workers` tasks on the running loop."""
+
+    def __init__(self, store: Optional[SQLiteStore], workers: int = IMAGE_JOB_WORKERS,
+                 queue_size: int = IMAGE_JOB_QUEUE_SIZE, ttl: float = IMAGE_JOB_TTL):
+        self.store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        # Jobs en file ou en cours : jamais évincés ; les jobs terminés passent dans le cache borné
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._jobs = TTLCache(ttl=ttl, maxsize=1000)
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # -- submission --------------------------------------------------------
+
+    async def submit(self, kind: str, trip_code: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a job and return its record (status "queued")."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown image job type '{kind}' (expected one of {list(KINDS)})")
+        self._start()
+        if sum(1 for job in self._pending.values() if job["status"] == QUEUED) >= self.queue_size:
+            raise RuntimeError(f"Image job queue is full ({self.queue_size} pending), retry later")
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "type": kind,
+            "trip_code": trip_code,
+            "params": params,
+            "status": QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "progress": None,
+            "result": None,
+            "error": None,
+        }
+        self._pending[job["job_id"]] = job
+        self._done[job["job_id"]] = asyncio.Event()
+        await self._save(job)
+        self._queue.put_nowait(job["job_id"])
+        return dict(job)
+
+    # -- lookup ------------------------------------------------------------
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current record of a job, from memory or from the persistent store."""
+        job = self._pending.get(job_id) or self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = await self.store.aget(job_id, max_age=self.ttl)
+            if job is not None and job["status"] in (QUEUED, RUNNING):
+                # Perdu au redémarrage : la génération n'est plus en cours nulle part
+                job.update(status=FAILED, finished_at=time.time(),
+                           error="Interrupted by a server restart, submit it again")
+                await self._save(job)
+            elif job is not None:
+                self._jobs.set(job_id, job)
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Return the job once finished, or as it stands after `timeout` seconds."""
+        if self._pending:
+            self._start()  # boucle changée : les jobs en attente sont repris avant d'attendre
+        event = self._done.get(job_id)
+        if event is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return await self.get(job_id)
+
+    # -- execution ---------------------------------------------------------
+
+    async def _save(self, job: Dict[str, Any]) -> None:
+        if job["status"] in (DONE, FAILED):
+            self._pending.pop(job["job_id"], None)
+            self._jobs.set(job["job_id"], job)
+        if self.store is not None:
+            await self.store.aset(job["job_id"], job)
+
+    async def _execute(self, job: Dict[str, Any]) -> Any:
+        params = job["params"]
+        if job["type"] == "trip_pack":
+            async def on_result(entry: Dict[str, Any], done: int, total: int) -> None:
+                job["progress"] = {"done": done, "total": total}
+                await self._save(job)
+
+            return await imgs.generate_trip_pack(job["trip_code"], params["images"],
+                                                 params.get("concurrency"), on_result)
+        manifest = await imgs.GENERATORS[job["type"]](job["trip_code"], params["prompt"], responsive=True)
+        return {"url": manifest["url"], "type": job["type"], "responsive": manifest}
+
+    async def _run(self, job_id: str) -> None:
+        job = self._pending.get(job_id)
+        if job is None:
+            # Ne devrait pas arriver : on ne laisse pas l'enregistrement persistant bloqué en "queued"
+            job = await self.store.aget(job_id) if self.store is not None else None
+            if job is not None and job["status"] not in (DONE, FAILED):
+                logger.warning(f"Image job {job_id} lost its in-memory state, marking it failed")
+                job.update(status=FAILED, finished_at=time.time(), error="Job state lost, submit it again")
+                await self._save(job)
+            self._finish(job_id)
+            return
+        job.update(status=RUNNING, started_at=time.time())
+        await self._save(job)
+        try:
+            job.update(status=DONE, result=await self._execute(job))
+        except Exception as e:
+            logger.warning(f"Image job {job_id} ({job['type']}) failed: {e}")
+            job.update(status=FAILED, error=str(e))
+        job["finished_at"] = time.time()
+        await self._save(job)
+        self._finish(job_id)
+
+    def _finish(self, job_id: str) -> None:
+        event = self._done.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.warning(f"Image job worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _start(self) -> None:
+        """Start the workers on the running loop (once per loop)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and all(not t.done() for t in self._tasks):
+            return
+        self.stop()
+        self._loop = loop
+        # File non bornée : la limite est appliquée dans submit(), ce qui permet de reprendre
+        # ici les jobs restés en attente sur l'ancienne boucle (leurs workers ont disparu)
+        self._queue = asyncio.Queue()
+        self._done = {}
+        for job_id, job in self._pending.items():
+            job["status"] = QUEUED
+            self._done[job_id] = asyncio.Event()
+            self._queue.put_nowait(job_id)
+        self._tasks = [loop.create_task(self._worker()) for _ in range(max(1, self.workers))]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._loop = None
+
+
+JOBS = ImageJobs(SQLiteStore(IMAGE_JOBS_DB, "image_jobs") if IMAGE_JOBS_DB else None)
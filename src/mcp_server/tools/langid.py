@@ -0,0 +1,89 @@
+"""
+Lightweight in-process language identification for the translation tool.
+
+Latin-script languages supported by the service (EN, FR, ES, DE, IT, PT, NL)
+are scored with a naive Bayes model over character 1-3-grams trained on the
+sample texts in `data/langid/`; RU, AR and ZH are recognised by script. The
+detector only answers when it is confident, so callers can safely skip a
+translation on a positive answer and fall back to the service otherwise.
+"""
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DATA_DIR = Path(__file__).parent / "data" / "langid"
+
+# Écart minimal de log-probabilité moyenne par n-gramme entre la 1re et la 2e langue
+MIN_MARGIN = 0.15
+# Seuil plus strict pour ne pas traduire du tout : un texte mixte ("Check-in à l hotel puis
+# shopping sur Oxford Street", ~0.26 pour EN) doit rester en dessous
+SKIP_MARGIN = 0.35
+MIN_LETTERS = 15
+
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+|\S+@\S+\.\w+", re.I)
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*")
+_SCRIPTS = (
+    ("RU", re.compile(r"[Ѐ-ӿ]")),
+    ("AR", re.compile(r"[؀-ۿ]")),
+    ("JA", re.compile(r"[぀-ヿ]")),
+    ("ZH", re.compile(r"[一-鿿]")),
+)
+
+_MODEL: Optional[Dict[str, Tuple[Counter, int]]] = None
+
+
+def _ngrams(text: str):
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        for n in (1, 2, 3):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                if gram != " ":
+                    yield gram
+
+
+def _load() -> Dict[str, Tuple[Counter, int]]:
+    global _MODEL
+    if _MODEL is None:
+        model = {}
+        for path in sorted(DATA_DIR.glob("*.txt")):
+            counts = Counter(_ngrams(path.read_text(encoding="utf-8")))
+            model[path.stem.upper()] = (counts, sum(counts.values()))
+        _MODEL = model
+    return _MODEL
+
+
+def detect(text: str, min_margin: float = MIN_MARGIN) -> Optional[Tuple[str, float]]:
+    """Return `(code, confidence margin)` for a confidently identified language, else None."""
+    for code, pattern in _SCRIPTS:
+        letters = _WORD_RE.findall(text)
+        if letters and len(pattern.findall(text)) >= 0.5 * sum(len(w) for w in letters):
+            return code, 1.0
+
+    model = _load()
+    grams = list(_ngrams(_URL_RE.sub(" ", text)))
+    if sum(1 for g in grams if len(g) == 1) < MIN_LETTERS:
+        return None
+    scores = []
+    for code, (counts, total) in model.items():
+        denom = math.log(total + len(counts) + 1)
+        scores.append((sum(math.log(counts.get(g, 0) + 1) for g in grams) / len(grams) - denom, code))
+    scores.sort(reverse=True)
+    margin = scores[0][0] - scores[1][0]
+    return (scores[0][1], round(margin, 3)) if margin >= min_margin else None
+
+
+def noop_reason(text: str) -> Optional[str]:
+    """
+    Why `text` needs no translation at all, or None.
+
+    - "no_translatable_text": only numbers, punctuation, symbols, URLs or e-mails
+
+    Capitalised words are not skipped: "Château" or "Wine Tasting" look like names
+    but are common nouns, and the service leaves real names untouched anyway.
+    """
+    if not _WORD_RE.findall(_URL_RE.sub(" ", text)):
+        return "no_translatable_text"
+    return None
@@ -1,9 +1,12 @@
 import asyncio
 import math
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
 
+from .cache import TTLCache
+
 GEOCODE_URL = "https://geocoding-api.open-meteo.com/v1/search"
 CLIMATE_URL = "https://climate-api.open-meteo.com/v1/climate"
 AIRPORTS_DATA_URL = "https://raw.githubusercontent.com/mwgg/Airports/master/airports.json"
@@ -12,7 +15,18 @@ USER_AGENT = {"User-Agent": "travliaq-geo-tool/1.0"}
 NOMINATIM_HEADERS = {"User-Agent": "Travliaq-MCP/1.0 (travel planning assistant; contact@travliaq.com)"}
 NO_PROXY = {"http": None, "https": None}
 
+CLIMATE_DAILY_VARS = "temperature_2m_mean,temperature_2m_max,temperature_2m_min,precipitation_sum"
+CLIMATE_MAX_CONCURRENCY = 8
+
 _AIRPORTS: List[Dict[str, Any]] | None = None
+# Les séries climatiques passées ne bougent pas : on les garde une semaine par cellule (~1 km) et fenêtre
+_CLIMATE_SEGMENTS = TTLCache(ttl=7 * 24 * 3600, maxsize=4096)
+# Agrégats mensuels dérivés des segments + géocodages déjà résolus (requêtes répétées instantanées)
+_CLIMATE_MONTHLY = TTLCache(ttl=7 * 24 * 3600, maxsize=1024)
+_GEOCODE_CACHE = TTLCache(ttl=24 * 3600, maxsize=2048)
+
+MONTH_NAMES = ("janvier", "février", "mars", "avril", "mai", "juin", "juillet",
+               "août", "septembre", "octobre", "novembre", "décembre")
 
 
 class GeoError(Exception):
@@ -376,6 +390,273 @@ async def climate_mean_temperature_for_place(query: str, start_date: str, end_da
     return data
 
 
+async def _climate_segment(lat: float, lon: float, start_date: str, end_date: str,
+                           timezone: str) -> Tuple[Dict[str, List[Any]], bool]:
+    """Daily climate arrays for one window, served from the segment cache when possible."""
+    key = (round(lat, 2), round(lon, 2), start_date, end_date, timezone)
+    cached = key in _CLIMATE_SEGMENTS
+
+    async def fetch() -> Dict[str, List[Any]]:
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": start_date,
+            "end_date": end_date,
+            "daily": CLIMATE_DAILY_VARS,
+            "timezone": timezone,
+        }
+        data = await _http_get(CLIMATE_URL, params)
+        return data.get("daily") or {}
+
+    return await _CLIMATE_SEGMENTS.get_or_fetch(key, fetch), cached
+
+
+async def _climate_segments(lat: float, lon: float, windows: List[Tuple[str, str]],
+                            timezone: str) -> Tuple[List[Dict[str, List[Any]]], int]:
+    """Fetch several windows concurrently; returns the segments in order and the cache hit count."""
+    sem = asyncio.Semaphore(CLIMATE_MAX_CONCURRENCY)
+
+    async def one(window: Tuple[str, str]):
+        async with sem:
+            return await _climate_segment(lat, lon, window[0], window[1], timezone)
+
+    results = await asyncio.gather(*(one(wnd) for wnd in windows))
+    return [seg for seg, _ in results], sum(1 for _, hit in results if hit)
+
+
+def _percentile(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    pos = (len(sorted_vals) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+def _shift_year(d: date, year: int) -> date:
+    try:
+        return d.replace(year=year)
+    except ValueError:  # 29 février sur une année non bissextile
+        return d.replace(year=year, day=28)
+
+
+def _rounded(value: Optional[float], ndigits: int = 1) -> Optional[float]:
+    return round(value, ndigits) if value is not None else None
+
+
+async def climate_period_stats(lat: float, lon: float, start_date: str, end_date: str, years: int = 10,
+                               timezone: str = "UTC", rain_threshold_mm: float = 1.0) -> Dict[str, Any]:
+    """Compare the same calendar window over the last `years` years.
+
+    All yearly windows are fetched concurrently (and cached per segment), then
+    mean, percentiles, rain-day probability and extremes are computed in one pass.
+    """
+    start = datetime.strptime(start_date.strip(), "%Y-%m-%d").date()
+    end = datetime.strptime(end_date.strip(), "%Y-%m-%d").date()
+    if end < start:
+        raise GeoError("end_date < start_date")
+    if (end - start).days > 366:
+        raise GeoError("Fenêtre trop longue (max 1 an)")
+    years = max(1, min(int(years or 10), 30))
+    last_year = date.today().year - 1
+    span = end.year - start.year
+    year_list = list(range(last_year - years + 1, last_year + 1))
+    windows = []
+    for y in year_list:
+        ws = _shift_year(start, y)
+        windows.append((ws.isoformat(), _shift_year(end, y + span).isoformat()))
+
+    segments, cache_hits = await _climate_segments(lat, lon, windows, timezone)
+
+    tmeans: List[float] = []
+    tmax_all: List[float] = []
+    tmin_all: List[float] = []
+    precs: List[float] = []
+    per_year: List[Dict[str, Any]] = []
+    for y, seg in zip(year_list, segments):
+        ymeans = [v for v in (seg.get("temperature_2m_mean") or []) if v is not None]
+        yprecs = [v for v in (seg.get("precipitation_sum") or []) if v is not None]
+        tmeans.extend(ymeans)
+        precs.extend(yprecs)
+        tmax_all.extend(v for v in (seg.get("temperature_2m_max") or []) if v is not None)
+        tmin_all.extend(v for v in (seg.get("temperature_2m_min") or []) if v is not None)
+        per_year.append({
+            "year": y,
+            "tmean_c": _rounded(sum(ymeans) / len(ymeans)) if ymeans else None,
+            "precip_mm": _rounded(sum(yprecs)) if yprecs else None,
+            "rain_days": sum(1 for p in yprecs if p >= rain_threshold_mm),
+        })
+
+    tmeans.sort()
+    yearly = [r["tmean_c"] for r in per_year if r["tmean_c"] is not None]
+    yearly_mean = sum(yearly) / len(yearly) if yearly else None
+    yearly_std = (
+        math.sqrt(sum((v - yearly_mean) ** 2 for v in yearly) / len(yearly)) if yearly else None
+    )
+    return {
+        "coords": {"lat": lat, "lon": lon, "timezone": timezone},
+        "window": {"start": start.strftime("%m-%d"), "end": end.strftime("%m-%d"),
+                   "days": (end - start).days + 1},
+        "years": year_list,
+        "samples": len(tmeans),
+        "stats": {
+            "tmean_c": {
+                "mean": _rounded(sum(tmeans) / len(tmeans)) if tmeans else None,
+                "p10": _rounded(_percentile(tmeans, 0.10)),
+                "p50": _rounded(_percentile(tmeans, 0.50)),
+                "p90": _rounded(_percentile(tmeans, 0.90)),
+                "yearly_std": _rounded(yearly_std, 2),
+            },
+            "tmax_c": {"mean": _rounded(sum(tmax_all) / len(tmax_all)) if tmax_all else None,
+                       "record": max(tmax_all) if tmax_all else None},
+            "tmin_c": {"mean": _rounded(sum(tmin_all) / len(tmin_all)) if tmin_all else None,
+                       "record": min(tmin_all) if tmin_all else None},
+            "precip": {
+                "rain_day_threshold_mm": rain_threshold_mm,
+                "rain_day_probability": (
+                    round(sum(1 for p in precs if p >= rain_threshold_mm) / len(precs), 3) if precs else None
+                ),
+                "mean_daily_mm": _rounded(sum(precs) / len(precs), 2) if precs else None,
+                "max_daily_mm": max(precs) if precs else None,
+            },
+        },
+        "per_year": per_year,
+        "cache": {"segments": len(windows), "hits": cache_hits},
+    }
+
+
+async def climate_period_stats_for_place(query: str, start_date: str, end_date: str, years: int = 10,
+                                         country: Optional[str] = None, timezone: str = "auto",
+                                         rain_threshold_mm: float = 1.0) -> Dict[str, Any]:
+    results = await geocode_text(query, count=1, country=country)
+    if not results:
+        raise GeoError("place not found")
+    coords = results[0]
+    tz = coords.get("timezone") or timezone
+    data = await climate_period_stats(coords["latitude"], coords["longitude"], start_date, end_date,
+                                      years, tz, rain_threshold_mm)
+    data["place"] = coords
+    return data
+
+
+async def _geocode_cached(query: str, country: Optional[str] = None) -> Dict[str, Any]:
+    key = (query.strip().lower(), (country or "").upper())
+
+    async def fetch() -> Dict[str, Any]:
+        results = await geocode_text(query, count=1, country=country)
+        if not results:
+            raise GeoError("place not found")
+        return results[0]
+
+    return await _GEOCODE_CACHE.get_or_fetch(key, fetch)
+
+
+def _monthly_key(lat: float, lon: float, years: int, timezone: str) -> Tuple[Any, ...]:
+    last_year = date.today().year - 1
+    return round(lat, 2), round(lon, 2), last_year - years + 1, last_year, timezone
+
+
+async def _monthly_climate(lat: float, lon: float, years: int, timezone: str) -> List[Dict[str, Any]]:
+    """12 monthly aggregates over the last `years` full years, derived from cached yearly segments."""
+    key = _monthly_key(lat, lon, years, timezone)
+    year_list = list(range(key[2], key[3] + 1))
+
+    async def build() -> List[Dict[str, Any]]:
+        windows = [(f"{y}-01-01", f"{y}-12-31") for y in year_list]
+        segments, _ = await _climate_segments(lat, lon, windows, timezone)
+        acc = {m: {"tmean": [], "tmax": [], "tmin": [], "precip": []} for m in range(1, 13)}
+        for seg in segments:
+            times = seg.get("time") or []
+            columns = (
+                ("tmean", seg.get("temperature_2m_mean") or []),
+                ("tmax", seg.get("temperature_2m_max") or []),
+                ("tmin", seg.get("temperature_2m_min") or []),
+                ("precip", seg.get("precipitation_sum") or []),
+            )
+            for i, dt in enumerate(times):
+                bucket = acc[int(dt[5:7])]
+                for name, values in columns:
+                    if i < len(values) and values[i] is not None:
+                        bucket[name].append(values[i])
+        table = []
+        for m in range(1, 13):
+            b = acc[m]
+            precs = b["precip"]
+            table.append({
+                "month": m,
+                "name": MONTH_NAMES[m - 1],
+                "tmean_c": _rounded(sum(b["tmean"]) / len(b["tmean"])) if b["tmean"] else None,
+                "tmax_c": _rounded(sum(b["tmax"]) / len(b["tmax"])) if b["tmax"] else None,
+                "tmin_c": _rounded(sum(b["tmin"]) / len(b["tmin"])) if b["tmin"] else None,
+                "precip_mm": _rounded(sum(precs) / len(year_list)) if precs else None,
+                "rain_day_probability": round(sum(1 for p in precs if p >= 1.0) / len(precs), 3) if precs else None,
+            })
+        return table
+
+    return await _CLIMATE_MONTHLY.get_or_fetch(key, build)
+
+
+async def refresh_monthly_climate(lat: float, lon: float, years: int, timezone: str) -> None:
+    """Drop and rebuild a monthly climate cell and its yearly segments (prefetch before expiry)."""
+    key = _monthly_key(lat, lon, years, timezone)
+    for y in range(key[2], key[3] + 1):
+        _CLIMATE_SEGMENTS.pop((key[0], key[1], f"{y}-01-01", f"{y}-12-31", timezone))
+    _CLIMATE_MONTHLY.pop(key)
+    await _monthly_climate(lat, lon, years, timezone)
+
+
+def _band_score(value: Optional[float], low: float, high: float, tolerance: float) -> float:
+    """1.0 inside [low, high], decreasing linearly to 0 at `tolerance` degrees outside."""
+    if value is None:
+        return 0.0
+    gap = low - value if value < low else value - high if value > high else 0.0
+    return max(0.0, 1.0 - gap / tolerance) if tolerance > 0 else float(gap == 0)
+
+
+async def climate_best_months(lat: float, lon: float, years: int = 5, ideal_min_c: float = 18.0,
+                              ideal_max_c: float = 26.0, tolerance_c: float = 8.0,
+                              rain_weight: float = 0.4, timezone: str = "UTC") -> Dict[str, Any]:
+    """Rank the 12 months for a location with a temperature-band and rain comfort score."""
+    if ideal_max_c < ideal_min_c:
+        raise GeoError("ideal_max_c < ideal_min_c")
+    years = max(1, min(int(years or 5), 20))
+    rain_weight = max(0.0, min(float(rain_weight), 1.0))
+    cached = _monthly_key(lat, lon, years, timezone) in _CLIMATE_MONTHLY
+    table = await _monthly_climate(lat, lon, years, timezone)
+
+    ranked = []
+    for row in table:
+        temp_score = _band_score(row["tmean_c"], ideal_min_c, ideal_max_c, tolerance_c)
+        dry_score = 1.0 - (row["rain_day_probability"] or 0.0)
+        score = (1.0 - rain_weight) * temp_score + rain_weight * dry_score
+        ranked.append({**row, "score": round(score, 3),
+                       "temp_score": round(temp_score, 3), "dry_score": round(dry_score, 3)})
+    ranked.sort(key=lambda r: (-r["score"], r["month"]))
+    for i, row in enumerate(ranked, 1):
+        row["rank"] = i
+    return {
+        "coords": {"lat": lat, "lon": lon, "timezone": timezone},
+        "years": years,
+        "comfort": {"ideal_min_c": ideal_min_c, "ideal_max_c": ideal_max_c, "tolerance_c": tolerance_c,
+                    "rain_weight": rain_weight, "rain_day_threshold_mm": 1.0},
+        "best": [r["name"] for r in ranked[:3]],
+        "months": ranked,
+        "from_cache": cached,
+    }
+
+
+async def climate_best_months_for_place(query: str, country: Optional[str] = None, years: int = 5,
+                                        ideal_min_c: float = 18.0, ideal_max_c: float = 26.0,
+                                        tolerance_c: float = 8.0, rain_weight: float = 0.4,
+                                        timezone: str = "auto") -> Dict[str, Any]:
+    coords = await _geocode_cached(query, country)
+    tz = coords.get("timezone") or timezone
+    data = await climate_best_months(coords["latitude"], coords["longitude"], years, ideal_min_c,
+                                     ideal_max_c, tolerance_c, rain_weight, tz)
+    data["place"] = coords
+    return data
+
+
 async def place_overview(
     query: str,
     *,
@@ -0,0 +1,118 @@
+"""
+Small persistent key-value store on SQLite for caches that should survive restarts.
+
+Values are stored as JSON. The sync methods are thread-safe; the `a*` variants
+run them in a worker thread so disk I/O never blocks the event loop. If the
+database cannot be opened (read-only filesystem...), the store disables itself
+and behaves as always empty.
+
+Stores are off unless configured: `store_path()` uses the store's own
+variable (ex: TRANSLATION_CACHE_DB) or a file under TRAVLIAQ_DATA_DIR, and the
+database is only opened on first use.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des stores persistants (vide = mémoire seule, sauf chemin explicite par store)
+DATA_DIR = os.getenv("TRAVLIAQ_DATA_DIR", "")
+
+
+def store_path(env_name: str, filename: str) -> str:
+    """`env_name` if set, else DATA_DIR/filename when DATA_DIR is configured; "" means disabled."""
+    path = os.getenv(env_name)
+    if path is not None:
+        return path
+    return os.path.join(DATA_DIR, filename) if DATA_DIR else ""
+
+
+class SQLiteStore:
+    """JSON values by string key in one SQLite table, with an optional max age on reads."""
+
+    def __init__(self, path: str, table: str = "kv"):
+        self.path = path
+        self.table = table
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                if self.path != ":memory:":
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                conn.commit()
+                self._conn = conn
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Persistent store {self.path} unavailable, running memory-only: {e}")
+                self._disabled = True
+        return self._conn
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Persistent store read failed: {e}")
+                return None
+        if row is None or (max_age is not None and time.time() - row[1] >= max_age):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time()),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Persistent store write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute(f"DELETE FROM {self.table}")
+                conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    async def aget(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key, max_age)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
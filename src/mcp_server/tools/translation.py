@@ -2,14 +2,445 @@
 Translation tool for Travliaq MCP Server
 Calls Travliaq-Translate service (NLLB-200 model)
 """
+import asyncio
+import hashlib
 import httpx
-from typing import Dict, Any
+import os
+import re
+import unicodedata
+import weakref
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
+from .cache import TTLCache
+from . import langid
+from .circuit import CircuitOpenError, get_breaker
+from .store import SQLiteStore, store_path
+
 logger = logging.getLogger(__name__)
 
 # URL du service de traduction (production)
 TRANSLATE_SERVICE_URL = "https://travliaq-transalte-production.up.railway.app"
+TRANSLATE_TIMEOUT = 30.0
+
+# Codes courts acceptés par le service -> codes NLLB (un code NLLB passé tel quel est conservé)
+NLLB_CODES = {
+    "EN": "eng_Latn", "FR": "fra_Latn", "ES": "spa_Latn", "DE": "deu_Latn", "IT": "ita_Latn",
+    "PT": "por_Latn", "NL": "nld_Latn", "RU": "rus_Cyrl", "AR": "arb_Arab", "ZH": "zho_Hans",
+}
+# source_language="auto" : langue source détectée localement (tools/langid.py)
+AUTO_SOURCE = "auto"
+
+# Cache à deux niveaux : LRU mémoire devant un store SQLite persistant
+# (TRANSLATION_CACHE_DB ou TRAVLIAQ_DATA_DIR ; sans configuration : mémoire seule)
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "4096"))
+TRANSLATION_CACHE_DB = store_path("TRANSLATION_CACHE_DB", "translations.sqlite3")
+
+# Lots : textes distincts envoyés en parallèle au service (au plus TRANSLATE_BATCH_CONCURRENCY à la fois)
+TRANSLATE_BATCH_CONCURRENCY = int(os.getenv("TRANSLATE_BATCH_CONCURRENCY", "4"))
+TRANSLATE_BATCH_MAX_ITEMS = 200
+
+# Textes longs : découpés en morceaux de ~CHUNK_TOKEN_BUDGET tokens (le modèle tronque au-delà de 512)
+CHUNK_TOKEN_BUDGET = int(os.getenv("TRANSLATE_CHUNK_TOKENS", "350"))
+TRANSLATE_CHUNK_CONCURRENCY = int(os.getenv("TRANSLATE_CHUNK_CONCURRENCY", "4"))
+
+# Micro-batching : les textes d'une même paire sont regroupés pendant TRANSLATE_MICROBATCH_MS
+# (ou jusqu'à TRANSLATE_MICROBATCH_MAX_ITEMS) puis envoyés en un seul appel (0 = désactivé)
+MICROBATCH_MS = float(os.getenv("TRANSLATE_MICROBATCH_MS", "5"))
+MICROBATCH_MAX_ITEMS = int(os.getenv("TRANSLATE_MICROBATCH_MAX_ITEMS", "16"))
+TRANSLATE_BATCH_PATH = os.getenv("TRANSLATE_BATCH_PATH", "/translate_batch")
+
+_TOKEN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+|(?<=[。！？])\s*")
+_LINE_RE = re.compile(r"^(\s*(?:(?:#{1,6}|[-*+>]|\d+[.)])\s+)*)(.*?)(\s*)$", re.S)
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+_MEMORY = TTLCache(ttl=TRANSLATION_CACHE_TTL, maxsize=TRANSLATION_CACHE_SIZE)
+_DISK: Optional[SQLiteStore] = SQLiteStore(TRANSLATION_CACHE_DB, "translations") if TRANSLATION_CACHE_DB else None
+_STATS = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "skipped": 0}
+_BATCH_STATS = {"batches": 0, "items": 0}
+# None = endpoint batch pas encore essayé ; False = absent (404/405/501) -> appels unitaires en parallèle
+_BATCH_SUPPORTED: Optional[bool] = None
+
+
+def _nllb_code(code: str) -> str:
+    code = code.strip()
+    return NLLB_CODES.get(code.upper(), code)
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def _cache_key(text: str, source_language: str, target_language: str) -> str:
+    """sha256 du texte normalisé + paire de langues NLLB."""
+    raw = f"{_nllb_code(source_language)}\x00{_nllb_code(target_language)}\x00{_normalize(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _cached_translation(key: str) -> Optional[Dict[str, Any]]:
+    value = _MEMORY.get(key)
+    if value is not None:
+        _STATS["memory_hits"] += 1
+        return value
+    if _DISK is not None:
+        value = await _DISK.aget(key, max_age=TRANSLATION_CACHE_TTL)
+        if value is not None:
+            _MEMORY.set(key, value)
+            _STATS["disk_hits"] += 1
+            return value
+    return None
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Compteurs du cache de traduction (mémoire + disque)."""
+    hits = _STATS["memory_hits"] + _STATS["disk_hits"]
+    total = hits + _STATS["misses"]  # les textes ignorés (skipped) ne comptent pas
+    return {
+        **_STATS,
+        "hit_rate": round(hits / total, 3) if total else None,
+        "memory_size": len(_MEMORY),
+        "disk_size": len(_DISK) if _DISK is not None else None,
+        "disk_path": TRANSLATION_CACHE_DB or None,
+        "microbatch": {
+            "window_ms": MICROBATCH_MS,
+            "batches": _BATCH_STATS["batches"],
+            "items": _BATCH_STATS["items"],
+            "batch_endpoint": _BATCH_SUPPORTED,
+        },
+    }
+
+
+def clear_cache() -> None:
+    _MEMORY.clear()
+    if _DISK is not None:
+        _DISK.clear()
+    for stats in (_STATS, _BATCH_STATS):
+        for name in stats:
+            stats[name] = 0
+
+
+def _detect_source(text: str, target_language: str) -> Optional[str]:
+    """Langue source pour source_language="auto" : détection locale, None si elle ne tranche pas."""
+    detected = langid.detect(text)
+    if detected is None or detected[0] not in NLLB_CODES:
+        return None
+    # Conclure "déjà dans la langue cible" (donc ne rien traduire) exige la marge stricte
+    if NLLB_CODES[detected[0]] == _nllb_code(target_language) and detected[1] < langid.SKIP_MARGIN:
+        return None
+    return detected[0]
+
+
+def _skip_reason(text: str, source_language: str, target_language: str, detected: bool = False) -> Optional[str]:
+    """Raison de ne pas appeler le service du tout (traduction sans effet), sinon None."""
+    # Une source explicite n'est jamais contredite par la détection : "Check-in à l hotel puis
+    # shopping sur Oxford Street" annoncé FR part au service même s'il ressemble à de l'anglais
+    reason = langid.noop_reason(text)
+    if reason is None and _nllb_code(source_language) == _nllb_code(target_language):
+        reason = "already_target_language" if detected else "same_language"
+    return reason
+
+
+async def _post_translate(text: str, source_language: str, target_language: str) -> Dict[str, Any]:
+    """Appel brut au service /translate (lève en cas d'erreur HTTP/réseau)."""
+    async with httpx.AsyncClient(timeout=TRANSLATE_TIMEOUT) as client:
+        response = await client.post(
+            f"{TRANSLATE_SERVICE_URL}/translate",
+            json={
+                "text": text,
+                "source_language": source_language,
+                "target_language": target_language
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+async def _post_translate_batch(texts: List[str], source_language: str,
+                                target_language: str) -> List[Dict[str, Any]]:
+    """Appel brut à l'endpoint batch : {"texts": [...]} -> {"translations": [...]} dans le même ordre."""
+    async with httpx.AsyncClient(timeout=TRANSLATE_TIMEOUT) as client:
+        response = await client.post(
+            f"{TRANSLATE_SERVICE_URL}{TRANSLATE_BATCH_PATH}",
+            json={
+                "texts": texts,
+                "source_language": source_language,
+                "target_language": target_language
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+    items = data.get("translations") if isinstance(data, dict) else data
+    if not isinstance(items, list) or len(items) != len(texts):
+        raise ValueError("Batch translation response does not match the request")
+    return [item if isinstance(item, dict) else {"translated_text": item} for item in items]
+
+
+def _settle(future: "asyncio.Future[Any]", result: Any = None, error: Optional[BaseException] = None) -> None:
+    # L'appelant a pu abandonner (annulation) pendant l'envoi du lot
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+async def _send_batch(source_language: str, target_language: str,
+                      items: List[Tuple[str, "asyncio.Future[Any]"]]) -> None:
+    """Un appel batch pour tout le lot, ou un appel par texte si le service n'a pas d'endpoint batch."""
+    global _BATCH_SUPPORTED
+    breaker = get_breaker("translate")
+    _BATCH_STATS["batches"] += 1
+    _BATCH_STATS["items"] += len(items)
+
+    if len(items) > 1 and _BATCH_SUPPORTED is not False:
+        texts = [text for text, _ in items]
+        try:
+            results = await breaker.call(lambda: _post_translate_batch(texts, source_language, target_language))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in (404, 405, 501):
+                for _, future in items:
+                    _settle(future, error=e)
+                return
+            logger.info("Translation service has no batch endpoint, falling back to one call per text")
+            _BATCH_SUPPORTED = False
+        except Exception as e:
+            for _, future in items:
+                _settle(future, error=e)
+            return
+        else:
+            _BATCH_SUPPORTED = True
+            for (_, future), result in zip(items, results):
+                _settle(future, result)
+            return
+
+    async def one(text: str, future: "asyncio.Future[Any]") -> None:
+        try:
+            result = await breaker.call(lambda: _post_translate(text, source_language, target_language))
+        except Exception as e:
+            _settle(future, error=e)
+        else:
+            _settle(future, result)
+
+    await asyncio.gather(*(one(text, future) for text, future in items))
+
+
+class _MicroBatcher:
+    """File d'attente par paire de langues, vidée après MICROBATCH_MS ou à MICROBATCH_MAX_ITEMS textes."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._pending: Dict[Tuple[str, str], List[Tuple[str, "asyncio.Future[Any]"]]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        # Codes tels que reçus par la première requête du lot, transmis au service
+        self._codes: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._tasks: set = set()
+
+    def submit(self, text: str, source_language: str, target_language: str) -> "asyncio.Future[Any]":
+        # Clé sur les codes NLLB : "fr" et "fra_Latn" partagent le même lot
+        pair = (_nllb_code(source_language), _nllb_code(target_language))
+        future = self._loop.create_future()
+        self._codes.setdefault(pair, (source_language, target_language))
+        queue = self._pending.setdefault(pair, [])
+        queue.append((text, future))
+        if len(queue) >= MICROBATCH_MAX_ITEMS:
+            self._flush(pair)
+        elif pair not in self._timers:
+            self._timers[pair] = self._loop.call_later(MICROBATCH_MS / 1000.0, self._flush, pair)
+        return future
+
+    def _flush(self, pair: Tuple[str, str]) -> None:
+        timer = self._timers.pop(pair, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(pair, [])
+        source_language, target_language = self._codes.pop(pair, pair)
+        if items:
+            task = self._loop.create_task(_send_batch(source_language, target_language, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+_BATCHERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _MicroBatcher]" = weakref.WeakKeyDictionary()
+
+
+async def _upstream_translate(text: str, source_language: str, target_language: str) -> Dict[str, Any]:
+    """Traduction d'un texte par le service, regroupée avec les requêtes concurrentes de la même paire."""
+    if MICROBATCH_MS <= 0:
+        return await get_breaker("translate").call(
+            lambda: _post_translate(text, source_language, target_language)
+        )
+    loop = asyncio.get_running_loop()
+    batcher = _BATCHERS.get(loop)
+    if batcher is None:
+        batcher = _BATCHERS[loop] = _MicroBatcher(loop)
+    return await batcher.submit(text, source_language, target_language)
+
+
+def _estimate_tokens(text: str) -> int:
+    """Estimation grossière des tokens NLLB : mots/ponctuation x 1.3, un token par idéogramme."""
+    return int(len(_TOKEN_RE.findall(text)) * 1.3) + 1
+
+
+def _split_oversized(sentence: str) -> List[str]:
+    """Découpe une phrase trop longue pour un morceau sur les espaces."""
+    parts, current = [], ""
+    for word in re.findall(r"\S+\s*", sentence):
+        if current and _estimate_tokens(current + word) > CHUNK_TOKEN_BUDGET:
+            parts.append(current)
+            current = ""
+        current += word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _pack_sentences(content: str) -> List[Tuple[str, str]]:
+    """Regroupe les phrases d'une ligne en morceaux <= budget ; renvoie [(morceau, espaces qui suivent)]."""
+    sentences: List[Tuple[str, str]] = []
+    pos = 0
+    for match in _SENTENCE_END_RE.finditer(content):
+        sentences.append((content[pos:match.start()], match.group()))
+        pos = match.end()
+    sentences.append((content[pos:], ""))
+
+    chunks: List[Tuple[str, str]] = []
+    current, current_sep = "", ""
+    for sentence, sep in sentences:
+        if not sentence:
+            current_sep += sep
+            continue
+        pieces = _split_oversized(sentence) if _estimate_tokens(sentence) > CHUNK_TOKEN_BUDGET else [sentence]
+        for i, piece in enumerate(pieces):
+            piece_sep = sep if i == len(pieces) - 1 else ""
+            if current and _estimate_tokens(current + current_sep + piece) > CHUNK_TOKEN_BUDGET:
+                chunks.append((current, current_sep))
+                current, current_sep = "", ""
+            if current:
+                current += current_sep
+            stripped = piece.rstrip()
+            current += stripped
+            current_sep = piece[len(stripped):] + piece_sep
+    if current:
+        chunks.append((current, current_sep))
+    return chunks
+
+
+def _segment(text: str) -> Tuple[List[Any], List[str]]:
+    """
+    Découpe un texte en gabarit + morceaux à traduire.
+
+    Le gabarit mélange du texte conservé tel quel (str) et des index de morceaux
+    (int) : espaces, sauts de ligne, préfixes markdown (#, -, *, 1., >), lignes
+    sans lettres et blocs de code ``` ne partent jamais au service.
+    """
+    template: List[Any] = []
+    chunks: List[str] = []
+    in_code = False
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+            template.append(line)
+            continue
+        match = _LINE_RE.match(line)
+        prefix, content, suffix = match.group(1), match.group(2), match.group(3)
+        if in_code or not _LETTER_RE.search(content):
+            template.append(line)
+            continue
+        template.append(prefix)
+        for chunk, sep in _pack_sentences(content):
+            template.append(len(chunks))
+            chunks.append(chunk)
+            if sep:
+                template.append(sep)
+        template.append(suffix)
+    return template, chunks
+
+
+async def _translate_chunked(text: str, source_language: str, target_language: str) -> Dict[str, Any]:
+    template, chunks = _segment(text)
+    sem = asyncio.Semaphore(max(1, TRANSLATE_CHUNK_CONCURRENCY))
+
+    async def one(chunk: str) -> Dict[str, Any]:
+        async with sem:
+            return await _translate_single(chunk, source_language, target_language)
+
+    outcomes = await asyncio.gather(*(one(chunk) for chunk in chunks))
+    for i, outcome in enumerate(outcomes):
+        if not outcome.get("success"):
+            return {**outcome, "error": f"Chunk {i + 1}/{len(chunks)} failed: {outcome.get('error')}"}
+
+    logger.info(f"✅ Long text translated in {len(chunks)} chunks: {source_language} → {target_language}")
+    return {
+        "success": True,
+        "translated_text": "".join(
+            outcomes[part]["translated_text"] if isinstance(part, int) else part for part in template
+        ),
+        "target_language": outcomes[0]["target_language"] if outcomes else _nllb_code(target_language),
+        "cached": all(o.get("cached") for o in outcomes),
+        "chunks": len(chunks),
+    }
+
+
+async def _translate_single(text: str, source_language: str, target_language: str) -> Dict[str, Any]:
+    """Un appel au service (ou au cache) pour un texte tenant dans la limite du modèle."""
+    key = _cache_key(text, source_language, target_language)
+    cached = await _cached_translation(key)
+    if cached is not None:
+        return {"success": True, **cached, "cached": True}
+
+    try:
+        logger.debug(f"Translating: '{text[:50]}...' ({source_language} → {target_language})")
+        
+        async def fetch() -> Dict[str, Any]:
+            _STATS["misses"] += 1
+            result = await _upstream_translate(text, source_language, target_language)
+            value = {
+                "translated_text": result.get("translated_text", ""),
+                "target_language": result.get("target_language", target_language)
+            }
+            if _DISK is not None:
+                await _DISK.aset(key, value)
+            return value
+
+        # Même texte demandé en parallèle : un seul appel au service
+        value = await _MEMORY.coalesce(key, fetch)
+        
+        logger.info(f"✅ Translation successful: {source_language} → {target_language}")
+        
+        return {"success": True, **value, "cached": False}
+        
+    except CircuitOpenError as e:
+        logger.warning(f"⚠️ Translation skipped: {str(e)}")
+        
+        return e.as_dict()
+        
+    except httpx.HTTPStatusError as e:
+        error_detail = e.response.text if hasattr(e, 'response') else str(e)
+        logger.error(f"❌ Translation HTTP error: {e.response.status_code} - {error_detail}")
+        
+        return {
+            "success": False,
+            "error": f"Translation service returned error {e.response.status_code}: {error_detail}"
+        }
+        
+    except httpx.RequestError as e:
+        logger.error(f"❌ Translation service unreachable: {str(e)}")
+        
+        return {
+            "success": False,
+            "error": f"Translation service unavailable: {str(e)}"
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Unexpected translation error: {str(e)}")
+        
+        return {
+            "success": False,
+            "error": f"Unexpected error: {str(e)}"
+        }
 
 
 async def translate_text(
@@ -21,79 +452,133 @@ async def translate_text(
     Traduit un texte d'une langue source vers une langue cible.
     
     Utilise le service Travliaq-Translate basé sur NLLB-200 (200 langues).
+    Les traductions réussies sont mises en cache (mémoire puis SQLite), par hash
+    du texte normalisé et paire de langues NLLB : une répétition ne coûte rien.
+    Les traductions sans effet (même langue, nombres/URLs seuls, ou avec
+    source_language="auto" texte déjà dans la langue cible selon la détection
+    locale) ne partent pas au service.
+    Un texte long est découpé aux limites de paragraphes/phrases, les morceaux
+    sont traduits en parallèle puis réassemblés (espaces, sauts de ligne,
+    préfixes markdown et blocs de code conservés).
     
     Args:
-        text: Texte à traduire (max 512 tokens)
-        source_language: Code langue source (EN, FR, ES, DE, IT, PT, NL, RU, AR, ZH)
+        text: Texte à traduire (découpé automatiquement au-delà de CHUNK_TOKEN_BUDGET tokens)
+        source_language: Code langue source (EN, FR, ES, DE, IT, PT, NL, RU, AR, ZH),
+            ou "auto" pour la détecter localement (erreur si la détection ne tranche pas)
         target_language: Code langue cible (mêmes codes)
         
     Returns:
         Dict avec structure stable:
-        - Succès: {"success": true, "translated_text": "...", "target_language": "fra_Latn"}
+        - Succès: {"success": true, "translated_text": "...", "target_language": "fra_Latn", "cached": false}
+          (+ "chunks": n quand le texte a été découpé)
+        - Sans appel au service : même texte renvoyé avec "skipped": "same_language" |
+          "no_translatable_text" (nombres, URLs...) | "already_target_language" (source "auto")
         - Erreur: {"success": false, "error": "..."}
         
     Examples:
         >>> await translate_text("Hello world", "EN", "FR")
-        {"success": true, "translated_text": "Bonjour le monde", "target_language": "fra_Latn"}
+        {"success": true, "translated_text": "Bonjour le monde", "target_language": "fra_Latn", "cached": false}
         
         >>> await translate_text("Bienvenue à Paris", "FR", "ES")
-        {"success": true, "translated_text": "Bienvenido a París", "target_language": "spa_Latn"}
+        {"success": true, "translated_text": "Bienvenido a París", "target_language": "spa_Latn", "cached": false}
     """
     if not text or not text.strip():
         return {
             "success": False,
             "error": "Text to translate cannot be empty"
         }
-    
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            logger.debug(f"Translating: '{text[:50]}...' ({source_language} → {target_language})")
-            
-            response = await client.post(
-                f"{TRANSLATE_SERVICE_URL}/translate",
-                json={
-                    "text": text,
-                    "source_language": source_language,
-                    "target_language": target_language
-                }
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            logger.info(f"✅ Translation successful: {source_language} → {target_language}")
-            
-            return {
-                "success": True,
-                "translated_text": result.get("translated_text", ""),
-                "target_language": result.get("target_language", target_language)
-            }
-            
-        except httpx.HTTPStatusError as e:
-            error_detail = e.response.text if hasattr(e, 'response') else str(e)
-            logger.error(f"❌ Translation HTTP error: {e.response.status_code} - {error_detail}")
-            
-            return {
-                "success": False,
-                "error": f"Translation service returned error {e.response.status_code}: {error_detail}"
-            }
-            
-        except httpx.RequestError as e:
-            logger.error(f"❌ Translation service unreachable: {str(e)}")
-            
-            return {
-                "success": False,
-                "error": f"Translation service unavailable: {str(e)}"
-            }
-            
-        except Exception as e:
-            logger.error(f"❌ Unexpected translation error: {str(e)}")
-            
+
+    detected = source_language.strip().lower() == AUTO_SOURCE
+    if detected and langid.noop_reason(text) is None:
+        source_language = _detect_source(text, target_language)
+        if source_language is None:
             return {
                 "success": False,
-                "error": f"Unexpected error: {str(e)}"
+                "error": "Could not detect the source language, pass source_language explicitly"
             }
 
+    skipped = _skip_reason(text, source_language, target_language, detected)
+    if skipped is not None:
+        _STATS["skipped"] += 1
+        return {
+            "success": True,
+            "translated_text": text,
+            "target_language": _nllb_code(target_language),
+            "cached": False,
+            "skipped": skipped
+        }
+
+    if _estimate_tokens(text) <= CHUNK_TOKEN_BUDGET:
+        return await _translate_single(text, source_language, target_language)
+    return await _translate_chunked(text, source_language, target_language)
+
+
+async def translate_batch(
+    texts: List[str],
+    source_language: str = "EN",
+    target_language: str = "FR",
+    concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Traduit une liste de textes pour une même paire de langues.
+
+    Les textes identiques (après normalisation) ne sont traduits qu'une fois, les
+    textes déjà en cache ne partent pas au service, et le reste est envoyé en
+    parallèle (au plus `concurrency` appels simultanés).
+
+    Returns:
+        {"total", "unique", "succeeded", "failed", "cached",
+         "results": [{"index", "success", "translated_text" | "error", "cached", "skipped"?}]} dans l'ordre d'entrée
+    """
+    if len(texts) > TRANSLATE_BATCH_MAX_ITEMS:
+        raise ValueError(f"Too many texts ({len(texts)} > {TRANSLATE_BATCH_MAX_ITEMS})")
+
+    unique: Dict[str, str] = {}
+    keys: List[Optional[str]] = []
+    for text in texts:
+        if not text or not text.strip():
+            keys.append(None)
+            continue
+        key = _cache_key(text, source_language, target_language)
+        unique.setdefault(key, text)
+        keys.append(key)
+
+    sem = asyncio.Semaphore(max(1, concurrency or TRANSLATE_BATCH_CONCURRENCY))
+
+    async def one(text: str) -> Dict[str, Any]:
+        async with sem:
+            return await translate_text(text, source_language, target_language)
+
+    outcomes = await asyncio.gather(*(one(text) for text in unique.values()))
+    by_key = dict(zip(unique, outcomes))
+
+    results = []
+    for index, key in enumerate(keys):
+        if key is None:
+            results.append({"index": index, "success": False, "error": "Text to translate cannot be empty"})
+            continue
+        outcome = by_key[key]
+        item = {"index": index, "success": bool(outcome.get("success"))}
+        if item["success"]:
+            item["translated_text"] = outcome["translated_text"]
+            item["cached"] = outcome.get("cached", False)
+            if outcome.get("skipped"):
+                item["skipped"] = outcome["skipped"]
+        else:
+            item["error"] = outcome.get("error", "Translation failed")
+        results.append(item)
+
+    succeeded = sum(1 for r in results if r["success"])
+    return {
+        "total": len(texts),
+        "unique": len(unique),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "cached": sum(1 for o in outcomes if o.get("cached")),
+        "target_language": _nllb_code(target_language),
+        "results": results,
+    }
+
 
 async def translate_en(text: str) -> str:
     """
@@ -115,7 +600,10 @@ async def translate_en(text: str) -> str:
         >>> await translate_en("N'oubliez pas d'acheter des souvenirs")
         "Don't forget to buy souvenirs"
     """
-    result = await translate_text(text, source_language="FR", target_language="EN")
+    # Souvent appelé sur un texte déjà anglais : la détection ne sert qu'à l'éviter (marge stricte),
+    # la source reste FR sinon ("Pizza napolitaine et gelato" n'est pas de l'italien)
+    source = "EN" if _detect_source(text, "EN") == "EN" else "FR"
+    result = await translate_text(text, source_language=source, target_language="EN")
     
     if result.get("success"):
         return result["translated_text"]
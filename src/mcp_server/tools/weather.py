@@ -90,6 +90,137 @@ def weather_by_coords_core(lat: float, lon: float, timezone: str = "auto", days:
     return out
 
 
+HOURLY_VARIABLES = {
+    "temperature_2m": "temperature_c",
+    "apparent_temperature": "feels_like_c",
+    "precipitation": "precip_mm",
+    "precipitation_probability": "precip_prob_pct",
+    "relative_humidity_2m": "humidity_pct",
+    "wind_speed_10m": "wind_kmh",
+    "weather_code": "condition",
+}
+DEFAULT_HOURLY_VARIABLES = ("temperature_2m", "precipitation", "precipitation_probability", "weather_code")
+DAYPARTS = ((0, "nuit"), (6, "matin"), (12, "après-midi"), (18, "soir"))
+DOWNSAMPLE_METHODS = ("3h", "6h", "daypart", "lttb")
+
+
+def _bucket_key(ts: str, method: str) -> str:
+    day, _, hhmm = ts.partition("T")
+    hour = int(hhmm[:2] or 0)
+    if method == "daypart":
+        label = [name for start, name in DAYPARTS if hour >= start][-1]
+        return f"{day} {label}"
+    size = 3 if method == "3h" else 6
+    return f"{day}T{(hour // size) * size:02d}:00"
+
+
+def _aggregate_bucket(var: str, values: List[Any]) -> Any:
+    vals = [v for v in values if v is not None]
+    if not vals:
+        return None
+    if var == "precipitation":
+        return round(sum(vals), 2)
+    if var == "precipitation_probability":
+        return max(vals)
+    if var == "weather_code":
+        # Le code le plus élevé est aussi le plus sévère (orage > pluie > nuages)
+        return _code_label(max(vals))
+    return {"min": min(vals), "max": max(vals), "mean": round(sum(vals) / len(vals), 1)}
+
+
+def _downsample_buckets(times: List[str], series: Dict[str, List[Any]], method: str) -> List[Dict[str, Any]]:
+    order: List[str] = []
+    groups: Dict[str, List[int]] = {}
+    for i, ts in enumerate(times):
+        key = _bucket_key(ts, method)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(i)
+    out: List[Dict[str, Any]] = []
+    for key in order:
+        idx = groups[key]
+        row: Dict[str, Any] = {"bucket": key, "start": times[idx[0]], "end": times[idx[-1]]}
+        for var, values in series.items():
+            row[HOURLY_VARIABLES[var]] = _aggregate_bucket(var, [values[i] for i in idx if i < len(values)])
+        out.append(row)
+    return out
+
+
+def _lttb(points: List[tuple], threshold: int) -> List[tuple]:
+    """Largest-Triangle-Three-Buckets : garde la forme (pics/creux) avec `threshold` points."""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    every = (n - 2) / (threshold - 2)
+    sampled = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nxt_start, nxt_end = end, min(int((i + 2) * every) + 1, n)
+        nxt = points[nxt_start:nxt_end] or [points[-1]]
+        avg_x = sum(p[0] for p in nxt) / len(nxt)
+        avg_y = sum(p[1] for p in nxt) / len(nxt)
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, min(end, n - 1)):
+            bx, by = points[j]
+            area = abs((ax - avg_x) * (by - ay) - (ax - bx) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def _downsample_lttb(times: List[str], series: Dict[str, List[Any]], max_points: int) -> Dict[str, List[Dict[str, Any]]]:
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for var, values in series.items():
+        pts = [(i, v) for i, v in enumerate(values[:len(times)]) if v is not None]
+        if var == "weather_code":
+            # Variable catégorielle : on ne garde que les changements d'état
+            kept = [p for k, p in enumerate(pts) if k == 0 or p[1] != pts[k - 1][1]]
+            out[HOURLY_VARIABLES[var]] = [{"time": times[i], "value": _code_label(v)} for i, v in kept]
+            continue
+        out[HOURLY_VARIABLES[var]] = [{"time": times[i], "value": v} for i, v in _lttb(pts, max_points)]
+    return out
+
+
+def weather_hourly_core(lat: float, lon: float, timezone: str = "auto", days: int = 3,
+                        variables: List[str] | None = None, downsample: str = "6h",
+                        max_points: int = 48) -> Dict[str, Any]:
+    if lat is None or lon is None:
+        raise WeatherError("lat/lon requis")
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise WeatherError(f"downsample invalide: {downsample} (attendu: {', '.join(DOWNSAMPLE_METHODS)})")
+    wanted = [v for v in (variables or DEFAULT_HOURLY_VARIABLES) if v in HOURLY_VARIABLES]
+    if not wanted:
+        raise WeatherError(f"variables invalides (attendu: {', '.join(HOURLY_VARIABLES)})")
+    params = {
+        "latitude": lat, "longitude": lon, "timezone": timezone or "auto",
+        "hourly": ",".join(wanted),
+        "forecast_days": max(1, min(int(days or 3), 16)),
+    }
+    r = _http_get(OPEN_METEO_URL, params=params)
+    h = r.json().get("hourly", {})
+    times: List[str] = h.get("time", []) or []
+    series = {v: (h.get(v) or []) for v in wanted}
+    if downsample == "lttb":
+        hourly: Any = _downsample_lttb(times, series, max(3, int(max_points or 48)))
+        points = max((len(s) for s in hourly.values()), default=0)
+    else:
+        hourly = _downsample_buckets(times, series, downsample)
+        points = len(hourly)
+    return {
+        "mode": "hourly",
+        "coords": {"lat": lat, "lon": lon, "timezone": timezone or "auto"},
+        "downsample": {"method": downsample, "raw_points": len(times), "points": points},
+        "hourly": hourly,
+    }
+
+
 def weather_brief_from_coords_core(lat: float, lon: float, timezone: str = "auto") -> str:
     w = weather_by_coords_core(lat, lon, timezone)
     cur = w["current"]
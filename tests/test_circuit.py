@@ -0,0 +1,97 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from mcp_server.tools import circuit, translation  # noqa: E402
+
+
+def _status_error(status):
+    request = httpx.Request("GET", "https://scraper.test/api")
+    return httpx.HTTPStatusError("boom", request=request, response=httpx.Response(status, request=request))
+
+
+def test_breaker_opens_fails_fast_and_recovers_after_probe(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(circuit.time, "monotonic", lambda: clock["now"])
+    breaker = circuit.CircuitBreaker("booking", window_s=60, min_calls=4, failure_rate=0.5, open_s=30)
+    calls = []
+
+    async def failing():
+        calls.append("fail")
+        raise _status_error(503)
+
+    async def ok():
+        calls.append("ok")
+        return {"ok": True}
+
+    async def run():
+        # Les erreurs 4xx client ne comptent pas contre le service
+        with pytest.raises(httpx.HTTPStatusError):
+            await breaker.call(lambda: _raise(_status_error(404)))
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await breaker.call(failing)
+        assert breaker.state == circuit.CLOSED, "min_calls not reached yet"
+        with pytest.raises(httpx.HTTPStatusError):
+            await breaker.call(failing)
+        assert breaker.state == circuit.OPEN
+
+        with pytest.raises(circuit.CircuitOpenError) as err:
+            await breaker.call(ok)
+        assert calls.count("ok") == 0
+        assert err.value.as_dict()["circuit"] == "open"
+        assert breaker.snapshot()["rejected"] == 1
+
+        clock["now"] += 31
+        assert breaker.snapshot()["state"] == circuit.HALF_OPEN
+        assert await breaker.call(ok) == {"ok": True}
+        assert breaker.state == circuit.CLOSED
+
+    async def _raise(exc):
+        raise exc
+
+    asyncio.run(run())
+
+
+def test_breaker_counts_slow_calls(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(circuit.time, "monotonic", lambda: clock["now"])
+    breaker = circuit.CircuitBreaker("flights", slow_call_s=10, min_calls=2, failure_rate=0.5)
+
+    async def slow():
+        clock["now"] += 12
+        return {}
+
+    async def run():
+        await breaker.call(slow)
+        await breaker.call(slow)
+        assert breaker.state == circuit.OPEN
+        assert breaker.snapshot()["slow_calls"] == 2
+
+    asyncio.run(run())
+
+
+def test_translate_returns_structured_error_when_circuit_open(monkeypatch):
+    breaker = circuit.CircuitBreaker("translate", open_s=30)
+    breaker.state = circuit.OPEN
+    breaker._opened_at = circuit.time.monotonic()
+    monkeypatch.setitem(circuit.BREAKERS, "translate", breaker)
+
+    async def never_called(*args, **kwargs):
+        raise AssertionError("upstream must not be called while the circuit is open")
+
+    monkeypatch.setattr(translation, "_post_translate", never_called)
+    monkeypatch.setattr(translation, "_DISK", None)
+    translation._MEMORY.clear()
+    result = asyncio.run(translation.translate_text("Hello", "EN", "FR"))
+    assert result["success"] is False
+    assert result["upstream"] == "translate" and result["retry_after_s"] > 0
+    assert circuit.health_snapshot()["degraded"] == ["translate"]
@@ -0,0 +1,312 @@
+import asyncio
+import base64
+import io
+import sys
+import threading
+from pathlib import Path
+
+import httpx
+import pytest
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from mcp_server.tools import image_generation as imgs  # noqa: E402
+from mcp_server.tools import image_jobs  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def dedupe_store(monkeypatch, tmp_path):
+    store = imgs.SQLiteStore(str(tmp_path / "images.sqlite3"), "images")
+    monkeypatch.setattr(imgs, "_DEDUPE", store)
+    imgs._MEMORY.clear()
+    yield store
+    imgs._MEMORY.clear()
+
+
+def _png(size=(1024, 576)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, "teal").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _install_fake_services(monkeypatch, uploads, fail_prompts=()):
+    monkeypatch.setattr(imgs, "OPENROUTER_KEY", "or-key")
+    monkeypatch.setattr(imgs, "SUPABASE_URL", "https://supabase.test")
+    monkeypatch.setattr(imgs, "SUPABASE_SERVICE_KEY", "sb-key")
+    data_url = "data:image/png;base64," + base64.b64encode(_png()).decode()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "openrouter.ai":
+            prompt = httpx.Response(200, content=request.content).json()["messages"][0]["content"]
+            if any(p in prompt for p in fail_prompts):
+                return httpx.Response(429, json={"error": {"message": "rate limited"}})
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"choices": [{"message": {"images": [{"image_url": {"url": data_url}}]}}]})
+        uploads[request.url.path] = await request.aread()
+        return httpx.Response(200, json={"Key": request.url.path})
+
+    real_client = httpx.AsyncClient
+
+    def client(*args, **kwargs):
+        return real_client(*args, transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(imgs.httpx, "AsyncClient", client)
+
+
+def test_image_pipeline_is_async_and_encodes_off_loop(monkeypatch):
+    uploads = {}
+    _install_fake_services(monkeypatch, uploads)
+    threads = []
+    encode = imgs._encode_variant
+
+    def tracked(*args):
+        threads.append(threading.current_thread().name)
+        return encode(*args)
+
+    monkeypatch.setattr(imgs, "_encode_variant", tracked)
+
+    async def run():
+        return await asyncio.gather(
+            imgs.generate_hero("JP_TOKYO", "Mont Fuji"),
+            imgs.generate_slider("JP_TOKYO", "Ramen"),
+        )
+
+    hero, slider = asyncio.run(run())
+    assert hero.startswith("https://supabase.test/storage/v1/object/public/TRIPS/JP_TOKYO/hero_")
+    assert "/slider_" in slider
+    sizes = {Image.open(io.BytesIO(data)).size for data in uploads.values()}
+    assert {(800, 600), (1920, 1080)} <= sizes
+    assert all(name.startswith("images") for name in threads)
+
+
+def test_trip_pack_runs_concurrently_and_reports_each_image(monkeypatch):
+    uploads = {}
+    _install_fake_services(monkeypatch, uploads, fail_prompts=("Kaboom",))
+    monkeypatch.setattr(imgs, "RATE_LIMIT_BACKOFF", 0.0)
+    monkeypatch.setattr(imgs, "IMAGE_PACK_RETRIES", 1)
+    running = {"now": 0, "peak": 0}
+    generate = imgs._generate_image_openrouter
+
+    async def tracked(*args):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            return await generate(*args)
+        finally:
+            running["now"] -= 1
+
+    monkeypatch.setattr(imgs, "_generate_image_openrouter", tracked)
+    seen = []
+
+    async def on_result(entry, done, total):
+        seen.append((done, total, entry["index"]))
+
+    images = [
+        {"type": "hero", "prompt": "Mont Fuji"},
+        {"type": "background", "prompt": "Kyoto"},
+        {"type": "slider", "prompt": "Kaboom"},
+        {"type": "slider", "prompt": "Ramen"},
+    ]
+    manifest = asyncio.run(imgs.generate_trip_pack("JP_TOKYO", images, concurrency=2, on_result=on_result))
+
+    assert manifest["total"] == 4 and manifest["succeeded"] == 3 and manifest["failed"] == 1
+    assert [e["index"] for e in manifest["images"]] == [0, 1, 2, 3]
+    assert manifest["images"][2]["success"] is False and "429" in manifest["images"][2]["error"]
+    assert "/background_" in manifest["images"][1]["url"]
+    assert sorted(i for _, _, i in seen) == [0, 1, 2, 3] and [d for d, _, _ in seen] == [1, 2, 3, 4]
+    assert running["peak"] <= 2
+
+    with pytest.raises(ValueError):
+        asyncio.run(imgs.generate_trip_pack("JP_TOKYO", [{"type": "poster", "prompt": "x"}]))
+
+
+def test_trip_pack_logs_a_failing_progress_callback(monkeypatch, caplog):
+    _install_fake_services(monkeypatch, {})
+
+    async def on_result(entry, done, total):
+        raise RuntimeError("client gone")
+
+    images = [{"type": "hero", "prompt": "Mont Fuji"}, {"type": "slider", "prompt": "Ramen"}]
+    with caplog.at_level("WARNING", logger=imgs.__name__):
+        manifest = asyncio.run(imgs.generate_trip_pack("JP_TOKYO", images, on_result=on_result))
+
+    assert manifest["succeeded"] == 2
+    assert sum("progress callback failed: client gone" in r.getMessage() for r in caplog.records) == 2
+
+
+def test_identical_prompts_reuse_content_addressed_upload(monkeypatch, dedupe_store):
+    uploads = {}
+    _install_fake_services(monkeypatch, uploads)
+    calls = []
+    generate = imgs._generate_image_openrouter
+
+    async def counted(*args):
+        calls.append(args)
+        return await generate(*args)
+
+    monkeypatch.setattr(imgs, "_generate_image_openrouter", counted)
+    async def run():
+        # Deux appels simultanés identiques : une seule génération
+        return await asyncio.gather(
+            imgs.generate_hero("JP_TOKYO", "Mont Fuji"),
+            imgs.generate_hero("JP_TOKYO", " Mont  Fuji"),
+        )
+
+    first, second = asyncio.run(run())
+    assert first == second and len(calls) == 1
+    uploaded = len(uploads)
+    digest = imgs.hashlib.sha256(uploads[httpx.URL(first).path.replace("/public", "")]).hexdigest()[:16]
+    assert first.endswith(f"/hero_1920w_{digest}.jpg")
+
+    # Après redémarrage (mémoire vide), le store persistant suffit
+    imgs._MEMORY.clear()
+    assert asyncio.run(imgs.generate_hero("JP_TOKYO", "Mont Fuji")) == first
+    assert len(calls) == 1 and len(uploads) == uploaded
+    assert dedupe_store.get(imgs._dedupe_key("hero", calls[0][0], 1920, 1080))["url"] == first
+
+    # Autre type ou autre taille : nouvelle image
+    asyncio.run(imgs.generate_background("JP_TOKYO", "Mont Fuji"))
+    assert len(calls) == 2
+
+
+def test_upload_sends_immutable_cache_headers(monkeypatch):
+    seen = []
+    monkeypatch.setattr(imgs, "SUPABASE_URL", "https://supabase.test")
+    monkeypatch.setattr(imgs, "SUPABASE_SERVICE_KEY", "sb-key")
+    monkeypatch.setattr(imgs, "OPENROUTER_KEY", "or-key")
+
+    monkeypatch.setattr(imgs, "UPLOAD_CHUNK", 1000)
+
+    async def handler(request):
+        seen.append((request.headers, await request.aread()))
+        return httpx.Response(200)
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(imgs.httpx, "AsyncClient",
+                        lambda *a, **k: real_client(*a, transport=httpx.MockTransport(handler), **k))
+    asyncio.run(imgs._upload_to_supabase(b"x", "JP", "hero_abc.jpg", "image/jpeg"))
+    assert seen[0][0]["cache-control"] == "public, max-age=31536000, immutable"
+
+    # Un memoryview est envoyé par tranches, avec sa longueur, sans copie préalable
+    payload = bytes(range(256)) * 10
+    asyncio.run(imgs._upload_to_supabase(memoryview(payload), "JP", "hero_def.jpg", "image/jpeg"))
+    headers, body = seen[1]
+    assert body == payload and headers["content-length"] == str(len(payload))
+    assert "transfer-encoding" not in headers
+
+
+def test_responsive_variants_from_one_decode(monkeypatch):
+    uploads = {}
+    _install_fake_services(monkeypatch, uploads)
+    monkeypatch.setattr(imgs, "VARIANT_WIDTHS", [480, 960, 4000])
+    monkeypatch.setattr(imgs, "VARIANT_FORMATS", ["avif", "webp", "gif", "jpeg"])
+    decodes = []
+    decode = imgs._decode
+
+    def counted(*args):
+        decodes.append(args[1:])
+        return decode(*args)
+
+    monkeypatch.setattr(imgs, "_decode", counted)
+    manifest = asyncio.run(imgs.generate_hero("JP_TOKYO", "Mont Fuji", responsive=True))
+
+    assert decodes == [(1920, 1080)]
+    formats = imgs._variant_formats()
+    assert formats[-2:] == ["webp", "jpeg"] and "gif" not in formats
+    assert [src["type"] for src in manifest["sources"]] == [imgs.VARIANT_TYPES[f][1] for f in formats]
+    assert len(manifest["variants"]) == len(uploads) == 3 * len(formats)
+    jpeg = [v for v in manifest["variants"] if v["format"] == "jpeg"]
+    assert [(v["width"], v["height"]) for v in jpeg] == [(480, 270), (960, 540), (1920, 1080)]
+    assert manifest["url"] == jpeg[-1]["url"]
+    webp = next(v for v in manifest["variants"] if v["format"] == "webp" and v["width"] == 480)
+    assert Image.open(io.BytesIO(uploads[httpx.URL(webp["url"]).path.replace("/public", "")])).format == "WEBP"
+    assert manifest["sources"][-1]["srcset"].endswith(f"{manifest['url']} 1920w")
+    placeholder = base64.b64decode(manifest["placeholder"].split(",", 1)[1])
+    assert Image.open(io.BytesIO(placeholder)).width == imgs.PLACEHOLDER_WIDTH
+
+
+def test_async_jobs_return_immediately_and_survive_restart(monkeypatch, tmp_path):
+    uploads = {}
+    _install_fake_services(monkeypatch, uploads, fail_prompts=("Kaboom",))
+    monkeypatch.setattr(imgs, "IMAGE_PACK_RETRIES", 0)
+    store = imgs.SQLiteStore(str(tmp_path / "jobs.sqlite3"), "image_jobs")
+    jobs = image_jobs.ImageJobs(store, workers=2)
+
+    async def run():
+        hero = await jobs.submit("hero", "JP_TOKYO", {"prompt": "Mont Fuji"})
+        failing = await jobs.submit("slider", "JP_TOKYO", {"prompt": "Kaboom"})
+        pack = await jobs.submit("trip_pack", "JP_TOKYO", {"images": [{"type": "slider", "prompt": "Ramen"}]})
+        assert hero["status"] == "queued" and not uploads
+
+        done = await jobs.wait(hero["job_id"], timeout=10)
+        assert done["status"] == "done" and done["result"]["url"].startswith("https://supabase.test/")
+        assert (await jobs.wait(failing["job_id"], timeout=10))["status"] == "failed"
+        packed = await jobs.wait(pack["job_id"], timeout=10)
+        assert packed["result"]["succeeded"] == 1 and packed["progress"] == {"done": 1, "total": 1}
+        jobs.stop()
+        return hero["job_id"], failing["job_id"]
+
+    hero_id, failing_id = asyncio.run(run())
+
+    # Redémarrage : les jobs terminés sont relus depuis le store, un job resté "running" est signalé interrompu
+    stuck = {**store.get(hero_id), "job_id": "stuck", "status": "running", "result": None}
+    store.set("stuck", stuck)
+    restarted = image_jobs.ImageJobs(store)
+
+    async def after_restart():
+        done = await restarted.get(hero_id)
+        assert done["status"] == "done" and done["result"]["responsive"]["sources"]
+        assert "429" in (await restarted.get(failing_id))["error"]
+        interrupted = await restarted.wait("stuck", timeout=1)
+        assert interrupted["status"] == "failed" and "restart" in interrupted["error"]
+        assert await restarted.get("missing") is None
+
+    asyncio.run(after_restart())
+    assert store.get("stuck")["status"] == "failed"
+
+    with pytest.raises(ValueError):
+        asyncio.run(jobs.submit("poster", "JP_TOKYO", {"prompt": "x"}))
+
+
+def test_large_jpeg_sources_are_draft_decoded():
+    buf = io.BytesIO()
+    Image.new("RGB", (3840, 2160), "teal").save(buf, format="JPEG")
+    img = imgs._decode(buf.getvalue(), 800, 600)
+    assert img.size == (800, 600) and img.mode == "RGB"
+    source = Image.open(io.BytesIO(buf.getvalue()))
+    source.draft("RGB", (800, 600))
+    assert source.size == (1920, 1080)  # décodé directement au 1/2
+
+
+def test_async_jobs_resume_on_a_new_loop_and_never_stay_queued(monkeypatch, tmp_path):
+    uploads = {}
+    _install_fake_services(monkeypatch, uploads)
+    store = imgs.SQLiteStore(str(tmp_path / "jobs.sqlite3"), "image_jobs")
+    jobs = image_jobs.ImageJobs(store, workers=1)
+
+    async def submit_and_leave():
+        # La boucle se termine avant que le job ne soit traité
+        return (await jobs.submit("hero", "JP_TOKYO", {"prompt": "Mont Fuji"}))["job_id"]
+
+    job_id = asyncio.run(submit_and_leave())
+
+    async def resume():
+        done = await jobs.wait(job_id, timeout=10)
+        assert done["status"] == "done" and done["result"]["url"]
+        jobs.stop()
+
+    asyncio.run(resume())
+
+    # Job inconnu en mémoire mais "queued" dans le store : marqué en échec plutôt que laissé bloqué
+    store.set("orphan", {**store.get(job_id), "job_id": "orphan", "status": "queued", "result": None})
+
+    async def orphan():
+        await jobs._run("orphan")
+        assert (await jobs.get("orphan"))["status"] == "failed"
+
+    asyncio.run(orphan())
+    assert store.get("orphan")["status"] == "failed"
@@ -1,3 +1,4 @@
+import asyncio
 import sys
 from pathlib import Path
 
@@ -107,3 +108,81 @@ async def test_place_overview_combines_geocode_airport_climate():
     climate = overview.get("climate")
     assert climate and climate.get("average_temperature_c") is not None
     assert climate.get("place", {}).get("name")
+
+
+def test_climate_period_stats_fetches_years_concurrently_and_caches(monkeypatch):
+    places._CLIMATE_SEGMENTS.clear()
+    calls = []
+
+    async def fake_http_get(url, params, **kwargs):
+        calls.append(params["start_date"])
+        year = int(params["start_date"][:4])
+        return {
+            "daily": {
+                "time": ["d1", "d2"],
+                "temperature_2m_mean": [float(year % 10), float(year % 10) + 1],
+                "temperature_2m_max": [30.0, 25.0],
+                "temperature_2m_min": [5.0, 8.0],
+                "precipitation_sum": [0.0, 4.0],
+            }
+        }
+
+    monkeypatch.setattr(places, "_http_get", fake_http_get)
+
+    async def run():
+        stats = await places.climate_period_stats(48.85, 2.35, "2026-06-01", "2026-06-02", years=5)
+        assert len(calls) == 5
+        assert len(stats["years"]) == 5 and stats["samples"] == 10
+        assert stats["stats"]["precip"]["rain_day_probability"] == 0.5
+        assert stats["stats"]["tmax_c"]["record"] == 30.0
+        assert stats["stats"]["tmin_c"]["record"] == 5.0
+        assert stats["cache"] == {"segments": 5, "hits": 0}
+
+        again = await places.climate_period_stats(48.85, 2.35, "2026-06-01", "2026-06-02", years=5)
+        assert len(calls) == 5, "Second call should be served from the segment cache"
+        assert again["cache"]["hits"] == 5
+        assert again["stats"] == stats["stats"]
+
+    asyncio.run(run())
+
+
+def test_climate_best_months_ranks_and_caches(monkeypatch):
+    places._CLIMATE_SEGMENTS.clear()
+    places._CLIMATE_MONTHLY.clear()
+    places._GEOCODE_CACHE.clear()
+    calls = []
+
+    async def fake_http_get(url, params, **kwargs):
+        calls.append(url)
+        if "geocoding" in url:
+            return {"results": [{"name": "Lisbon", "latitude": 38.72, "longitude": -9.14, "timezone": "UTC"}]}
+        year = params["start_date"][:4]
+        times, temps, rain = [], [], []
+        for month in range(1, 13):
+            for day in (1, 15):
+                times.append(f"{year}-{month:02d}-{day:02d}")
+                temps.append(5.0 + 2 * month if month <= 7 else 33.0 - 2 * (month - 7))
+                rain.append(5.0 if month in (6, 7) else 0.0)
+        return {"daily": {"time": times, "temperature_2m_mean": temps, "temperature_2m_max": temps,
+                          "temperature_2m_min": temps, "precipitation_sum": rain}}
+
+    monkeypatch.setattr(places, "_http_get", fake_http_get)
+
+    async def run():
+        result = await places.climate_best_months_for_place("Lisbon", years=3, ideal_min_c=20, ideal_max_c=24)
+        assert len(calls) == 1 + 3  # un géocodage + une année par requête climat
+        months = result["months"]
+        assert [m["rank"] for m in months] == list(range(1, 13))
+        # Décembre (23°C, sec) puis novembre (25°C) devant juillet (19°C mais pluvieux)
+        assert [m["name"] for m in months[:2]] == ["décembre", "novembre"]
+        assert months[0]["score"] == 1.0
+        july = next(m for m in months if m["month"] == 7)
+        assert july["dry_score"] == 0.0 and july["rank"] > 2
+        assert result["from_cache"] is False
+
+        again = await places.climate_best_months_for_place("lisbon ", years=3, ideal_min_c=20, ideal_max_c=24)
+        assert len(calls) == 4, "Repeat query should not hit the network"
+        assert again["from_cache"] is True
+        assert again["months"] == months
+
+    asyncio.run(run())
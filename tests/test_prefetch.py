@@ -0,0 +1,93 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from mcp_server import prefetch  # noqa: E402
+from mcp_server.tools import circuit  # noqa: E402
+
+
+def _scheduler(refreshed, ttl=0.05, budget=None, upstream="test"):
+    async def refresh(**params):
+        refreshed.append(params)
+
+    kinds = {"route": prefetch.PrefetchKind("route", upstream, lambda: ttl, refresh)}
+    budgets = {upstream: budget} if budget is not None else {}
+    return prefetch.PrefetchScheduler(kinds, budgets, min_hits=2, window_s=60, refresh_at=0.5, enabled=False)
+
+
+def test_hot_keys_refreshed_before_expiry_and_counted_as_prefetch_hits():
+    refreshed = []
+    sched = _scheduler(refreshed)
+
+    async def run():
+        sched.note("route", {"origin": "CDG", "destination": "JFK"})
+        await asyncio.sleep(0.03)
+        assert await sched.run_once() == 0  # une seule demande : pas encore chaude
+
+        sched.note("route", {"origin": "cdg ", "destination": "JFK"}, cached=True)
+        sched.note("route", {"origin": "CDG", "destination": "NRT"})
+        assert await sched.run_once() == 1
+        assert refreshed == [{"origin": "CDG", "destination": "JFK"}]
+
+        # Juste rafraîchi : rien à refaire tout de suite, et l'appel suivant compte comme hit de prefetch
+        assert await sched.run_once() == 0
+        sched.note("route", {"origin": "CDG", "destination": "JFK"}, cached=True)
+        stats = sched.stats()
+        assert stats["refreshed"] == 1 and stats["prefetch_hits"] == 1
+        assert stats["calls"] == 4 and stats["prefetch_hit_rate"] == 0.25
+        assert stats["tracked"] == 2 and stats["hot"] == 1
+
+    asyncio.run(run())
+
+
+def test_priority_budget_and_open_circuit():
+    refreshed = []
+    sched = _scheduler(refreshed, ttl=0.0, budget=prefetch.TokenBucket(rate=0.0, burst=1))
+
+    async def run():
+        for _ in range(2):
+            sched.note("route", {"origin": "CDG", "destination": "JFK"})
+        for _ in range(3):
+            sched.note("route", {"origin": "CDG", "destination": "NRT"})
+        # La clé la plus demandée passe en premier ; la seconde attend un jeton
+        assert await sched.run_once() == 2
+        assert refreshed == [{"origin": "CDG", "destination": "NRT"}]
+        assert sched.stats()["deferred_budget"] == 1
+
+    asyncio.run(run())
+
+    breaker = circuit.CircuitBreaker("flights", min_calls=1, open_s=60)
+    breaker.record(False, 0.1)
+    original = circuit.BREAKERS["flights"]
+    circuit.BREAKERS["flights"] = breaker
+    try:
+        refreshed.clear()
+        sched = _scheduler(refreshed, ttl=0.0, upstream="flights")
+
+        async def blocked():
+            for _ in range(2):
+                sched.note("route", {"origin": "CDG", "destination": "JFK"})
+            await sched.run_once()
+
+        asyncio.run(blocked())
+        assert refreshed == [] and sched.stats()["skipped_circuit"] == 1
+    finally:
+        circuit.BREAKERS["flights"] = original
+
+
+def test_past_dates_are_dropped():
+    refreshed = []
+    sched = _scheduler(refreshed, ttl=0.0)
+
+    async def run():
+        for _ in range(2):
+            sched.note("route", {"origin": "CDG", "destination": "JFK"}, until="2000-01-01")
+        assert await sched.run_once() == 0
+        assert sched.stats()["tracked"] == 0
+
+    asyncio.run(run())
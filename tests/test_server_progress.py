@@ -0,0 +1,116 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from mcp_server import server  # noqa: E402
+
+
+class FakeContext:
+    def __init__(self):
+        self.progress = []
+
+    async def report_progress(self, progress, total=None, message=None):
+        self.progress.append((progress, total, message))
+
+
+def test_with_heartbeat_reports_progress_and_returns_result():
+    ctx = FakeContext()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    result = asyncio.run(server._with_heartbeat(slow(), ctx, "booking.search", None, interval=0.01))
+    assert result == {"ok": True}
+    assert ctx.progress, "Expected at least one heartbeat"
+    elapsed = [p for p, _, _ in ctx.progress]
+    assert elapsed == sorted(elapsed)
+    assert all("booking.search" in msg for _, _, msg in ctx.progress)
+
+
+def test_with_heartbeat_deadline_cancels_upstream():
+    ctx = FakeContext()
+    state = {"cancelled": False}
+
+    async def hanging():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            await server._with_heartbeat(hanging(), ctx, "flights.prices", 0.05, interval=0.01)
+        await asyncio.sleep(0)
+        assert state["cancelled"]
+        assert all(total == 0.05 for _, total, _ in ctx.progress)
+
+    asyncio.run(run())
+
+
+def test_with_heartbeat_client_disconnect_cancels_upstream():
+    state = {"cancelled": False}
+
+    async def hanging():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def run():
+        call = asyncio.ensure_future(server._with_heartbeat(hanging(), None, "booking.details", None, interval=0.01))
+        await asyncio.sleep(0.03)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        assert state["cancelled"]
+
+    asyncio.run(run())
+
+
+def test_non_positive_timeouts_are_rejected_by_every_layer():
+    from mcp_server.tools import booking, flights
+    from mcp_server.tools.circuit import effective_timeout
+
+    async def never_called():
+        raise AssertionError("upstream must not be called")
+
+    for bad in (0, -5):
+        with pytest.raises(ValueError):
+            asyncio.run(server._with_heartbeat(never_called(), None, "booking.search", bad))
+        with pytest.raises(ValueError):
+            effective_timeout(bad, booking.DEFAULT_TIMEOUT)
+        with pytest.raises(ValueError):
+            asyncio.run(booking.search_hotels("Paris", "2030-01-01", "2030-01-02", timeout=bad))
+        with pytest.raises(ValueError):
+            asyncio.run(flights.get_flight_prices("CDG", "JFK", "2030-01-01", "2030-01-02", timeout=bad))
+    assert effective_timeout(None, booking.DEFAULT_TIMEOUT) == booking.DEFAULT_TIMEOUT
+    assert effective_timeout(500, booking.DEFAULT_TIMEOUT) == booking.DEFAULT_TIMEOUT
+    assert effective_timeout(12, flights.DEFAULT_TIMEOUT) == 12.0
+
+
+def test_circuit_open_response_warns_and_answers_immediately():
+    from mcp_server.tools.circuit import CircuitOpenError
+
+    class WarningContext:
+        def __init__(self):
+            self.warnings = []
+
+        async def warning(self, message):
+            self.warnings.append(message)
+
+    ctx = WarningContext()
+    answer = asyncio.run(server._circuit_open_response(CircuitOpenError("booking", 12.0), ctx))
+    assert answer["success"] is False and answer["circuit"] == "open" and answer["retry_after_s"] == 12.0
+    assert ctx.warnings and "booking" in ctx.warnings[0]
+    assert asyncio.run(server._circuit_open_response(CircuitOpenError("flights", 5.0), None))["circuit"] == "open"
@@ -1,6 +1,9 @@
+import asyncio
 import json
 from datetime import date
+from pathlib import Path
 
+import httpx
 import pytest
 from PIL import Image
 
@@ -126,6 +129,45 @@ def test_weather_by_period_core_handles_window(monkeypatch):
     assert result["daily"][0]["condition"] == "Ciel clair"
 
 
+def test_weather_hourly_core_downsamples(monkeypatch):
+    times = [f"2024-01-0{1 + h // 24}T{h % 24:02d}:00" for h in range(48)]
+    temps = [10.0 + (h % 24) for h in range(48)]
+    temps[30] = 40.0  # pic isolé qui doit survivre au sous-échantillonnage
+    response = DummyResponse(
+        {
+            "hourly": {
+                "time": times,
+                "temperature_2m": temps,
+                "precipitation": [0.5] * 48,
+                "weather_code": [0] * 24 + [61] * 24,
+            }
+        }
+    )
+    monkeypatch.setattr(weather, "_http_get", lambda *args, **kwargs: response)
+
+    data = weather.weather_hourly_core(10.0, 20.0, "UTC", days=2,
+                                       variables=["temperature_2m", "precipitation", "weather_code"],
+                                       downsample="6h")
+    assert data["downsample"] == {"method": "6h", "raw_points": 48, "points": 8}
+    first = data["hourly"][0]
+    assert first["temperature_c"] == {"min": 10.0, "max": 15.0, "mean": 12.5}
+    assert first["precip_mm"] == 3.0
+    assert data["hourly"][5]["temperature_c"]["max"] == 40.0
+    assert data["hourly"][-1]["condition"] == "Pluie faible"
+
+    lttb = weather.weather_hourly_core(10.0, 20.0, "UTC", days=2, variables=["temperature_2m"],
+                                       downsample="lttb", max_points=12)
+    series = lttb["hourly"]["temperature_c"]
+    assert len(series) == 12
+    assert series[0]["time"] == times[0] and series[-1]["time"] == times[-1]
+    assert max(p["value"] for p in series) == 40.0
+
+
+def _status_error(status, message):
+    request = httpx.Request("GET", "https://flights.test/api/v1/calendar-prices")
+    return httpx.HTTPStatusError(message, request=request, response=httpx.Response(status, request=request))
+
+
 def test_get_flight_prices(monkeypatch):
     class FakeClient:
         def __init__(self, *args, **kwargs):
@@ -138,20 +180,238 @@ def test_get_flight_prices(monkeypatch):
             return False
 
         async def get(self, url, params):
-            return DummyResponse({"prices": {"2024-01-01": 123}, "from_cache": True, "stats": {"min": 123}})
+            return DummyResponse({"prices": {"2024-01-01": 123}, "from_cache": True, "stats": {"min": 123},
+                                  "currency": "EUR", "start_date": params["start_date"], "source": "google"})
 
     monkeypatch.setattr(flights.httpx, "AsyncClient", FakeClient)
+    flights._PRICE_STORE.clear()
+    flights._ROUTE_EXTRAS.clear()
 
     async def run():
         result = await flights.get_flight_prices("CDG", "JFK", "2024-01-01", "2024-01-10")
         assert result["prices"]["2024-01-01"] == 123
         assert result["from_cache"] is True
+        # Les autres clés du scraper sont conservées, y compris quand tout vient du store
+        assert result["currency"] == "EUR" and result["source"] == "google"
+        again = await flights.get_flight_prices("CDG", "JFK", "2024-01-02", "2024-01-05")
+        assert again["currency"] == "EUR" and again["start_date"] == "2024-01-02"
+        assert again["cache"]["fetched_days"] == 0
 
     import asyncio
 
     asyncio.run(run())
 
 
+def test_flight_prices_fetch_only_missing_days(monkeypatch):
+    requested = []
+
+    async def fake_fetch(origin, destination, start, end, force_refresh, timeout):
+        requested.append((start.isoformat(), end.isoformat()))
+        prices = {}
+        day = start
+        while day <= end:
+            if day.day != 4:  # pas de vol le 4
+                prices[day.isoformat()] = 100 + day.day
+            day += flights.timedelta(days=1)
+        return {"prices": prices, "from_cache": False}
+
+    monkeypatch.setattr(flights, "_fetch_range", fake_fetch)
+    flights._PRICE_STORE.clear()
+
+    async def run():
+        first = await flights.get_flight_prices("cdg", "nrt", "2024-03-01", "2024-03-05")
+        assert requested == [("2024-03-01", "2024-03-05")]
+        assert first["stats"] == {"min": 101, "max": 105, "avg": 102.75, "count": 4}
+        assert first["cache"]["cached_days"] == 0
+
+        # Fenêtre glissée/élargie : seuls les jours manquants sont demandés, en parallèle
+        wider = await flights.get_flight_prices("CDG", "NRT", "2024-02-28", "2024-03-08")
+        assert requested[1:] == [("2024-02-28", "2024-02-29"), ("2024-03-06", "2024-03-08")]
+        assert wider["cache"] == {
+            "cached_days": 5,
+            "fetched_days": 5,
+            "fetched_ranges": [["2024-02-28", "2024-02-29"], ["2024-03-06", "2024-03-08"]],
+            "chunks": 2,
+            "failed_ranges": [],
+        }
+        assert "2024-03-04" not in wider["prices"]
+        assert wider["stats"]["count"] == 9 and wider["stats"]["min"] == 101
+
+        # Jours périmés : re-demandés
+        key = ("CDG", "NRT")
+        price, _ = flights._PRICE_STORE[key]["2024-03-02"]
+        flights._PRICE_STORE[key]["2024-03-02"] = (price, 0.0)
+        await flights.get_flight_prices("CDG", "NRT", "2024-03-01", "2024-03-03")
+        assert requested[-1] == ("2024-03-02", "2024-03-02")
+
+    asyncio.run(run())
+
+
+def test_flight_prices_long_window_chunked_with_retry(monkeypatch):
+    requested = []
+    attempts = {}
+    running = {"now": 0, "peak": 0}
+
+    async def fake_fetch(origin, destination, start, end, force_refresh, timeout):
+        requested.append((start.isoformat(), end.isoformat()))
+        attempts[start] = attempts.get(start, 0) + 1
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        if start.isoformat() == "2024-04-11" and attempts[start] == 1:
+            raise httpx.ReadTimeout("scraper timeout")  # échec transitoire : re-tenté seul
+        if start.isoformat() == "2024-04-21":
+            raise _status_error(503, "scraper down")  # échec persistant : le reste est conservé
+        if start.isoformat() == "2024-05-01":
+            raise _status_error(400, "bad dates")  # erreur client : jamais re-tentée
+        day, prices = start, {}
+        while day <= end:
+            prices[day.isoformat()] = 50 + day.day
+            day += flights.timedelta(days=1)
+        return {"prices": prices, "from_cache": False}
+
+    monkeypatch.setattr(flights, "_fetch_range", fake_fetch)
+    monkeypatch.setattr(flights, "CHUNK_DAYS", 10)
+    monkeypatch.setattr(flights, "MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(flights, "RETRY_BACKOFF", 0.0)
+    flights._PRICE_STORE.clear()
+
+    async def run():
+        result = await flights.get_flight_prices("CDG", "JFK", "2024-04-01", "2024-04-30")
+        cache = result["cache"]
+        assert cache["chunks"] == 3
+        assert cache["failed_ranges"] == [{"start": "2024-04-21", "end": "2024-04-30", "error": "scraper down"}]
+        assert cache["fetched_days"] == 20 and cache["cached_days"] == 0
+        assert len(result["prices"]) == 20 and result["stats"]["max"] == 70
+        assert attempts[flights.date(2024, 4, 11)] == 2
+        assert running["peak"] <= 2
+
+        # Seul le morceau en échec est redemandé ensuite
+        requested.clear()
+        with pytest.raises(httpx.HTTPStatusError, match="scraper down"):
+            await flights.get_flight_prices("CDG", "JFK", "2024-04-01", "2024-04-30")
+        assert set(requested) == {("2024-04-21", "2024-04-30")}
+        assert attempts[flights.date(2024, 4, 21)] == 4  # 1 + CHUNK_RETRIES, deux fois
+
+        with pytest.raises(httpx.HTTPStatusError, match="bad dates"):
+            await flights.get_flight_prices("CDG", "JFK", "2024-05-01", "2024-05-03")
+        assert attempts[flights.date(2024, 5, 1)] == 1
+
+    asyncio.run(run())
+
+
+def test_flight_price_matrix(monkeypatch):
+    base = {"CDG": 100, "BRU": 80, "NRT": 0, "KIX": 10}
+
+    async def fake_fetch(origin, destination, start, end, force_refresh, timeout):
+        if destination == "HND":
+            raise RuntimeError("no route")
+        day, prices = start, {}
+        while day <= end:
+            prices[day.isoformat()] = base[origin] + base[destination] + day.day
+            day += flights.timedelta(days=1)
+        return {"prices": prices, "from_cache": False}
+
+    monkeypatch.setattr(flights, "_fetch_range", fake_fetch)
+    flights._PRICE_STORE.clear()
+
+    async def run():
+        result = await flights.get_flight_price_matrix(
+            ["cdg", "BRU", "CDG"], ["NRT", "KIX", "HND", "BRU"], "2024-05-01", "2024-05-03", top_k=2
+        )
+        assert result["dates"] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+        assert result["cube"]["BRU"]["NRT"]["2024-05-01"] == 81
+        assert "BRU" not in result["cube"]["BRU"]  # origine == destination ignorée
+        assert result["pairs"][0] == {
+            "origin": "BRU", "destination": "NRT", "min": 81, "avg": 82, "count": 3, "cheapest_date": "2024-05-01",
+        }
+        assert result["cheapest"] == [
+            {"origin": "BRU", "destination": "NRT", "date": "2024-05-01", "price": 81},
+            {"origin": "BRU", "destination": "NRT", "date": "2024-05-02", "price": 82},
+        ]
+        assert {(e["origin"], e["destination"]) for e in result["errors"]} == {("CDG", "HND"), ("BRU", "HND")}
+
+        # Les paires déjà vues sont servies par le cache par jour
+        again = await flights.get_flight_prices("CDG", "KIX", "2024-05-01", "2024-05-03")
+        assert again["from_cache"] is True
+
+        with pytest.raises(ValueError):
+            await flights.get_flight_price_matrix(["CDG"], ["CDG"], "2024-05-01", "2024-05-03")
+
+    asyncio.run(run())
+
+
+def test_flight_price_matrix_reraises_open_circuit(monkeypatch):
+    async def open_circuit(origin, destination, start, end, force_refresh, timeout):
+        raise flights.CircuitOpenError("flights", 30.0)
+
+    monkeypatch.setattr(flights, "_fetch_range", open_circuit)
+    flights._PRICE_STORE.clear()
+
+    async def run():
+        with pytest.raises(flights.CircuitOpenError) as exc:
+            await flights.get_flight_price_matrix(["CDG", "ORY"], ["NRT"], "2024-05-01", "2024-05-03")
+        assert exc.value.as_dict()["circuit"] == "open"
+
+    asyncio.run(run())
+
+
+def test_best_returns_matches_brute_force():
+    import random
+
+    rng = random.Random(7)
+    for _ in range(50):
+        returns = [rng.choice([None, *range(50, 90)]) for _ in range(30)]
+        lo = rng.randint(0, 5)
+        hi = lo + rng.randint(0, 6)
+        best = flights._best_returns(returns, 20, lo, hi)
+        for i, j in enumerate(best):
+            window = [r for r in returns[i + lo:i + hi + 1] if r is not None]
+            assert (returns[j] if j is not None else None) == (min(window) if window else None)
+            if j is not None:
+                assert lo <= j - i <= hi
+
+
+def test_flight_best_trip_windows(monkeypatch):
+    requested = []
+    outbound = {1: 300, 2: 120, 3: 200, 4: 150}
+    inbound = {5: 90, 6: 400, 7: 60, 8: 80, 9: 70}
+
+    async def fake_fetch(origin, destination, start, end, force_refresh, timeout):
+        requested.append((origin, destination, start.isoformat(), end.isoformat()))
+        table = outbound if origin == "CDG" else inbound
+        day, prices = start, {}
+        while day <= end:
+            if day.day in table:
+                prices[day.isoformat()] = table[day.day]
+            day += flights.timedelta(days=1)
+        return {"prices": prices, "from_cache": False}
+
+    monkeypatch.setattr(flights, "_fetch_range", fake_fetch)
+    flights._PRICE_STORE.clear()
+
+    async def run():
+        result = await flights.get_best_trip_windows("cdg", "nrt", "2024-06-01", "2024-06-04", 3, 4, top_k=2)
+        assert ("NRT", "CDG", "2024-06-04", "2024-06-08") in requested
+        assert result["windows"] == [
+            {"depart": "2024-06-02", "return": "2024-06-05", "nights": 3,
+             "outbound_price": 120.0, "return_price": 90.0, "total": 210.0},
+            {"depart": "2024-06-04", "return": "2024-06-07", "nights": 3,
+             "outbound_price": 150.0, "return_price": 60.0, "total": 210.0},
+        ]
+        assert result["searched"] == {"departures": 4, "returns": 4}
+
+        one_way = await flights.get_best_trip_windows("CDG", "NRT", "2024-06-01", "2024-06-04", round_trip=False, top_k=1)
+        assert one_way["windows"] == [{"depart": "2024-06-02", "total": 120.0}]
+        assert one_way["cache"]["outbound"]["cached_days"] == 4
+
+        with pytest.raises(ValueError):
+            await flights.get_best_trip_windows("CDG", "NRT", "2024-06-01", "2024-06-04", 5, 2)
+
+    asyncio.run(run())
+
+
 def test_booking_tools(monkeypatch):
     class FakeClient:
         def __init__(self, *args, **kwargs):
@@ -181,6 +441,228 @@ def test_booking_tools(monkeypatch):
     asyncio.run(run())
 
 
+def test_booking_search_cache_serves_stale_and_refreshes(monkeypatch):
+    calls = []
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+        async def get(self, url, params):
+            calls.append(params)
+            return DummyResponse({"total_found": len(calls), "hotels": []})
+
+    monkeypatch.setattr(booking.httpx, "AsyncClient", FakeClient)
+    booking._SEARCH_CACHE.clear()
+
+    async def run():
+        first = await booking.search_hotels("Paris", "2024-01-01", "2024-01-02", star_rating=[5, 4])
+        assert first["cache"]["status"] == "miss"
+        # Même recherche canonique : casse/espaces/ordre des étoiles ignorés, max_results non transmis
+        second = await booking.search_hotels(" paris ", "2024-01-01", "2024-01-02", star_rating=[4, 5],
+                                             max_results=3)
+        assert second["cache"]["status"] == "fresh"
+        assert len(calls) == 1
+
+        monkeypatch.setattr(booking._SEARCH_CACHE, "ttl", 0.0)
+        stale = await booking.search_hotels("Paris", "2024-01-01", "2024-01-02", star_rating=[4, 5])
+        assert stale["cache"]["status"] == "stale"
+        assert stale["total_found"] == 1
+        await asyncio.gather(*booking._REFRESH_TASKS.values())
+        assert len(calls) == 2
+
+        monkeypatch.setattr(booking._SEARCH_CACHE, "ttl", 600.0)
+        refreshed = await booking.search_hotels("Paris", "2024-01-01", "2024-01-02", star_rating=[4, 5])
+        assert refreshed["total_found"] == 2
+        assert refreshed["cache"]["status"] == "fresh"
+
+    asyncio.run(run())
+
+
+def test_coalesced_fetch_survives_one_cancelled_caller():
+    from mcp_server.tools.cache import TTLCache
+
+    cache = TTLCache(ttl=60)
+    started, cancelled = [], []
+
+    async def fetch():
+        started.append(1)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "value"
+
+    async def run():
+        first = asyncio.ensure_future(cache.coalesce("k", fetch))
+        second = asyncio.ensure_future(cache.coalesce("k", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        # Le second appelant obtient toujours le résultat de l'appel partagé
+        assert await second == "value"
+        assert first.cancelled() and started == [1] and cancelled == []
+        assert cache.get("k") == "value"
+
+        # Dernier appelant parti : l'appel partagé est annulé et la clé libérée
+        lone = asyncio.ensure_future(cache.coalesce("other", fetch))
+        await asyncio.sleep(0.01)
+        lone.cancel()
+        await asyncio.sleep(0.01)
+        assert cancelled == [1] and "other" not in cache._inflight
+
+    asyncio.run(run())
+
+
+def test_booking_search_narrowing_is_filtered_locally(monkeypatch):
+    hotels = [
+        {"name": "A", "price_per_night": "€ 1.250", "review_score": 9.1, "star_rating": 5},
+        {"name": "B", "price_per_night": 180, "review_score": 8.4, "star_rating": 4},
+        {"name": "C", "price_per_night": 95.5, "review_score": 7.2, "star_rating": 3},
+        {"name": "D", "price_per_night": "150", "review_score": 8.9, "star_rating": 4},
+    ]
+    calls = []
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+        async def get(self, url, params):
+            calls.append(params)
+            return DummyResponse({"total_found": len(hotels), "hotels": hotels})
+
+    monkeypatch.setattr(booking.httpx, "AsyncClient", FakeClient)
+    booking._SEARCH_CACHE.clear()
+
+    async def run():
+        await booking.search_hotels("Rome", "2024-05-01", "2024-05-03")
+        cheap = await booking.search_hotels("Rome", "2024-05-01", "2024-05-03", max_price=200)
+        assert cheap["cache"]["status"] == "derived"
+        assert [h["name"] for h in cheap["hotels"]] == ["B", "C", "D"]
+
+        refined = await booking.search_hotels("Rome", "2024-05-01", "2024-05-03", max_price=200,
+                                              star_rating=[4, 5], min_review_score=8.5, max_results=5)
+        assert [h["name"] for h in refined["hotels"]] == ["D"]
+        assert refined["total_found"] == 1
+
+        top = await booking.search_hotels("Rome", "2024-05-01", "2024-05-03", star_rating=[4, 5], max_results=1)
+        assert [h["name"] for h in top["hotels"]] == ["A"] and top["total_found"] == 3
+        assert len(calls) == 1
+
+        # Autres dates ou occupation : pas de réutilisation
+        await booking.search_hotels("Rome", "2024-05-01", "2024-05-03", adults=3, max_price=200)
+        assert len(calls) == 2
+
+        # "price" seul peut être le total du séjour : filtre de prix renvoyé au scraper
+        for hotel in hotels:
+            hotel["price"] = hotel.pop("price_per_night")
+        await booking.search_hotels("Milan", "2024-05-01", "2024-05-03")
+        total = await booking.search_hotels("Milan", "2024-05-01", "2024-05-03", max_price=200)
+        assert total["cache"]["status"] == "miss" and len(calls) == 4
+
+    asyncio.run(run())
+
+
+def test_booking_field_aliases_and_index_pruning(monkeypatch):
+    assert booking._field({"review_score": None, "rating": "8,5"}, booking.SCORE_FIELDS) == 8.5
+    assert booking._field({"rating": None}, booking.SCORE_FIELDS) is None
+    assert booking._field({"price": "€ 120"}, booking.PRICE_FIELDS) is None  # total possible du séjour
+    # Séparateur suivi de 3 chiffres : milliers ; de 1-2 chiffres : décimales
+    assert booking._as_number("€ 1.250") == 1250.0
+    assert booking._as_number("1.250,50 €") == 1250.5
+    assert booking._as_number("1 250 €") == 1250.0
+    assert booking._as_number("US$1,234.56") == 1234.56
+    assert booking._as_number("8,5") == 8.5 and booking._as_number("n/a") is None
+
+    monkeypatch.setattr(booking, "_SEARCH_CACHE", booking.TTLCache(ttl=600, maxsize=2))
+    monkeypatch.setattr(booking, "_BASE_INDEX", {})
+    keys = [("city%d" % i, "2024-01-01", "2024-01-02", 2, 0, 1, None, None, None, None) for i in range(5)]
+    for key in keys:
+        booking._SEARCH_CACHE.set(key, {"hotels": []})
+        booking._register_search(key)
+    # Seules les recherches encore en cache restent indexées
+    assert len(booking._BASE_INDEX) <= 3
+    assert {k for ks in booking._BASE_INDEX.values() for k in ks} >= set(keys[-2:])
+
+
+def test_booking_details_batch_bounded_and_partial(monkeypatch):
+    running = {"now": 0, "peak": 0}
+
+    async def fake_details(hotel_id, country_code, checkin=None, checkout=None, adults=2, rooms=1):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            if hotel_id == "slow":
+                await asyncio.sleep(1)
+            await asyncio.sleep(0.01)
+            if hotel_id == "broken":
+                raise RuntimeError("scraper error")
+            return {"hotel": {"id": hotel_id}}
+        finally:
+            running["now"] -= 1
+
+    monkeypatch.setattr(booking, "get_hotel_details", fake_details)
+    progress = []
+
+    async def on_result(item, done, total):
+        progress.append((item["hotel_id"], done, total))
+
+    async def run():
+        ids = ["h1", "broken", "h2", "slow", "h3", "h1"]
+        result = await booking.get_hotel_details_batch(ids, "fr", concurrency=2, item_timeout=0.2,
+                                                      on_result=on_result)
+        assert [r["hotel_id"] for r in result["results"]] == ["h1", "broken", "h2", "slow", "h3"]
+        assert (result["total"], result["succeeded"], result["failed"]) == (5, 3, 2)
+        assert "Timeout" in result["results"][3]["error"]
+        assert result["results"][1]["error"] == "scraper error"
+        assert running["peak"] <= 2
+        assert sorted(done for _, done, _ in progress) == [1, 2, 3, 4, 5]
+
+    asyncio.run(run())
+
+
+def test_booking_projection_profiles_shrink_payloads():
+    fixtures = Path(__file__).parent / "fixtures"
+    details = json.loads((fixtures / "booking_hotel_details.json").read_text(encoding="utf-8"))
+    search = json.loads((fixtures / "booking_search_results.json").read_text(encoding="utf-8"))
+    size = lambda payload: len(json.dumps(payload, ensure_ascii=False))
+
+    assert booking.project_details(details, "full") is details
+    summary = booking.project_details(details, "summary")
+    assert summary["name"] == details["name"] and summary["review_score"] == details["review_score"]
+    assert len(summary["photos"]) == 3 and summary["photos_total"] == len(details["photos"])
+    assert len(summary["reviews"]) == 3 and len(summary["description"]) <= 401
+    assert "rooms" not in summary and "faq" not in summary
+    assert size(summary) < size(details) * 0.2
+
+    pricing = booking.project_details({"hotel": details}, "pricing")["hotel"]
+    assert len(pricing["rooms"]) == len(details["rooms"]) and "photos" not in pricing
+
+    only = booking.project_details(details, fields=["name", "price"])
+    assert only == {"name": details["name"], "price": details["price"]}
+
+    compact = booking.project_search(search, "pricing")
+    assert compact["total_found"] == search["total_found"]
+    assert set(compact["hotels"][0]) <= {"hotel_id", "name", "url", "star_rating", "review_score",
+                                         "review_count", "price", "currency"}
+    assert size(compact) < size(search) * 0.3
+
+    with pytest.raises(ValueError):
+        booking.project_details(details, "tiny")
+
+
 def test_image_generation_builders_and_tool(monkeypatch):
     monkeypatch.setattr(image_generation, "_require_env", lambda: None)
     monkeypatch.setattr(image_generation, "_unique_id", lambda: "abc123")
@@ -0,0 +1,303 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.append(str(SRC))
+
+from mcp_server.tools import translation  # noqa: E402
+from mcp_server.tools.store import SQLiteStore  # noqa: E402
+
+
+@pytest.fixture
+def fake_service(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_post(text, source_language, target_language):
+        calls.append((text, source_language, target_language))
+        await asyncio.sleep(0.01)
+        return {"translated_text": f"<{target_language}>{text}", "target_language": translation._nllb_code(target_language)}
+
+    monkeypatch.setattr(translation, "_post_translate", fake_post)
+    monkeypatch.setattr(translation, "_BATCH_SUPPORTED", False)
+    monkeypatch.setattr(translation, "_DISK", SQLiteStore(str(tmp_path / "translations.sqlite3"), "translations"))
+    translation.clear_cache()
+    return calls
+
+
+def test_translation_two_tier_cache(fake_service):
+    async def run():
+        first = await translation.translate_text("Bonjour le monde", "FR", "EN")
+        assert first == {"success": True, "translated_text": "<EN>Bonjour le monde",
+                         "target_language": "eng_Latn", "cached": False}
+
+        # Même texte (normalisé) et même paire NLLB : pas de nouvel appel, y compris via translate_en
+        again = await translation.translate_text("  Bonjour le monde\n", "fr", "eng_Latn")
+        assert again["cached"] is True and again["translated_text"] == "<EN>Bonjour le monde"
+        assert await translation.translate_en("Bonjour le monde") == "<EN>Bonjour le monde"
+
+        # Redémarrage simulé : la mémoire est vide, le disque répond
+        translation._MEMORY.clear()
+        assert (await translation.translate_text("Bonjour le monde", "FR", "EN"))["cached"] is True
+
+        # Requêtes concurrentes identiques : un seul appel au service
+        await asyncio.gather(*(translation.translate_text("Salut", "FR", "ES") for _ in range(5)))
+
+    asyncio.run(run())
+    assert fake_service == [("Bonjour le monde", "FR", "EN"), ("Salut", "FR", "ES")]
+    stats = translation.cache_stats()
+    assert stats["memory_hits"] == 2 and stats["disk_hits"] == 1 and stats["misses"] == 2
+    assert stats["disk_size"] == 2
+
+
+def test_translation_errors_are_not_cached(fake_service, monkeypatch):
+    async def failing(*args):
+        raise translation.httpx.ConnectError("down")
+
+    monkeypatch.setattr(translation, "_post_translate", failing)
+    result = asyncio.run(translation.translate_text("Hello", "EN", "FR"))
+    assert result["success"] is False and "unavailable" in result["error"]
+    assert translation.cache_stats()["disk_size"] == 0
+
+
+def test_translate_batch_dedupes_and_keeps_order(fake_service, monkeypatch):
+    running = {"now": 0, "peak": 0}
+    inner = translation._post_translate
+
+    async def tracked(*args):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            return await inner(*args)
+        finally:
+            running["now"] -= 1
+
+    monkeypatch.setattr(translation, "_post_translate", tracked)
+
+    async def run():
+        await translation.translate_text("Visit Senso-ji", "EN", "FR")
+        texts = ["Day 1: Arrival", "Visit Senso-ji", "", "Day 1: Arrival ", "Ramen tour", "Sushi class", "Temple"]
+        return await translation.translate_batch(texts, "EN", "FR", concurrency=2)
+
+    result = asyncio.run(run())
+    assert result["total"] == 7 and result["unique"] == 5
+    assert result["succeeded"] == 6 and result["failed"] == 1 and result["cached"] == 1
+    assert [r["index"] for r in result["results"]] == list(range(7))
+    assert result["results"][3]["translated_text"] == "<FR>Day 1: Arrival"
+    assert result["results"][1]["cached"] is True
+    assert result["results"][2] == {"index": 2, "success": False, "error": "Text to translate cannot be empty"}
+    # 1 appel initial + 4 textes distincts non cachés, jamais plus de 2 en parallèle
+    assert len(fake_service) == 5 and running["peak"] <= 2
+
+
+def test_long_text_chunked_on_sentences_and_reassembled(fake_service, monkeypatch):
+    monkeypatch.setattr(translation, "CHUNK_TOKEN_BUDGET", 20)
+    text = (
+        "# Tokyo in three days\n"
+        "\n"
+        "Tokyo mixes old temples and neon streets. Start early at Senso-ji before the crowds. "
+        "Then walk to the river for a boat ride to Hamarikyu gardens.  Lunch is ramen.\n"
+        "\n"
+        "- Day 1: Asakusa and Ueno\n"
+        "  2. Day 2: Shibuya, Harajuku\r\n"
+        "---\n"
+        "```\n"
+        "code stays as is.\n"
+        "```\n"
+        "> Tip: buy a Suica card!"
+    )
+
+    result = asyncio.run(translation.translate_text(text, "EN", "FR"))
+    assert result["success"] is True and result["chunks"] == len(fake_service) > 4
+    assert all(translation._estimate_tokens(chunk) <= 20 for chunk, _, _ in fake_service)
+    assert result["translated_text"].replace("<FR>", "") == text
+    assert "<FR>code" not in result["translated_text"]
+    assert result["translated_text"].startswith("# <FR>Tokyo in three days\n\n<FR>Tokyo mixes")
+    assert "\n- <FR>Day 1: Asakusa and Ueno\n  2. <FR>Day 2" in result["translated_text"]
+    assert result["translated_text"].endswith("> <FR>Tip: buy a Suica card!")
+
+    # Un morceau en échec fait échouer l'ensemble avec un message explicite
+    monkeypatch.setattr(translation, "_post_translate", _failing)
+    translation._MEMORY.clear()
+    translation._DISK.clear()
+    failed = asyncio.run(translation.translate_text(text, "EN", "DE"))
+    assert failed["success"] is False and failed["error"].startswith("Chunk ")
+
+
+async def _failing(*args):
+    raise translation.httpx.ConnectError("down")
+
+
+def test_microbatcher_groups_concurrent_requests_per_pair(fake_service, monkeypatch):
+    batches = []
+
+    async def fake_batch(texts, source_language, target_language):
+        batches.append((tuple(texts), source_language, target_language))
+        return [{"translated_text": f"[{target_language}]{t}", "target_language": target_language} for t in texts]
+
+    monkeypatch.setattr(translation, "_post_translate_batch", fake_batch)
+    monkeypatch.setattr(translation, "_BATCH_SUPPORTED", None)
+    monkeypatch.setattr(translation, "MICROBATCH_MAX_ITEMS", 4)
+
+    async def run():
+        words = [f"word {i}" for i in range(6)]
+        return await asyncio.gather(
+            *(translation.translate_text(w, "EN", "FR") for w in words),
+            translation.translate_text("word 0", "EN", "DE"),
+        )
+
+    results = asyncio.run(run())
+    assert [r["translated_text"] for r in results[:6]] == [f"[FR]word {i}" for i in range(6)]
+    assert results[6]["translated_text"] == "<DE>word 0"  # lot d'un seul texte : appel unitaire
+    assert sorted(len(b[0]) for b in batches) == [2, 4]  # plein à 4, puis le reste après la fenêtre
+    assert all(b[1:] == ("EN", "FR") for b in batches)
+    assert fake_service == [("word 0", "EN", "DE")]
+    assert translation._BATCH_SUPPORTED is True
+
+
+def test_microbatcher_keys_on_nllb_codes(fake_service, monkeypatch):
+    batches = []
+
+    async def fake_batch(texts, source_language, target_language):
+        batches.append((tuple(texts), source_language, target_language))
+        return [{"translated_text": t.upper(), "target_language": target_language} for t in texts]
+
+    monkeypatch.setattr(translation, "_post_translate_batch", fake_batch)
+    monkeypatch.setattr(translation, "_BATCH_SUPPORTED", None)
+
+    async def run():
+        return await asyncio.gather(
+            translation.translate_text("un", "fr", "EN"),
+            translation.translate_text("deux", "fra_Latn", "eng_Latn"),
+            translation.translate_text("trois", "FR", "en"),
+        )
+
+    results = asyncio.run(run())
+    assert [r["translated_text"] for r in results] == ["UN", "DEUX", "TROIS"]
+    assert batches == [(("un", "deux", "trois"), "fr", "EN")]  # codes de la première requête du lot
+    assert fake_service == []
+
+
+def test_microbatcher_falls_back_without_batch_endpoint(fake_service, monkeypatch):
+    async def no_batch(texts, source_language, target_language):
+        request = translation.httpx.Request("POST", "https://translate.test/translate_batch")
+        raise translation.httpx.HTTPStatusError(
+            "not found", request=request, response=translation.httpx.Response(404, request=request)
+        )
+
+    monkeypatch.setattr(translation, "_post_translate_batch", no_batch)
+    monkeypatch.setattr(translation, "_BATCH_SUPPORTED", None)
+
+    async def run():
+        return await asyncio.gather(*(translation.translate_text(f"t{i}", "EN", "FR") for i in range(3)))
+
+    results = asyncio.run(run())
+    assert [r["translated_text"] for r in results] == ["<FR>t0", "<FR>t1", "<FR>t2"]
+    assert sorted(fake_service) == [("t0", "EN", "FR"), ("t1", "EN", "FR"), ("t2", "EN", "FR")]
+    assert translation._BATCH_SUPPORTED is False
+
+
+def test_langid_detects_supported_languages():
+    from mcp_server.tools import langid
+
+    samples = {
+        "EN": "The museum is closed on Tuesday",
+        "FR": "N'oubliez pas d'acheter des souvenirs",
+        "ES": "El hotel está cerca de la playa y tiene piscina",
+        "DE": "Das Museum ist dienstags geschlossen",
+        "IT": "Il museo è chiuso il martedì",
+        "PT": "O museu fecha às terças-feiras",
+        "NL": "Het museum is op dinsdag gesloten",
+        "RU": "Музей закрыт по вторникам",
+        "ZH": "博物馆周二闭馆",
+    }
+    for code, text in samples.items():
+        assert langid.detect(text)[0] == code, text
+    assert langid.detect("Hello world") is None  # trop court pour trancher
+
+    assert langid.noop_reason("42 € - https://travliaq.com") == "no_translatable_text"
+    assert langid.noop_reason("Hello") is None and langid.noop_reason("Hidden Temples") is None
+    # Noms communs capitalisés (titres d'activités, de lieux) : toujours traduits
+    for text in ("Cathédrale", "Château", "Boulangerie", "Croisière", "Wine Tasting", "Snorkeling"):
+        assert langid.noop_reason(text) is None, text
+
+
+def test_noop_translations_are_skipped(fake_service):
+    async def run():
+        return [
+            await translation.translate_en("Don't forget to buy souvenirs at the market"),
+            await translation.translate_text("Château", "FR", "EN"),
+            await translation.translate_text("2024-05-01 / 14:30", "EN", "FR"),
+            await translation.translate_text("Bonjour", "FR", "fra_Latn"),
+            await translation.translate_text("Bonjour le monde", "FR", "EN"),
+        ]
+
+    en, name, numbers, same, translated = asyncio.run(run())
+    assert en == "Don't forget to buy souvenirs at the market"
+    assert "skipped" not in name and name["translated_text"] == "<EN>Château"
+    assert numbers["skipped"] == "no_translatable_text"
+    assert same["skipped"] == "same_language"
+    assert "skipped" not in translated
+    assert fake_service == [("Château", "FR", "EN"), ("Bonjour le monde", "FR", "EN")]
+    assert translation.cache_stats()["skipped"] == 3
+
+
+def test_detection_never_overrides_an_explicit_source(fake_service):
+    mixed = "Check-in à l hotel puis shopping sur Oxford Street"
+
+    async def run():
+        return [
+            await translation.translate_text(mixed, "FR", "EN"),
+            await translation.translate_en(mixed),
+            await translation.translate_text("The museum is closed on Tuesday", "FR", "EN"),
+            await translation.translate_text("Don't forget to buy souvenirs at the market", "auto", "EN"),
+            await translation.translate_text("Visite du Louvre puis dîner au restaurant", "auto", "EN"),
+            await translation.translate_text(mixed, "auto", "EN"),
+            await translation.translate_text("https://travliaq.com", "auto", "EN"),
+        ]
+
+    explicit, en, declared, skipped, detected, ambiguous, numbers = asyncio.run(run())
+    assert explicit["translated_text"] == en == f"<EN>{mixed}" and "skipped" not in explicit
+    assert "skipped" not in declared  # l'appelant annonce FR : pas de court-circuit
+    assert skipped["skipped"] == "already_target_language"
+    assert detected["translated_text"] == "<EN>Visite du Louvre puis dîner au restaurant"
+    assert ambiguous["success"] is False and "source_language" in ambiguous["error"]
+    assert numbers["skipped"] == "no_translatable_text"
+    assert fake_service == [
+        (mixed, "FR", "EN"),
+        ("The museum is closed on Tuesday", "FR", "EN"),
+        ("Visite du Louvre puis dîner au restaurant", "FR", "EN"),
+    ]
+
+
+def test_translate_en_always_translates_from_french(fake_service):
+    dishes = "Pizza napolitaine et gelato"  # détecté IT par le modèle local
+
+    async def run():
+        return await translation.translate_en(dishes), await translation.translate_en("Tapas et paella à Barcelone")
+
+    assert asyncio.run(run()) == (f"<EN>{dishes}", "<EN>Tapas et paella à Barcelone")
+    assert fake_service == [(dishes, "FR", "EN"), ("Tapas et paella à Barcelone", "FR", "EN")]
+
+
+def test_persistent_stores_are_off_unless_configured(monkeypatch, tmp_path):
+    from mcp_server.tools import store
+
+    monkeypatch.delenv("TRANSLATION_CACHE_DB", raising=False)
+    monkeypatch.setattr(store, "DATA_DIR", "")
+    assert store.store_path("TRANSLATION_CACHE_DB", "translations.sqlite3") == ""
+
+    monkeypatch.setattr(store, "DATA_DIR", str(tmp_path))
+    assert store.store_path("TRANSLATION_CACHE_DB", "translations.sqlite3") == str(tmp_path / "translations.sqlite3")
+    monkeypatch.setenv("TRANSLATION_CACHE_DB", "")
+    assert store.store_path("TRANSLATION_CACHE_DB", "translations.sqlite3") == ""
+
+    # Rien n'est créé sur disque avant la première lecture/écriture
+    lazy = SQLiteStore(str(tmp_path / "sub" / "lazy.sqlite3"))
+    assert not (tmp_path / "sub").exists()
+    lazy.set("k", 1)
+    assert (tmp_path / "sub" / "lazy.sqlite3").exists()